@@ -0,0 +1,327 @@
+"""
+Benchmark of the demo scenes, rendered headless for a fixed number of frames
+
+Every scene runs in its own process with a headless context (EGL by default,
+Mesa llvmpipe works without a GPU), one update per frame and the camera turning
+at a fixed rate, so the runs draw the same frames. It records the startup time
+(start of the process to the first frame), the asset loading time and the
+CPU and GPU frame time distributions, writes them to benchmarks/results.json
+and compares them with benchmarks/baseline.json.
+Run from the project root:
+    python benchmarks/frame_times.py
+    python benchmarks/frame_times.py --save-baseline
+    python benchmarks/frame_times.py --scenes bunny earth --frames 600 --threshold 0.2
+The exit status is 1 when a scene is slower than the baseline
+by more than the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+start_time = time.perf_counter()
+
+# PyOpenGL picks its platform when first imported, the scenes are always headless
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+benchmarks_path = os.path.dirname(os.path.abspath(__file__))
+project_path = os.path.dirname(benchmarks_path)
+sys.path.insert(0, os.path.join(project_path, "pythonGC"))
+
+import numpy as np
+import rich
+
+# scene name -> (module, application class)
+scenes = {
+    "dice": ("GL3Dado", "DiceApp"),
+    "bunny": ("GL3StanfordBunny", "StanfordBunnyApp"),
+    "earth": ("Gl3Earth", "Earth"),
+    "textured_quad": ("GL3TexturedQuad", "TexturedQuad"),
+    "cubos": ("GL2Cubos", "Cubos"),
+    "piramide": ("GL2Piramide", "Piramide"),
+    "prisma": ("Gl2Prisma", "Prisma"),
+    "malha": ("GL2malha", "malha"),
+    "uvsphere": ("GL2UVsphere", "UVsphere"),
+}
+
+# measured frames, after the warm up frames (shader compilation, first uploads)
+benchmark_frames = 300
+warmup_frames = 30
+# degrees the camera turns per frame, in the scenes with a camera
+camera_step = 0.5
+# a metric regresses when it is this fraction slower than the baseline
+regression_threshold = 0.10
+# and at least this many milliseconds slower, the shortest times are mostly noise
+regression_minimum = 0.05
+
+results_path = os.path.join(benchmarks_path, "results.json")
+baseline_path = os.path.join(benchmarks_path, "baseline.json")
+
+# (label, path in the results of a scene) of the compared metrics
+compared_metrics = [
+    ("startup", ("startup",)),
+    ("assets", ("assets",)),
+    ("CPU p50", ("cpu", "frame", "p50")),
+    ("CPU p95", ("cpu", "frame", "p95")),
+    ("GPU p50", ("gpu", "render", "p50")),
+    ("GPU p95", ("gpu", "render", "p95")),
+]
+
+
+def distribution(values) -> dict:
+    """
+    distribution(values)
+    The p50, p95, p99, mean and max of frame times in milliseconds
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]).tolist()
+    return {
+        "p50": p50,
+        "p95": p95,
+        "p99": p99,
+        "mean": float(values.mean()),
+        "max": float(values.max()),
+        "frames": len(values),
+    }
+
+
+def benchmark_class(app_class):
+    """
+    benchmark_class(app_class)
+    A subclass of a demo application that times its startup
+    and turns its camera at a fixed rate every update
+    """
+
+    class BenchmarkApp(app_class):
+        def init(self):
+            start = time.perf_counter()
+            super().init()
+            self.timings["context"] = (time.perf_counter() - start) * 1000
+            from OpenGL import GL
+
+            self.renderer = GL.glGetString(GL.GL_RENDERER).decode()
+
+        def loading_loop(self):
+            start = time.perf_counter()
+            super().loading_loop()
+            self.timings["assets"] = (time.perf_counter() - start) * 1000
+
+        def update(self):
+            super().update()
+            camera = getattr(self, "camera", None)
+            if hasattr(camera, "update_camera_vectors"):
+                camera.yaw += camera_step
+                camera.update_camera_vectors()
+
+        def frame_drawn(self):
+            super().frame_drawn()
+            if "startup" not in self.timings:
+                self.timings["startup"] = (time.perf_counter() - start_time) * 1000
+
+    return BenchmarkApp
+
+
+def run_scene(name: str, frames: int, warmup: int) -> dict:
+    """
+    run_scene(name, frames, warmup)
+    Run a scene in this process and return its results
+    """
+    import importlib
+
+    from profiler import Profiler
+
+    module_name, class_name = scenes[name]
+    app_class = getattr(importlib.import_module(module_name), class_name)
+    app = benchmark_class(app_class)()
+    app.timings = {"assets": 0.0}
+    app.renderer = None
+    app.frames = warmup + frames
+    app.timestep.lockstep = True
+    app.profiler = Profiler(frames=warmup + frames)
+    app.run()
+    profiler = app.profiler
+    results = {
+        "frames": frames,
+        "startup": app.timings.get("startup"),
+        "context": app.timings.get("context"),
+        "assets": app.timings["assets"],
+        "renderer": app.renderer,
+        "cpu": {},
+        "gpu": {},
+    }
+    # the rings are not full, they hold the frames in order
+    for scope, ring in profiler.cpu.items():
+        results["cpu"][scope] = distribution(ring.filled()[warmup:])
+    for scope, ring in profiler.gpu.items():
+        results["gpu"][scope] = distribution(ring.filled()[warmup:])
+    return results
+
+
+def run_scenes(names, frames: int, warmup: int) -> dict:
+    """
+    run_scenes(names, frames, warmup)
+    Run every scene in a new process, the results by scene name
+    """
+    results = {}
+    for name in names:
+        rich.print(f"[bold]{name}[/bold]: {frames} frames")
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "result.json")
+            command = [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--run-scene",
+                name,
+                "--output",
+                output,
+                "--frames",
+                str(frames),
+                "--warmup",
+                str(warmup),
+            ]
+            process = subprocess.run(
+                command,
+                cwd=project_path,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+            if process.returncode != 0 or not os.path.exists(output):
+                rich.print(
+                    f"[red]{name} failed[/red]\n{process.stderr.decode()[-2000:]}"
+                )
+                results[name] = None
+                continue
+            with open(output) as file:
+                results[name] = json.load(file)
+    return results
+
+
+def metric(result: dict, path: tuple):
+    for key in path:
+        if not isinstance(result, dict) or result.get(key) is None:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    compare(results, baseline, threshold)
+    Print the scenes next to the baseline, returns the regressions as
+    (scene, metric, baseline ms, new ms)
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if result is None or base is None:
+            continue
+        if result.get("renderer") != base.get("renderer"):
+            rich.print(
+                f"[yellow]{name}: baseline renderer {base.get('renderer')}, "
+                f"now {result.get('renderer')}[/yellow]"
+            )
+        line = [f"{name:<14}"]
+        for label, path in compared_metrics:
+            old, new = metric(base, path), metric(result, path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old > 0 else 0.0
+            slower = change > threshold and new - old > regression_minimum
+            color = "red" if slower else "green" if change < -threshold else "default"
+            line.append(f"{label} {new:8.2f} ms [{color}]{change:+6.1%}[/{color}]")
+            if slower:
+                regressions.append((name, label, old, new))
+        rich.print(" \t ".join(line))
+    return regressions
+
+
+def print_results(results: dict):
+    for name, result in results.items():
+        if result is None:
+            continue
+        line = [
+            f"{name:<14}",
+            f"startup {result['startup']:8.2f} ms",
+            f"assets {result['assets']:8.2f} ms",
+        ]
+        for label, path in compared_metrics[2:]:
+            value = metric(result, path)
+            if value is not None:
+                line.append(f"{label} {value:8.2f} ms")
+        rich.print(" \t ".join(line))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Frame times of the demo scenes, headless"
+    )
+    parser.add_argument(
+        "--scenes", nargs="+", choices=list(scenes), default=list(scenes)
+    )
+    parser.add_argument("--frames", type=int, default=benchmark_frames)
+    parser.add_argument("--warmup", type=int, default=warmup_frames)
+    parser.add_argument("--threshold", type=float, default=regression_threshold)
+    parser.add_argument("--output", default=results_path)
+    parser.add_argument("--baseline", default=baseline_path)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--run-scene", choices=list(scenes), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scene:
+        # a single scene, in the process started by run_scenes()
+        result = run_scene(args.run_scene, args.frames, args.warmup)
+        with open(args.output, "w") as file:
+            json.dump(result, file)
+        return 0
+
+    results = run_scenes(args.scenes, args.frames, args.warmup)
+    with open(args.output, "w") as file:
+        json.dump(
+            {
+                "platform": os.environ["PYOPENGL_PLATFORM"],
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "frames": args.frames,
+                "scenes": results,
+            },
+            file,
+            indent=2,
+        )
+    rich.print(f"Results written to {args.output}")
+
+    failed = [name for name, result in results.items() if result is None]
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)["scenes"]
+        # the scenes not run keep their old baseline
+        baseline.update({name: result for name, result in results.items() if result})
+        with open(args.baseline, "w") as file:
+            json.dump({"frames": args.frames, "scenes": baseline}, file, indent=2)
+        print_results(results)
+        rich.print(f"Baseline written to {args.baseline}")
+        return 1 if failed else 0
+
+    if not os.path.exists(args.baseline):
+        print_results(results)
+        rich.print(f"No baseline at {args.baseline}, save one with --save-baseline")
+        return 1 if failed else 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)["scenes"]
+    regressions = compare(results, baseline, args.threshold)
+    for name, label, old, new in regressions:
+        rich.print(
+            f"[red]Regression: {name} {label} {old:.2f} ms -> {new:.2f} ms[/red]"
+        )
+    return 1 if regressions or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
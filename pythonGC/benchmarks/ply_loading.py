@@ -0,0 +1,99 @@
+"""
+Benchmark of the PLY loaders on the bunny scans in objs/
+
+Compares the line by line loop that StanfordBunnyModel used
+against read_ply in line mode and in bulk mode.
+Run from the project root:
+    python benchmarks/ply_loading.py
+"""
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pythonGC")
+)
+
+import rich
+from model_util import read_ply, triangulate
+
+models = [
+    "bun_zipper_res4.ply",
+    "bun_zipper_res3.ply",
+    "bun_zipper_res2.ply",
+    "bun_zipper.ply",
+]
+
+
+def legacy_load(model_path: str, scale: float = 20):
+    """
+    The per-line state machine StanfordBunnyModel used before read_ply
+    """
+    state = 0
+    vertexCount = 0
+    faceCount = 0
+    vertices = array("f")
+    indices = array("I")
+    with open(model_path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if state == 0:  # HEADER
+                if len(parts) > 0 and parts[0] == "end_header":
+                    state = 1
+                else:
+                    if len(parts) == 3 and parts[0] == "element":
+                        if parts[1] == "vertex":
+                            vertexCount = int(parts[2])
+                        elif parts[1] == "face":
+                            faceCount = int(parts[2])
+            elif state == 1:  # VERTEX
+                vertices.append(float(parts[0]) * scale)
+                vertices.append(float(parts[1]) * scale)
+                vertices.append(float(parts[2]) * scale)
+                vertices.append(float(parts[4]))
+                vertexCount -= 1
+                if vertexCount == 0:
+                    state = 2
+            else:  # STATE == 2 -> FACES
+                faceVertexCount = int(parts[0])
+                for i in range(2, faceVertexCount):
+                    indices.append(int(parts[1]))
+                    indices.append(int(parts[i]))
+                    indices.append(int(parts[i + 1]))
+                faceCount -= 1
+                if faceCount == 0:
+                    break
+    return vertices, indices
+
+
+def read_ply_load(model_path: str, bulk: bool):
+    ply = read_ply(model_path, bulk)
+    return ply["vertex"].data, triangulate(*ply["face"].lists["vertex_indices"])
+
+
+def best_of(function, repeat: int) -> float:
+    """
+    best_of(function, repeat)
+    Smallest wall time of repeated calls, in milliseconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for model in models:
+        model_path = os.path.join("objs", model)
+        legacy = best_of(lambda: legacy_load(model_path), repeat)
+        lines = best_of(lambda: read_ply_load(model_path, False), repeat)
+        bulk = best_of(lambda: read_ply_load(model_path, True), repeat)
+        rich.print(
+            f"{model:<22} legacy {legacy:8.2f} ms"
+            f"\t lines {lines:8.2f} ms ({legacy / lines:5.1f}x)"
+            f"\t bulk {bulk:8.2f} ms ({legacy / bulk:5.1f}x)"
+        )
@@ -0,0 +1,75 @@
+"""
+Benchmark of read_ply on a large ascii PLY with a growing number of worker processes
+
+The mesh is the bunny tiled many times, written to a temporary file.
+Run from the project root:
+    python benchmarks/ply_parallel.py [copies] [repeat] [max workers]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pythonGC")
+)
+
+import numpy as np
+import rich
+from model_util import read_ply, triangulate
+
+
+def write_tiled_bunny(file_path: str, copies: int):
+    """
+    write_tiled_bunny(file_path, copies)
+    Write an ascii PLY with `copies` bunnies side by side
+    """
+    ply = read_ply(os.path.join("objs", "bun_zipper.ply"))
+    vertex = ply["vertex"].data
+    faces = triangulate(*ply["face"].lists["vertex_indices"]).astype(np.int64)
+    with open(file_path, "w") as f:
+        f.write("ply\nformat ascii 1.0\n")
+        f.write(f"element vertex {len(vertex) * copies}\n")
+        for name in vertex.dtype.names:
+            f.write(f"property float {name}\n")
+        f.write(f"element face {len(faces) * copies}\n")
+        f.write("property list uchar int vertex_indices\nend_header\n")
+        columns = np.stack([vertex[name] for name in vertex.dtype.names], axis=1)
+        for i in range(copies):
+            shifted = columns.copy()
+            shifted[:, 0] += i * 0.2
+            np.savetxt(f, shifted, fmt="%g")
+        for i in range(copies):
+            rows = np.hstack([np.full((len(faces), 1), 3), faces + i * len(vertex)])
+            np.savetxt(f, rows, fmt="%d")
+
+
+def best_of(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+if __name__ == "__main__":
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    cores = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, "tiled_bunny.ply")
+        write_tiled_bunny(file_path, copies)
+        size = os.path.getsize(file_path) / 2**20
+        rich.print(f"{copies} bunnies, {size:.1f} MB, {os.cpu_count()} cores")
+        workers = 1
+        single = None
+        while workers <= cores:
+            elapsed = best_of(lambda: read_ply(file_path, workers=workers), repeat)
+            single = single or elapsed
+            rich.print(
+                f"workers {workers:3d} \t {elapsed:9.2f} ms"
+                f"\t speedup {single / elapsed:5.2f}x"
+                f"\t {size / elapsed * 1000:7.1f} MB/s"
+            )
+            workers *= 2
@@ -0,0 +1,10 @@
+#version 330
+
+in vec2 textureCoord;
+out vec4 color;
+uniform sampler2D textureSlot;
+
+void main(void) 
+{
+    color = texture(textureSlot,textureCoord);
+}
@@ -0,0 +1,22 @@
+#version 330
+
+in vec3 attr_position;
+in vec2 attr_textureCoord;
+// one model matrix per instance, it takes 4 attribute locations
+in mat4 attr_instance_matrix;
+layout(std140) uniform FrameUniforms {
+    mat4 view_matrix;
+    mat4 proj_matrix;
+    mat4 view_proj_matrix;
+    vec4 camera_position;
+    vec4 viewport;
+    float time;
+};
+
+out vec2 textureCoord;
+
+void main(void) 
+{
+    gl_Position = view_proj_matrix * attr_instance_matrix * vec4(attr_position, 1.0);
+    textureCoord = attr_textureCoord;
+}
@@ -1,14 +1,20 @@
-#version 130
+#version 140
 
 in vec3 position;
 in vec3 color;
+layout(std140) uniform FrameUniforms {
+    mat4 view_matrix;
+    mat4 proj_matrix;
+    mat4 view_proj_matrix;
+    vec4 camera_position;
+    vec4 viewport;
+    float time;
+};
 uniform mat4 model_matrix;
-uniform mat4 view_matrix;
-uniform mat4 proj_matrix;
 out vec3 colorToFragmentShader;
 
 void main(void) 
 {
-    gl_Position = proj_matrix * view_matrix * model_matrix * vec4(position, 1.0);
+    gl_Position = view_proj_matrix * model_matrix * vec4(position, 1.0);
     colorToFragmentShader = color;
 }
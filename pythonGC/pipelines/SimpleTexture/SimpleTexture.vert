@@ -1,15 +1,21 @@
-#version 130
+#version 140
 
 in vec3 attr_position;
 in vec2 attr_textureCoord;
+layout(std140) uniform FrameUniforms {
+    mat4 view_matrix;
+    mat4 proj_matrix;
+    mat4 view_proj_matrix;
+    vec4 camera_position;
+    vec4 viewport;
+    float time;
+};
 
 out vec2 textureCoord;
 uniform mat4 model_matrix;
-uniform mat4 view_matrix;
-uniform mat4 proj_matrix;
 
 void main(void) 
 {
-    gl_Position = proj_matrix * view_matrix * model_matrix * vec4(attr_position, 1.0);
+    gl_Position = view_proj_matrix * model_matrix * vec4(attr_position, 1.0);
     textureCoord = attr_textureCoord;
 }
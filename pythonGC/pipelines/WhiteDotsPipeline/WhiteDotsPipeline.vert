@@ -1,9 +1,15 @@
-#version 130
+#version 140
 
 in vec3 position;
+layout(std140) uniform FrameUniforms {
+    mat4 view_matrix;
+    mat4 proj_matrix;
+    mat4 view_proj_matrix;
+    vec4 camera_position;
+    vec4 viewport;
+    float time;
+};
 uniform mat4 model_matrix;
-uniform mat4 view_matrix;
-uniform mat4 proj_matrix;
 
 void main(void) 
 {
@@ -7,6 +7,8 @@ from basicGL2 import BasicOpenGLApp
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
+from retained_geometry import RetainedGeometry
+
 
 class Cubos(BasicOpenGLApp):
     def __init__(self, full_screen=False):
@@ -59,6 +61,12 @@ class Cubos(BasicOpenGLApp):
             (1, 0, 0.5),
         )
 
+        # the cube is uploaded once and drawn in the 4 quadrants
+        self.cube = RetainedGeometry(self.vertices, self.faces, self.cores)
+        self.single_color_cube = RetainedGeometry(
+            self.vertices, self.faces, self.cores, face_colors=True
+        )
+
         self.angle = [0, 0, 0]
         self.camera = [0, 0, -20]
         logging.info("Application started")
@@ -90,19 +98,12 @@ class Cubos(BasicOpenGLApp):
             f"Mouse position: {mousePos}",
         )
 
-    def render(self):
+    def render(self, alpha):
         def desenhaCubo(self, singleColor=False):
-            glBegin(GL_QUADS)
-            i = 0
-            for face in self.faces:
-                if singleColor:
-                    glColor3fv(self.cores[i])
-                for vertex in face:
-                    if not singleColor:
-                        glColor3fv(self.cores[vertex])
-                    glVertex3fv(self.vertices[vertex])
-                i = i + 1
-            glEnd()
+            if singleColor:
+                self.single_color_cube.draw()
+            else:
+                self.cube.draw()
 
         glClear(
             GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT
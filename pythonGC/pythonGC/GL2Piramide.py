@@ -9,6 +9,7 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 
 from color_util import HSL2RGB
+from retained_geometry import RetainedGeometry
 
 PI = 3.1415926535897932384626433832795
 class Piramide(BasicOpenGLApp):
@@ -32,6 +33,8 @@ class Piramide(BasicOpenGLApp):
         self.angle = [0, 0, -PI / 4]
         self.camera = [0,0,-25]
         self.rebuild = True
+        # uploaded again only after a rebuild
+        self.geometry = RetainedGeometry()
         logging.info("Application started")
         if full_screen:
             logging.info("Full screen mode")
@@ -152,16 +155,9 @@ class Piramide(BasicOpenGLApp):
             self.cores.append((0, 0, 1))
             self.cores.append((0, 0, 1))
 
-    def render(self):
-        def draw_piramide():
-            glBegin(GL_TRIANGLES)
-            for face in self.faces:
-                for vértice_index in face:
-                    glColor3fv(self.cores[vértice_index])
-                    glVertex3fv(self.vertices[vértice_index])
+        self.geometry.set(self.vertices, self.faces, self.cores)
 
-            glEnd()
-        
+    def render(self, alpha):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         
         glPushMatrix()
@@ -169,7 +165,7 @@ class Piramide(BasicOpenGLApp):
         glRotatef(self.angle[0], 1, 0, 0)
         glRotatef(self.angle[1], 0, 1, 0)
         glRotatef(self.angle[2], 0, 0, 1)
-        draw_piramide()
+        self.geometry.draw()
         glPopMatrix()
 
 
@@ -4,9 +4,12 @@ from math import cos, sin
 
 import sdl2
 from basicGL2 import BasicOpenGLApp
+from timestep import lerp
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
+from retained_geometry import RetainedGeometry
+
 PI = 3.1415926535897932384626433832795
 
 
@@ -27,8 +30,10 @@ class UVsphere(BasicOpenGLApp):
         self.uvs = []
         self.step_angle = PI * 2 / 32
         self.angle = [0, 0, 0]
+        self.previous_angle = list(self.angle)
         self.camera = [0, 0, 0]
         logging.info("Application started")
+        self.geometry = RetainedGeometry()
         self.build()
         if full_screen:
             logging.info("Full screen mode")
@@ -76,14 +81,19 @@ class UVsphere(BasicOpenGLApp):
                 longitude += self.step_angle
             latitude += self.step_angle
 
+        # a face takes the color of its last vertex, the color of a vertex is its position
+        last_vertices = [self.vertices[face[3]] for face in self.faces]
+        self.geometry.set(self.vertices, self.faces, last_vertices, face_colors=True)
+
     def update(self):
+        self.previous_angle = list(self.angle)
         
 
         self.angle[0] += 1
         self.angle[1] += 1
         self.angle[2] += 1
 
-    def render(self):
+    def render(self, alpha):
         # draw the uv sphere
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
@@ -103,17 +113,12 @@ class UVsphere(BasicOpenGLApp):
         """
 
         glTranslatef(0, 0, -0.5)
-        glRotatef(self.angle[0], 1, 0, 0)
-        glRotatef(self.angle[1], 0, 1, 0)
-        glRotatef(self.angle[2], 0, 0, 1)
-        glBegin(GL_QUADS)
-        for face in self.faces:
-            # color based on the face vertcies
-            for vertex in face:
-                glColor3fv(self.vertices[vertex])
-            for i in range(4):
-                glVertex3fv(self.vertices[face[i]])
-        glEnd()
+        # between the last two updates
+        angle = lerp(self.previous_angle, self.angle, alpha)
+        glRotatef(angle[0], 1, 0, 0)
+        glRotatef(angle[1], 0, 1, 0)
+        glRotatef(angle[2], 0, 0, 1)
+        self.geometry.draw()
 
         glPopMatrix()
 
@@ -4,23 +4,26 @@ from math import cos, sin
 import math
 from random import random
 
+import numpy as np
 import sdl2
 from basicGL2 import BasicOpenGLApp
+from timestep import lerp
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
 from color_util import HSL2RGB
+from retained_geometry import RetainedGeometry
 
 PI = 3.1415926535897932384626433832795
 
 
 def funcOFxy(x, y):
     #return random() / 5
-    return 0.5 * sin(PI * x / 10) * cos(PI * y / 10)
+    return 0.5 * np.sin(PI * x / 10) * np.cos(PI * y / 10)
 
 
 class malha(BasicOpenGLApp):
-    def __init__(self, full_screen=True):
+    def __init__(self, full_screen=True, r=200):
         super().__init__(
             width=800,
             height=600,
@@ -28,57 +31,43 @@ class malha(BasicOpenGLApp):
             full_screen=full_screen,
             far=1000,
         )
-        self.vertices = []
-        self.faces = []
-        self.cores = []
-
-        r = 20
-        for i in range(r):
-            for j in range(r):
-                self.vertices.append(
-                    [i / r - 0.5, j / r - 0.5, funcOFxy(j + r / 2, i + r)]
-                )
-
-        for vertexIndex in range(len(self.vertices)):
-            if vertexIndex % r == 0:
-                continue  # exclui ultima linha
-
-            if vertexIndex / r > r - 1:
-                continue  # exclui ultima coluna
-
-            vertexIndex = vertexIndex - 1
-            # print(vertexIndex / r)
-            bottom_face = [vertexIndex, vertexIndex + r, vertexIndex + 1]
+        # r x r vertices, vertex i * r + j at row i and column j
+        i, j = np.divmod(np.arange(r * r), r)
+        self.vertices = np.stack(
+            [i / r - 0.5, j / r - 0.5, funcOFxy(j + r / 2, i + r)], axis=1
+        )
 
-            top_face = [vertexIndex + 1, vertexIndex + r + 1, vertexIndex + r]
-            self.faces.append(bottom_face)
-            self.faces.append(top_face)
+        # two triangles per grid cell, the last row and column start no cell
+        vertexIndex = np.arange(r * (r - 1))
+        vertexIndex = vertexIndex[vertexIndex % r != r - 1]
+        bottom_faces = np.stack([vertexIndex, vertexIndex + r, vertexIndex + 1], axis=1)
+        top_faces = np.stack([vertexIndex + 1, vertexIndex + r + 1, vertexIndex + r], axis=1)
+        self.faces = np.stack([bottom_faces, top_faces], axis=1).reshape(-1, 3)
 
         # color the faces, rainbow style
         hue_step = 360 / len(self.faces)
-        current_hue = 0
-        for face in self.faces:
-            color = HSL2RGB((current_hue, random() * 50 + 25, random() * 50 + 10))
-            # convert trupe to list
-            color = list(color)
-            print(color)
-            self.cores.append(color)
-            current_hue += hue_step
+        self.cores = [
+            HSL2RGB((face * hue_step, random() * 50 + 25, random() * 50 + 10))
+            for face in range(len(self.faces))
+        ]
 
-        # print(self.faces)
+        # uploaded once, every frame draws the buffer
+        self.geometry = RetainedGeometry(self.vertices, self.faces, self.cores, face_colors=True)
 
         self.angle = [0, 0, 0]
+        self.previous_angle = list(self.angle)
         self.camera = [0, 0, 0]
 
         if full_screen:
             logging.info("Full screen mode")
 
     def update(self):
+        self.previous_angle = list(self.angle)
         self.angle[0] += .5
         self.angle[1] += 0.01
         self.angle[2] += .5
 
-    def render(self):
+    def render(self, alpha):
         # draw the uv sphere
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
@@ -87,21 +76,13 @@ class malha(BasicOpenGLApp):
 
         glTranslate(self.camera[0], self.camera[1], self.camera[2])
 
-        glRotatef(self.angle[0], 1, 0, 0)
-        glRotatef(self.angle[1], 0, 1, 0)
-        glRotatef(self.angle[2], 0, 0, 1)
-
-        glBegin(GL_TRIANGLES)
-        for face in self.faces:
-            glColor(
-                self.cores[self.faces.index(face)][0],
-                self.cores[self.faces.index(face)][1],
-                self.cores[self.faces.index(face)][2],
-            )
-            glVertex(self.vertices[face[0]])
-            glVertex(self.vertices[face[1]])
-            glVertex(self.vertices[face[2]])
-        glEnd()
+        # between the last two updates
+        angle = lerp(self.previous_angle, self.angle, alpha)
+        glRotatef(angle[0], 1, 0, 0)
+        glRotatef(angle[1], 0, 1, 0)
+        glRotatef(angle[2], 0, 0, 1)
+
+        self.geometry.draw()
 
         glPopMatrix()
 
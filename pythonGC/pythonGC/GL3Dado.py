@@ -2,18 +2,28 @@ import ctypes
 import rich
 import os
 import glm
+import numpy as np
 import sdl2
 from OpenGL import GL
+from gl_state import gl_state
 from array import array
 from model_util import Model
+from transform_store import TransformStore
+from vertex_layout import InstanceBuffer, VertexArray, VertexLayout
 from camera import Camera
 from shader import ShaderProgram
 from basicGL3 import OpenGLApp
-from texture import Texture
 
 def flatten(l):
     return [item for sublist in l for item in sublist]
 
+# position and texture coordinate interleaved in a single buffer
+dice_layout = VertexLayout([("attr_position", 3), ("attr_textureCoord", 2)])
+
+# one model matrix per dice, read by the InstancedTexture pipeline
+instance_layout = VertexLayout([("attr_instance_matrix", 16)])
+
+
 class Dice(Model):
     def __init__(self):
         self.vertices = []
@@ -94,53 +104,24 @@ class Dice(Model):
         )
 
 
-    def load(self):
+    def load(self, program: ShaderProgram = None):
         """
         in vec3 attr_position;
         in vec2 attr_textureCoord;
         """
-        self.vao = GL.glGenVertexArrays(1)
-        self.vbo = GL.glGenBuffers(1)
-        self.ebo = GL.glGenBuffers(1)
-        self.tbo = GL.glGenBuffers(1)
-
-        GL.glBindVertexArray(self.vao)
-
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,
-            self.attr_position.itemsize * len(self.attr_position),
-            ctypes.c_void_p(self.attr_position.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
+        vertices = dice_layout.interleave(
+            {
+                "attr_position": self.attr_position,
+                "attr_textureCoord": self.attr_textureCoord,
+            }
         )
-        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
-        GL.glEnableVertexAttribArray(0)
-
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.tbo)
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,
-            self.attr_textureCoord.itemsize * len(self.attr_textureCoord),
-            ctypes.c_void_p(self.attr_textureCoord.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
+        self.vertex_array = VertexArray(
+            dice_layout, vertices, np.asarray(self.indices, dtype=np.uint32), program=program
         )
-        GL.glVertexAttribPointer(1, 2, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
-        GL.glEnableVertexAttribArray(1)
-
-        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
-        GL.glBufferData(
-            GL.GL_ELEMENT_ARRAY_BUFFER,
-            self.indices.itemsize * len(self.indices),
-            ctypes.c_void_p(self.indices.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
-        )
-
-        GL.glBindVertexArray(0)        
-
+        self._set_bounds(self.attr_position)
 
     def render(self):
-        GL.glBindVertexArray(self.vao)
-        GL.glDrawElements(GL.GL_TRIANGLES, len(self.indices), GL.GL_UNSIGNED_INT, None)
-        GL.glBindVertexArray(0)
+        self.vertex_array.draw()
 
     def model_matrix(self):
         mat4 = glm.mat4(1.0)
@@ -153,30 +134,39 @@ class Dice(Model):
 
 
 class DiceApp(OpenGLApp):
-    def __init__(self):
+    def __init__(self, n: int = 10):
         super().__init__(800, 600, "The Dices Zone")
+        # n * n * n dice
+        self.n = n
         self.camera = Camera()
         self.camera.position = glm.vec3(-24,-24,-24)
         self.camera.yaw = 45.0
         self.camera.pitch = 37.0
+        # big grids go past the default far plane
+        self.camera.update_projection_matrix(800, 600, far=max(100.0, n * 6.0))
+
+    def load_assets(self):
+        # decoded in the background while the loading screen is shown
+        self.texture_load = self.assets.load_texture("./textures/dice.png")
+
     def setup(self):
         # Lock the mouse
         sdl2.SDL_SetRelativeMouseMode(sdl2.SDL_TRUE)
 
         # OpenGL Initialization
         GL.glClearColor(0.2, 0.2, 0.2, 1)
-        GL.glEnable(GL.GL_DEPTH_TEST)
-        GL.glEnable(GL.GL_MULTISAMPLE)
+        gl_state.enable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_MULTISAMPLE)
 
         # Enable transparency
-        GL.glEnable(GL.GL_BLEND)
+        gl_state.enable(GL.GL_BLEND)
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
 
         # Enable texture
-        GL.glEnable(GL.GL_TEXTURE_2D)
+        gl_state.enable(GL.GL_TEXTURE_2D)
 
         #Enable culling
-        GL.glEnable(GL.GL_CULL_FACE)
+        gl_state.enable(GL.GL_CULL_FACE)
 
         # Texture Clamp to border
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_CLAMP_TO_BORDER)
@@ -184,7 +174,7 @@ class DiceApp(OpenGLApp):
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_NEAREST);
 
         # Pipeline (shaders)
-        self.shader = ShaderProgram("SimpleTexture")
+        self.shader = ShaderProgram("InstancedTexture")
         self.shader.compile_shader()
         self.shader.link()
 
@@ -192,34 +182,38 @@ class DiceApp(OpenGLApp):
         rich.print(f"Available Uniforms: {self.shader.uniforms}")
 
         # Texture
-        GL.glActiveTexture(GL.GL_TEXTURE0)  # set active texture
-        self.texture = Texture(
-            "./textures/dice.png",
-        )  # load texture from file into active texture
-        self.texture.load()  # load texture into GPU
+        gl_state.active_texture(0)  # set active texture
+        self.texture = self.texture_load.result()  # uploaded during the loading phase
 
         self.dice = Dice()
-        self.dice.load()
+        self.dice.load(self.shader)
+
+        # all the dice are drawn with one call, their matrices in a per instance buffer
+        n = self.n
+        i, j, k = np.meshgrid(np.arange(n), np.arange(n), np.arange(n), indexing="ij")
+        grid = np.stack([i, j, k], axis=-1).reshape(-1, 3)
+        self.dice_transforms = TransformStore(n**3)
+        self.dice_transforms.add_many(grid * 3 - n / 2)
+        # the angles of every dice (degrees) are this times sin(ticks / 100)
+        self.dice_angles = np.radians(grid / n * 360) * 45
+        self.dice_instances = InstanceBuffer(
+            self.dice.vertex_array, instance_layout, n**3, self.shader
+        )
 
-    def render(self):
+    def render(self, alpha):
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
 
         with self.shader as s:
-            s.set_uniform(b"view_matrix", self.camera.get_view_matrix())
-            s.set_uniform(b"proj_matrix", self.camera.projection)
             s.set_uniform(b"textureSlot", 0)
-            n = 10
-            for i in range(n):
-                for j in range(n):
-                    for k in range(n):
-                        self.dice.position = glm.vec3(i * 3 - n/2, j * 3 - n/2, k * 3 - n/2)
-                        self.dice.rotation = glm.vec3(
-                            glm.radians(i / n * 360) * 45 * glm.sin(self.frameCount / 100),
-                            glm.radians(j / n * 360) * 45 * glm.sin(self.frameCount / 100),
-                            glm.radians(k / n * 360) * 45 * glm.sin(self.frameCount / 100),
-                        )
-                        s.set_uniform(b"model_matrix", self.dice.model_matrix())
-                        self.dice.render()
+            # the time of the simulation, between the last two ticks
+            ticks = self.timestep.ticks - 1 + alpha
+            np.multiply(self.dice_angles, np.sin(ticks / 100), out=self.dice_transforms.rotations)
+            # only the dice in the frustum go to the instance buffer
+            visible = self.culler.cull_instances(
+                self.dice_transforms.update(), self.dice.center, self.dice.radius
+            )
+            self.dice_instances.update(visible)
+            self.dice_instances.draw()
 
     def update(self):
         cameraSpeed = 0.25
@@ -233,11 +227,15 @@ class DiceApp(OpenGLApp):
         self.camera.process_mouse_movement(x.value, y.value)
 
         rich.print(
-            f"Camera Position: {self.camera.position}\n",
+            f"Camera Position: {self.camera.position} \t "
+            f"Dice drawn: {self.culler.last_frame[1]}, culled: {self.culler.last_frame[2]}\n",
             end="\r",
         )
 
 
 if __name__ == "__main__":
-    app = DiceApp()
+    import sys
+
+    # python pythonGC/GL3Dado.py 47 draws 47^3 (about 100k) dice
+    app = DiceApp(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
     app.run()
@@ -4,86 +4,43 @@ import os
 import glm
 import sdl2
 from OpenGL import GL
-from array import array
-from model_util import Model
+from gl_state import gl_state
+from model_util import Model, load_model_arrays
+from mesh_cache import MeshCache
+from lod import LODModel
+from bvh import SceneBVH, TriangleBVH, screen_rays
 from camera import Camera
 from shader import ShaderProgram
 from basicGL3 import OpenGLApp
+from timestep import lerp
 
 
-class StanfordBunnyModel(Model):
-    def __init__(self):
-        root_path = os.getcwd()
-        model_path = os.path.join(root_path, "objs", "bun_zipper.ply")
-        scale = 20
-        state = 0
-        vertexCount = 0
-        faceCount = 0
-        vertices = array("f")
-        indices = array("I")
-        with open(model_path, "r") as f:
-            for line in f:
-                parts = line.split()
-                if state == 0: # HEADER
-                    if len(parts) > 0 and parts[0] == "end_header":
-                        state = 1
-                    else:
-                        if len(parts) == 3 and parts[0] == "element":
-                            if parts[1] == "vertex":
-                                vertexCount = int(parts[2])
-                            elif parts[1] == "face":
-                                faceCount = int(parts[2])
-                elif state == 1: # VERTEX
-                    vertices.append(float(parts[0]) * scale)
-                    vertices.append(float(parts[1]) * scale)
-                    vertices.append(float(parts[2]) * scale)
-                    vertices.append(float(parts[4]))
-                    vertexCount -= 1
-                    if vertexCount == 0:
-                        state = 2
-                else: # STATE == 2 -> FACES
-                    faceVertexCount = int(parts[0])
-                    for i in range(2, faceVertexCount):
-                        indices.append(int(parts[1]))
-                        indices.append(int(parts[i]))
-                        indices.append(int(parts[i + 1]))
-                    faceCount -= 1 
-                    if faceCount == 0: 
-                        break
-
-        self.arrayBufferId = GL.glGenVertexArrays(1)
-        self.N = len(indices) 
-        GL.glBindVertexArray(self.arrayBufferId)
-        GL.glEnableVertexAttribArray(0)  # POSITION
-        GL.glEnableVertexAttribArray(1)  # INTENSITY
-
-        idBuffer = GL.glGenBuffers(1)
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, idBuffer)
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,
-            len(vertices) * vertices.itemsize,
-            ctypes.c_void_p(vertices.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
-        )
-        stride = 3 * ctypes.sizeof(ctypes.c_float) + ctypes.sizeof(ctypes.c_uint32)
-        intensityPointer = ctypes.c_void_p(3 * ctypes.sizeof(ctypes.c_float))
-        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, stride, ctypes.c_void_p(0))
-        GL.glVertexAttribPointer(
-            1, 1, GL.GL_UNSIGNED_INT, GL.GL_FALSE, stride, intensityPointer
-        )
+bunny_path = os.path.join("objs", "bun_zipper.ply")
+# the hand decimated versions of the bunny are its levels of detail
+bunny_levels = [bunny_path] + [
+    os.path.join("objs", f"bun_zipper_res{i}.ply") for i in range(2, 5)
+]
+# the scanner order of the faces is reordered once for the vertex cache and kept in the cache
+bunny_options = dict(scale=20, attributes=["intensity"], triangulate_faces=True, optimize=True)
 
-        idIndex = GL.glGenBuffers(1)
-        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, idIndex)
-        GL.glBufferData(
-            GL.GL_ELEMENT_ARRAY_BUFFER,
-            len(indices) * indices.itemsize,
-            ctypes.c_void_p(indices.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
-        )
 
-    def draw(self):
-        GL.glBindVertexArray(self.arrayBufferId)
-        GL.glDrawElements(GL.GL_TRIANGLES, self.N, GL.GL_UNSIGNED_INT, None)
+def load_bunny_bvh() -> TriangleBVH:
+    # the triangles of the full resolution bunny, for picking
+    return TriangleBVH.from_arrays(load_model_arrays(bunny_path, MeshCache(), **bunny_options))
+
+
+class StanfordBunnyModel(Model):
+    def __init__(self, arrays=None, program: ShaderProgram = None):
+        if arrays is None:
+            # the parsed arrays are kept in the mesh cache between runs
+            arrays = load_model_arrays(bunny_path, MeshCache(), **bunny_options)
+        self._set_defaults()
+        # position and intensity interleaved, bound to attr_position and attr_intensity
+        self._upload(
+            {"position": arrays["position"], "intensity": arrays["intensity"]},
+            arrays["indices"],
+            program,
+        )
 
 
 class StanfordBunnyApp(OpenGLApp):
@@ -92,13 +49,21 @@ class StanfordBunnyApp(OpenGLApp):
         self.camera = Camera()
         self.camera.position = glm.vec3(0, 0, 10)
 
+    def load_assets(self):
+        # parsed in the background while the loading screen is shown
+        self.bunny = [
+            self.assets.load_model(path, MeshCache(), upload=StanfordBunnyModel, **bunny_options)
+            for path in bunny_levels
+        ]
+        self.bunny_bvh = self.assets.submit(load_bunny_bvh, process=True)
+
     def setup(self):
         # OpenGL Initialization
         GL.glClearColor(0.2, 0.5, 0.2, 1.0)
-        GL.glEnable(GL.GL_DEPTH_TEST)
-        GL.glEnable(GL.GL_MULTISAMPLE)
+        gl_state.enable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_MULTISAMPLE)
         # Enable transparency
-        GL.glEnable(GL.GL_BLEND)
+        gl_state.enable(GL.GL_BLEND)
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
 
         # Face culling
@@ -111,10 +76,18 @@ class StanfordBunnyApp(OpenGLApp):
         # list uniforms
         rich.print(f"Available Uniforms: {self.shader.uniforms}")
 
-        self.model = StanfordBunnyModel()
+        self.model = LODModel([level.result() for level in self.bunny])
+        # uploaded before the shader existed, bind the attributes by name now
+        self.model.bind_attributes(self.shader)
         self.model.position = glm.vec3(0, 0, 0)
         self.model.rotation = glm.vec3(0.0, 0.0, 0.0)
+        # the bunny turns every update, the frames draw it between the last two
+        self.rotation = glm.vec3(0.0, 0.0, 0.0)
+        self.previous_rotation = glm.vec3(0.0, 0.0, 0.0)
         self.model.scale = glm.vec3(1.0, 1.0, 1.0)
+        self.model.triangle_bvh = self.bunny_bvh.result()
+        self.scene_bvh = SceneBVH([self.model])
+        self.picked = None
 
         # Lock the mouse
         sdl2.SDL_SetRelativeMouseMode(sdl2.SDL_TRUE)
@@ -129,6 +102,11 @@ class StanfordBunnyApp(OpenGLApp):
         )
 
     def update(self):
+        self.previous_rotation = self.rotation
+        self.rotation = self.rotation + glm.vec3(0.0, 1.0, 0.0)
+        # picking uses the rotation of this update
+        self.model.set_rotation(self.rotation)
+
         cameraSpeed = 0.1
         # get w a s d keys
         keys = sdl2.SDL_GetKeyboardState(None)
@@ -140,19 +118,32 @@ class StanfordBunnyApp(OpenGLApp):
         self.camera.process_mouse_movement(x.value, y.value)
 
         rich.print(
-            f"Frame rate: {1/(self.frameTime/10000):.2f} FPS "+
-            f"\t Frame time: {self.frameTime/self.frameCount:.2f} ms "+
+            f"{self.profiler.summary()} "+
             f"\t Camera Position: {self.camera.position}"+
-            f"\t Model rotation: {self.model.rotation}",
+            f"\t Model rotation: {self.model.rotation}"+
+            f"\t LOD: {self.model.level} ({self.model.index_count // 3} triangles)"+
+            f"\t Picked: {self.picked}",
             end="\r",
         )
-        self.model.rotation += glm.vec3(0.0, 1, 0.0)
-
-    def render(self):
+        # the mouse is locked, pick through the center of the screen with the left button
+        if sdl2.SDL_GetMouseState(None, None) & sdl2.SDL_BUTTON_LMASK:
+            self.scene_bvh.refit()
+            origins, directions = screen_rays(
+                self.camera,
+                self.window_width / 2,
+                self.window_height / 2,
+                self.window_width,
+                self.window_height,
+            )
+            hit = self.scene_bvh.pick(origins[0], directions[0])
+            self.picked = None if hit is None else f"triangle {hit[2]} at {hit[1]:.2f}"
+        self.model.update(self.camera, self.window_height)
+
+    def render(self, alpha):
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
+        # between the last two updates
+        self.model.set_rotation(lerp(self.previous_rotation, self.rotation, alpha))
         with self.shader as shader:
-            shader.set_uniform(b"view_matrix", self.camera.get_view_matrix())
-            shader.set_uniform(b"proj_matrix", self.camera.projection)
             shader.set_uniform(b"model_matrix", self.model.get_model_matrix())
             self.model.draw()
 
@@ -4,12 +4,13 @@ import os
 import glm
 import sdl2
 from OpenGL import GL
+from gl_state import gl_state
 from array import array
 from model_util import Model
+from vertex_layout import VertexArray, VertexLayout
 from camera import Camera
 from shader import ShaderProgram
 from basicGL3 import OpenGLApp
-from texture import Texture
 
 
 class TexturedQuad(OpenGLApp):
@@ -18,6 +19,10 @@ class TexturedQuad(OpenGLApp):
         self.camera = Camera()
         self.camera.position = glm.vec3(0.0, 0.0, 0.0)
 
+    def load_assets(self):
+        # decoded in the background while the loading screen is shown
+        self.texture_load = self.assets.load_texture("./textures/uv_grid_opengl.png")
+
     def setup(self):
 
         # Lock the mouse
@@ -25,15 +30,15 @@ class TexturedQuad(OpenGLApp):
 
         # OpenGL Initialization
         GL.glClearColor(0.2, 0.2, 0.2, 1)
-        GL.glEnable(GL.GL_DEPTH_TEST)
-        GL.glEnable(GL.GL_MULTISAMPLE)
+        gl_state.enable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_MULTISAMPLE)
 
         # Enable transparency
-        GL.glEnable(GL.GL_BLEND)
+        gl_state.enable(GL.GL_BLEND)
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
 
         # Enable texture
-        GL.glEnable(GL.GL_TEXTURE_2D)
+        gl_state.enable(GL.GL_TEXTURE_2D)
 
         # Pipeline (shaders)
         self.shader = ShaderProgram("SimpleTexture")
@@ -44,11 +49,8 @@ class TexturedQuad(OpenGLApp):
         rich.print(f"Available Uniforms: {self.shader.uniforms}")
 
         # Texture
-        GL.glActiveTexture(GL.GL_TEXTURE0)  # set active texture
-        self.texture = Texture(
-            "./textures/uv_grid_opengl.png"
-        )  # load texture from file into active texture
-        self.texture.load()  # load texture into GPU
+        gl_state.active_texture(0)  # set active texture
+        self.texture = self.texture_load.result()  # uploaded during the loading phase
 
         quad_position = array(
             "f", [0.8, -0.8, 0.0, -0.8, -0.8, 0.0, 0.8, 0.8, 0.0, -0.8, 0.8, 0.0]
@@ -58,58 +60,20 @@ class TexturedQuad(OpenGLApp):
             "f", [1.0, 0.0, 0.0, 0.0, 1.0, 1.0, 0.0, 1.0]
         )  # 4 vertices, 2 coordinates each
 
-        self.squareArrayBufferId = GL.glGenVertexArrays(
-            1  # this number is the number of vertex arrays to generate, so we cloud generate multiple vertex arrays at once
-        )  # create a vertex array object
-        GL.glBindVertexArray(self.squareArrayBufferId)  # bind the vertex array object
-        # Enable the attribute arrays, so this tells the shader where to get the data
-        GL.glEnableVertexAttribArray(0)  # enable the first attribute (position
-        GL.glEnableVertexAttribArray(
-            1  # this number must match the layout in the shader
-        )  # enable the second attribute (texture coordinates),
+        # the layout describes one vertex: 3 floats of position then 2 of texture coordinate,
+        # the arrays are interleaved into a single vertex buffer object
+        # and each attribute is bound to the shader input with the same name
         """ // Example in shader
-        layout (location = 0) in vec3 position; // GL.glEnableVertexAttribArray(0)
+        in vec3 attr_position; // ("attr_position", 3)
         """
-
-        self.quadArrayBufferId = GL.glGenBuffers(1)  # create a vertex buffer object
-        GL.glBindBuffer(
-            GL.GL_ARRAY_BUFFER, self.quadArrayBufferId
-        )  # bind the vertex buffer object
-        GL.glBufferData(  # copy the vertex data to the GPU
-            GL.GL_ARRAY_BUFFER,  # target
-            quad_position.itemsize * len(quad_position),  # size of the data
-            ctypes.c_void_p(quad_position.buffer_info()[0]),  # pointer to the data
-            GL.GL_STATIC_DRAW,  # usage
+        quad_layout = VertexLayout([("attr_position", 3), ("attr_textureCoord", 2)])
+        self.quad = VertexArray(
+            quad_layout,
+            quad_layout.interleave(
+                {"attr_position": quad_position, "attr_textureCoord": quad_textureCoord}
+            ),
+            program=self.shader,
         )
-        GL.glVertexAttribPointer(
-            0,  # attribute index (location in the shader)
-            3,  # number of coordinates, 3 describes a 3D vector
-            GL.GL_FLOAT,  # type
-            GL.GL_FALSE,  # normalized
-            0,  # stride (0 = tightly packed)
-            ctypes.c_void_p(0),  # array buffer offset
-        )  # set the attribute pointer for the position attribute
-
-        self.quadTextureBufferId = GL.glGenBuffers(1)
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.quadTextureBufferId)
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,  # target
-            quad_textureCoord.itemsize * len(quad_textureCoord),  # size of the data
-            ctypes.c_void_p(quad_textureCoord.buffer_info()[0]),  # pointer to the data
-            GL.GL_STATIC_DRAW,  # usage
-        )
-        GL.glVertexAttribPointer(
-            1,  # attribute index (location in the shader)
-            2,  # number of coordinates, in this case 2 (u,v)
-            GL.GL_FLOAT,  # type
-            GL.GL_FALSE,  # normalized
-            0,  # stride (0 = tightly packed)
-            ctypes.c_void_p(0),  # array buffer offset
-        )  # set the attribute pointer for the texture coordinates attribute
-
-        GL.glBindVertexArray(
-            0
-        )  # unbind the vertex array object from the current context
 
     def update(self):
         cameraSpeed = 0.5
@@ -123,16 +87,14 @@ class TexturedQuad(OpenGLApp):
         self.camera.process_mouse_movement(x.value, y.value)
 
         rich.print(
-            f"Frame rate: {1/(self.frameTime/10000):.2f} FPS \t Frame time: {self.frameTime/self.frameCount:.2f} ms \t Camera Position: {self.camera.position}",
+            f"{self.profiler.summary()} \t Camera Position: {self.camera.position}",
             end="\r",
         )
 
-    def render(self):
+    def render(self, alpha):
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
 
         with self.shader as s:
-            s.set_uniform(b"view_matrix", self.camera.get_view_matrix())
-            s.set_uniform(b"proj_matrix", self.camera.projection)
 
             s.set_uniform(b"textureSlot", 0)
 
@@ -167,15 +129,15 @@ class TexturedQuad(OpenGLApp):
                     mat4 = glm.rotate(mat4, rotation.y, glm.vec3(0, 1, 0))
                     mat4 = glm.rotate(mat4, rotation.z, glm.vec3(0, 0, 1))
                     mat4 = glm.scale(mat4, scale)
-                    s.set_uniform(b"model_matrix", mat4)
-                    GL.glBindVertexArray(self.squareArrayBufferId)
-                    GL.glDrawArrays(
-                        GL.GL_TRIANGLE_STRIP,  # mode
-                        0,  # starting index in the enabled arrays
-                        4,  # number of indices to be rendered
-                    )  # draw the square
-        GL.glBindVertexArray(0)
-        # unbind the vertex array object from the current context, so if we want to draw something else we don't use the same vertex array object
+                    # the quads are blended, the queue draws them back to front
+                    self.render_queue.submit(
+                        s,
+                        self.quad,
+                        (self.texture,),
+                        model_matrix=mat4,
+                        blended=True,
+                        mode=GL.GL_TRIANGLE_STRIP,
+                    )
 
 
 if __name__ == "__main__":
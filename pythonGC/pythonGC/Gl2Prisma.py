@@ -8,6 +8,8 @@ from basicGL2 import BasicOpenGLApp
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
+from retained_geometry import RetainedGeometry
+
 PI = 3.1415926535897932384626433832795
 
 
@@ -32,6 +34,8 @@ class Prisma(BasicOpenGLApp):
         self.angle = [0, 0, 0]
         self.camera = [0, 0,-25]
         self.rebuild = True
+        # uploaded again only after a rebuild
+        self.geometry = RetainedGeometry()
         logging.info("Application started")
         if full_screen:
             logging.info("Full screen mode")
@@ -154,15 +158,9 @@ class Prisma(BasicOpenGLApp):
             self.cores.append((1, 0, 1))
             self.cores.append((0, 1, 1))
 
-    def render(self):
-        def draw_prisma():
-            glBegin(GL_TRIANGLES)
-            for face in self.faces:
-                for vertex in face:
-                    glColor3fv(self.cores[vertex])
-                    glVertex3fv(self.vertices[vertex])
-            glEnd()
+        self.geometry.set(self.vertices, self.faces, self.cores)
 
+    def render(self, alpha):
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
         for i in range(3):
@@ -176,7 +174,7 @@ class Prisma(BasicOpenGLApp):
                 glRotatef(self.angle[0], 1, 0, 0)
                 glRotatef(self.angle[1], 0, 1, 0)
                 glRotatef(self.angle[2], 0, 0, 1)
-                draw_prisma()
+                self.geometry.draw()
                 glPopMatrix()
 
         glFlush()
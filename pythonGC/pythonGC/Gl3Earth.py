@@ -2,16 +2,22 @@ import ctypes
 import rich
 import os
 import glm
+import numpy as np
 import sdl2
 from OpenGL import GL
-from array import array
+from gl_state import gl_state
 from model_util import Model
+from vertex_layout import VertexArray, VertexLayout
 from camera import Camera
 from shader import ShaderProgram
 from basicGL3 import OpenGLApp
-from texture import Texture
+from scene_graph import SceneGraph, SceneNode
+from timestep import lerp
 import math
 
+# position and texture coordinate interleaved in a single buffer
+sphere_layout = VertexLayout([("attr_position", 3), ("attr_textureCoord", 2)])
+
 
 class sphereModel(Model):
     def __init__(self, radius, slices, stacks):
@@ -26,7 +32,7 @@ class sphereModel(Model):
         self.rotation = glm.vec3(0.0, 0.0, 0.0)
         self.scale = glm.vec3(1.0, 1.0, 1.0)
 
-    def load(self):
+    def load(self, program: ShaderProgram = None):
         latitude = 0
         longitude = 0
         vertices = []
@@ -64,55 +70,20 @@ class sphereModel(Model):
                 indices.append(p2)
                 indices.append(p2 + 1)
 
-        self.indices = array("I", indices)
-        self.attr_position = array(
-            "f", [item for sublist in vertices for item in sublist]
-        )
-        self.attr_textureCoord = array(
-            "f", [item for sublist in tex_coords for item in sublist]
-        )
-
-        self.vao = GL.glGenVertexArrays(1)
-        self.vbo = GL.glGenBuffers(1)
-        self.ebo = GL.glGenBuffers(1)
-        self.tbo = GL.glGenBuffers(1)
-
-        GL.glBindVertexArray(self.vao)
+        self.indices = np.array(indices, dtype=np.uint32)
+        self.attr_position = np.array(vertices, dtype=np.float32)
+        self.attr_textureCoord = np.array(tex_coords, dtype=np.float32)
 
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,
-            self.attr_position.itemsize * len(self.attr_position),
-            ctypes.c_void_p(self.attr_position.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
-        )
-        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
-        GL.glEnableVertexAttribArray(0)
-
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.tbo)
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,
-            self.attr_textureCoord.itemsize * len(self.attr_textureCoord),
-            ctypes.c_void_p(self.attr_textureCoord.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
+        vertices = sphere_layout.interleave(
+            {
+                "attr_position": self.attr_position,
+                "attr_textureCoord": self.attr_textureCoord,
+            }
         )
-        GL.glVertexAttribPointer(1, 2, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
-        GL.glEnableVertexAttribArray(1)
-
-        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
-        GL.glBufferData(
-            GL.GL_ELEMENT_ARRAY_BUFFER,
-            self.indices.itemsize * len(self.indices),
-            ctypes.c_void_p(self.indices.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
-        )
-
-        GL.glBindVertexArray(0)  # Unbind
+        self.vertex_array = VertexArray(sphere_layout, vertices, self.indices, program=program)
 
     def render(self):
-        GL.glBindVertexArray(self.vao)
-        GL.glDrawElements(GL.GL_TRIANGLES, len(self.indices), GL.GL_UNSIGNED_INT, None)
-        GL.glBindVertexArray(0)
+        self.vertex_array.draw()
 
     def model_matrix(self):
         mat4 = glm.mat4(1.0)
@@ -130,6 +101,10 @@ class Earth(OpenGLApp):
         self.camera = Camera()
         self.camera.position = glm.vec3(0.0, 0.0, 3.0)
 
+    def load_assets(self):
+        # decoded in the background while the loading screen is shown
+        self.texture_load = self.assets.load_texture("./textures/world_map.png")
+
     def setup(self):
 
         # Lock the mouse
@@ -137,15 +112,15 @@ class Earth(OpenGLApp):
 
         # OpenGL Initialization
         GL.glClearColor(0.2, 0.2, 0.2, 1)
-        GL.glEnable(GL.GL_DEPTH_TEST)
-        GL.glEnable(GL.GL_MULTISAMPLE)
+        gl_state.enable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_MULTISAMPLE)
 
         # Enable transparency
-        GL.glEnable(GL.GL_BLEND)
+        gl_state.enable(GL.GL_BLEND)
         GL.glBlendFunc(GL.GL_SRC_ALPHA, GL.GL_ONE_MINUS_SRC_ALPHA)
 
         # Enable texture
-        GL.glEnable(GL.GL_TEXTURE_2D)
+        gl_state.enable(GL.GL_TEXTURE_2D)
 
         # texture filtering none
         GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_NEAREST)
@@ -159,16 +134,32 @@ class Earth(OpenGLApp):
         rich.print(f"Available Uniforms: {self.shader.uniforms}")
 
         # Texture
-        GL.glActiveTexture(GL.GL_TEXTURE0)
-        self.texture = Texture("./textures/world_map.png")
-        self.texture.load()
+        gl_state.active_texture(0)
+        self.texture = self.texture_load.result()  # uploaded during the loading phase
 
         # Model
         self.model = sphereModel(0.5, 20, 20)
-        self.model.load()
-        self.model.rotation.x = 180
+        self.model.load(self.shader)
+        self.model._set_bounds(self.model.attr_position)
+
+        # Scene, the earth turns every frame, the rest of the graph is not recomputed
+        self.earth_angle = 0.0
+        self.previous_earth_angle = 0.0
+        self.scene = SceneGraph()
+        self.earth = self.scene.add(
+            SceneNode(
+                "earth",
+                rotation=(180.0, 0.0, 0.0),
+                mesh=self.model,
+                material=(self.texture,),
+                program=self.shader,
+            )
+        )
 
     def update(self):
+        self.previous_earth_angle = self.earth_angle
+        self.earth_angle += 0.1
+
         cameraSpeed = 0.1
         # get w a s d keys
         keys = sdl2.SDL_GetKeyboardState(None)
@@ -180,20 +171,18 @@ class Earth(OpenGLApp):
         self.camera.process_mouse_movement(x.value, y.value)
 
         rich.print(
-            f"Frame rate: {1/(self.frameTime/10000):.2f} FPS \t Frame time: {self.frameTime/self.frameCount:.2f} ms \t Camera Position: {self.camera.position}",
+            f"{self.profiler.summary()} \t Camera Position: {self.camera.position}",
             end="\r",
         )
 
-    def render(self):
+    def render(self, alpha):
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
 
-        with self.shader as s:
-            self.model.rotation.y += 0.1
-            s.set_uniform(b"model_matrix", self.model.model_matrix())
-            s.set_uniform(b"view_matrix", self.camera.get_view_matrix())
-            s.set_uniform(b"proj_matrix", self.camera.projection)
-            self.model.render()
-        GL.glBindVertexArray(0)
+        # between the last two updates
+        angle = lerp(self.previous_earth_angle, self.earth_angle, alpha)
+        self.earth.set_rotation((180.0, angle, 0.0))
+        self.scene.update()
+        self.scene.submit(self.render_queue, self.culler)
 
 
 if __name__ == "__main__":
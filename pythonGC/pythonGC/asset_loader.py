@@ -0,0 +1,130 @@
+import logging
+import queue
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from model_util import Model, load_model_arrays
+from texture import Texture, decodeTexture
+
+
+class AssetLoader:
+    """
+    AssetLoader class:
+    Loads assets in the background, the slow part (reading, parsing, decoding)
+    runs in a thread or process pool and only the OpenGL upload runs on the GL thread,
+    a few uploads per frame with process_uploads()
+    """
+
+    def __init__(self, threads: int = 4, processes: int = 2):
+        self.threads = ThreadPoolExecutor(threads)
+        # the process pool is only started when a task asks for it
+        self.process_count = processes
+        self.processes = None
+        self.uploads = queue.Queue()
+        self.total = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(
+        self, work, *args, upload=None, callback=None, process: bool = False, **kwargs
+    ) -> Future:
+        """
+        submit(work, *args, upload, callback, process, **kwargs)
+        Run work(*args, **kwargs) in the pool, then upload(result) on the GL thread.
+        The returned future holds the value returned by upload (or by work
+        when there is no upload) and callback(value) is called on the GL thread.
+        With process the work runs in a process, so it must be picklable
+        """
+        if process and self.process_count > 0:
+            if self.processes is None:
+                self.processes = ProcessPoolExecutor(self.process_count)
+            executor = self.processes
+        else:
+            executor = self.threads
+        result = Future()
+        self.total += 1
+        work_future = executor.submit(work, *args, **kwargs)
+        work_future.add_done_callback(
+            lambda f: self.uploads.put((f, upload, callback, result))
+        )
+        return result
+
+    def load_model(
+        self, file_path: str, cache=None, upload=None, callback=None, **options
+    ) -> Future:
+        """
+        load_model(file_path, cache, upload, callback, **options)
+        Load a PLY or OBJ model, parsed in a process and uploaded with
+        Model.from_arrays, or upload(arrays) when given
+        """
+        if upload is None:
+            upload = Model.from_arrays
+        return self.submit(
+            load_model_arrays,
+            file_path,
+            cache,
+            upload=upload,
+            callback=callback,
+            process=True,
+            **options,
+        )
+
+    def load_texture(self, file_path: str, callback=None) -> Future:
+        """
+        load_texture(file_path, callback)
+        Load a Texture, decoded in a thread and uploaded to the active texture unit
+        """
+        texture = Texture(file_path)
+
+        def upload(image):
+            texture.upload(image)
+            return texture
+
+        return self.submit(decodeTexture, file_path, upload=upload, callback=callback)
+
+    def process_uploads(self, budget: float = 0.004) -> int:
+        """
+        process_uploads(budget)
+        Run the pending GL uploads on the calling (GL) thread,
+        stops when there is nothing left or after budget seconds,
+        returns the number of assets finished
+        """
+        start = time.perf_counter()
+        finished = 0
+        while time.perf_counter() - start < budget:
+            try:
+                work_future, upload, callback, result = self.uploads.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                value = work_future.result()
+                if upload is not None:
+                    value = upload(value)
+                result.set_result(value)
+                if callback is not None:
+                    callback(value)
+            except Exception as e:
+                logging.error(f"Error while loading an asset: {e}")
+                self.failed += 1
+                if not result.done():
+                    result.set_exception(e)
+            self.completed += 1
+            finished += 1
+        return finished
+
+    @property
+    def progress(self) -> float:
+        """
+        Fraction of the submitted assets already finished
+        """
+        if self.total == 0:
+            return 1.0
+        return self.completed / self.total
+
+    def done(self) -> bool:
+        return self.completed == self.total
+
+    def shutdown(self, wait: bool = False):
+        self.threads.shutdown(wait=wait, cancel_futures=True)
+        if self.processes is not None:
+            self.processes.shutdown(wait=wait, cancel_futures=True)
@@ -7,13 +7,16 @@ import sdl2
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
+from timestep import lerp
+from headless import AppBackend
+
 """
 Basic Runnable OpenGL class to be implemented in other classes,
 and should be use using openGL 2.1 calls. 
 """
 
 
-class BasicOpenGLApp(ABC):
+class BasicOpenGLApp(AppBackend, ABC):
     def __init__(
         self,
         width=640,
@@ -23,6 +26,11 @@ class BasicOpenGLApp(ABC):
         fov=45,
         near=0.1,
         far=100.0,
+        tick_rate=60.0,
+        max_steps=5,
+        frame_rate=None,
+        backend=None,
+        frames=None,
     ):
         self.window_width = width
         self.window_height = height
@@ -31,12 +39,32 @@ class BasicOpenGLApp(ABC):
         self.fov = fov
         self.near = near
         self.far = far
-        self.running = False
-        self.window = None
-        self.context = None
-        self.event = None
+        self._init_backend(tick_rate, max_steps, frame_rate, backend, frames)
 
     def init(self):
+        if self.backend != "sdl":
+            self.init_headless()
+        else:
+            self.init_window()
+        glEnable(GL_MULTISAMPLE)  # Enable multisampling
+        glEnable(GL_DEPTH_TEST)  # Enable depth testing
+        glClearColor(0.0, 0.0, 0.0, 1.0)  # Set the clear color
+        gluPerspective(
+            self.fov,
+            self.window_width / self.window_height,  # Aspect ratio
+            self.near,  # Near clipping plane
+            self.far,
+        )  # Far clipping plane
+
+        if self.window is not None:
+            # Show the window
+            sdl2.SDL_ShowWindow(self.window)
+
+            # set the window to fullscreen
+            if self.full_screen:
+                sdl2.SDL_SetWindowFullscreen(self.window, sdl2.SDL_WINDOW_FULLSCREEN)
+
+    def init_window(self):
         sdl2.SDL_Init(sdl2.SDL_INIT_EVERYTHING)  # Initialize SDL2
 
         if self.full_screen:
@@ -73,40 +101,25 @@ class BasicOpenGLApp(ABC):
             sys.exit(-1)
         # Create the OpenGL context
         self.context = sdl2.SDL_GL_CreateContext(self.window)
-        glEnable(GL_MULTISAMPLE)  # Enable multisampling
-        glEnable(GL_DEPTH_TEST)  # Enable depth testing
-        glClearColor(0.0, 0.0, 0.0, 1.0)  # Set the clear color
-        gluPerspective(
-            self.fov,
-            self.window_width / self.window_height,  # Aspect ratio
-            self.near,  # Near clipping plane
-            self.far,
-        )  # Far clipping plane
-
-        # Show the window
-        sdl2.SDL_ShowWindow(self.window)
-
-        # set the window to fullscreen
-        if self.full_screen:
-            sdl2.SDL_SetWindowFullscreen(self.window, sdl2.SDL_WINDOW_FULLSCREEN)
 
     @abstractmethod
     def update(self):
         """
         Update the application state
-        This method is called every frame
-        and should be overwritten in the child class
+        This method is called tick_rate times per second (self.timestep.dt seconds per call),
+        zero or more times per frame, and should be overwritten in the child class
         """
         raise NotImplementedError(
             "This method should be overwritten in the child class"
         )
 
     @abstractmethod
-    def render(self):
+    def render(self, alpha: float):
         """
         Render the application
-        This method is called every frame
-        and should be overwritten in the child class
+        This method is called every frame, alpha (0 to 1) is how far the frame is
+        between the last update and the next one, for interpolating the motion.
+        It should be overwritten in the child class
         """
         raise NotImplementedError(
             "This method should be overwritten in the child class"
@@ -122,24 +135,23 @@ class BasicOpenGLApp(ABC):
         self.quit()
 
     def main_loop(self):
+        self.timestep.reset()
+        self.frames_drawn = 0
+        profiler = self.profiler
         while self.running:
-            self.event = sdl2.SDL_Event()
-            while sdl2.SDL_PollEvent(self.event):
-                if self.event.type == sdl2.SDL_QUIT:
-                    self.running = False
-                elif self.event.type == sdl2.SDL_KEYDOWN:
-                    if self.event.key.keysym.sym == sdl2.SDLK_ESCAPE:
-                        self.running = False
-            self.update()  # Update the application state
-            self.render()  # Render the application
-            sdl2.SDL_GL_SwapWindow(self.window)  # Swap the window buffers
+            profiler.begin_frame()
+            self.poll_events()
+            with profiler.scope("update"):
+                for _ in range(self.timestep.advance()):
+                    self.update()  # Update the application state, at the fixed tick rate
+            with profiler.scope("render"), profiler.gpu_scope("render"):
+                self.render(self.timestep.alpha)  # Render the application
+            self.present_frame()  # Swap the window buffers
+            self.finish_frame()  # frame rate cap and frame limit
         self.quit()
 
     def quit(self):
-        sdl2.SDL_GL_DeleteContext(self.context)
-        sdl2.SDL_DestroyWindow(self.window)
-        sdl2.SDL_Quit()
-        logging.info("Application closed")
+        self.close_backend()
 
 
 if __name__ == "__main__":
@@ -158,19 +170,22 @@ if __name__ == "__main__":
 
             self.colors = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]]
             self.angle = 0
+            self.previous_angle = 0
 
         def update(self):
             # rotate the triangle
+            self.previous_angle = self.angle
             self.angle += 1
 
-        def render(self):
+        def render(self, alpha):
             # draw a triangle with red green and blue vertices
             glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
             glLoadIdentity()
 
             glPushMatrix()
             # glTranslatef(0.0, 0.0, -6)
-            glRotatef(self.angle, self.angle, -self.angle, self.angle)
+            angle = lerp(self.previous_angle, self.angle, alpha)
+            glRotatef(angle, angle, -angle, angle)
             glBegin(GL_TRIANGLES)
             for i in range(3):
                 glColor3fv(self.colors[i])
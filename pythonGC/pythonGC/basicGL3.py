@@ -9,13 +9,19 @@ import glm
 import sdl2
 from abc import ABC, abstractmethod
 from OpenGL import GL
+from gl_state import gl_state
 from array import array
 from camera import Camera
 
 from shader import ShaderProgram
+from asset_loader import AssetLoader
+from frame_uniforms import FrameUniforms
+from render_queue import RenderQueue
+from culling import FrustumCuller
+from headless import AppBackend
 
 
-class OpenGLApp(ABC):
+class OpenGLApp(AppBackend, ABC):
     """
     Basic Runnable OpenGL class to be implemented in other classes,
     and should be use using openGL 3 calls.
@@ -27,19 +33,34 @@ class OpenGLApp(ABC):
         height=600,
         title="OpenGL APP",
         full_screen=False,
+        tick_rate=60.0,
+        max_steps=5,
+        frame_rate=None,
+        trace_file=None,
+        backend=None,
+        frames=None,
     ):
         self.window_width = width
         self.window_height = height
         self.full_screen = full_screen
         self.window_title = title
-        self.running = False
-        self.window = None
-        self.context = None
-        self.event = None
+        self._init_backend(tick_rate, max_steps, frame_rate, backend, frames, trace_file)
         self.frameCount = 1
         self.frameTime = 1
+        self.assets = AssetLoader()
+        # seconds per frame spent on GL uploads of loaded assets
+        self.upload_budget = 0.004
+        # camera and per frame data shared by every pipeline, created with the context
+        self.frame_uniforms = None
+        # draws submitted during render(), sorted and executed at the end of the frame
+        self.render_queue = RenderQueue()
+        # frustum of self.camera, updated every frame
+        self.culler = FrustumCuller()
 
     def init(self):
+        if self.backend != "sdl":
+            self.init_headless()
+            return
         sdl2.SDL_Init(sdl2.SDL_INIT_EVERYTHING)  # Initialize SDL2
 
         if self.full_screen:
@@ -68,30 +89,34 @@ class OpenGLApp(ABC):
             rich.print(f"Could not create window: {sdl2.SDL_GetError()}")
             sys.exit(-1)
         self.context = sdl2.SDL_GL_CreateContext(self.window)
+        # a new context starts with the default state
+        gl_state.invalidate()
         # set the window to fullscreen
         if self.full_screen:
             sdl2.SDL_SetWindowFullscreen(self.window, sdl2.SDL_WINDOW_FULLSCREEN)
 
     def set_window_title(self, newTitle):
-        sdl2.SDL_SetWindowTitle(self.window, newTitle.encode("utf-8"))
+        if self.window is not None:
+            sdl2.SDL_SetWindowTitle(self.window, newTitle.encode("utf-8"))
 
     @abstractmethod
     def update(self):
         """
         Update the application state
-        This method is called every frame
-        and should be overwritten in the child class
+        This method is called tick_rate times per second (self.timestep.dt seconds per call),
+        zero or more times per frame, and should be overwritten in the child class
         """
         raise NotImplementedError(
             "update() method should be overwritten in the child class"
         )
 
     @abstractmethod
-    def render(self):
+    def render(self, alpha: float):
         """
         Render the application
-        This method is called every frame
-        and should be overwritten in the child class
+        This method is called every frame, alpha (0 to 1) is how far the frame is
+        between the last update and the next one, for interpolating the motion.
+        It should be overwritten in the child class
         """
         raise NotImplementedError(
             "render() method should be overwritten in the child class"
@@ -108,38 +133,113 @@ class OpenGLApp(ABC):
             "setup() method should be overwritten in the child class"
         )
 
+    def load_assets(self):
+        """
+        Declare the assets of the application with self.assets
+        This method is called once before setup(), the assets load in the background
+        while render_loading() draws the progress, and setup() runs when all are ready.
+        It can be overwritten in the child class
+        """
+        pass
+
+    def render_loading(self, progress: float):
+        """
+        Render a frame while the assets are loading
+        The default draws a progress bar with scissored clears,
+        it can be overwritten in the child class
+        """
+        GL.glClearColor(0.1, 0.1, 0.1, 1.0)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
+        gl_state.enable(GL.GL_SCISSOR_TEST)
+        width = self.window_width // 2
+        height = max(4, self.window_height // 40)
+        x = (self.window_width - width) // 2
+        y = (self.window_height - height) // 2
+        GL.glScissor(x, y, width, height)
+        GL.glClearColor(0.3, 0.3, 0.3, 1.0)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        GL.glScissor(x, y, int(width * progress), height)
+        GL.glClearColor(0.2, 0.7, 0.2, 1.0)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT)
+        gl_state.disable(GL.GL_SCISSOR_TEST)
+
+    def update_frame_uniforms(self):
+        """
+        Upload the camera (self.camera if the application has one), viewport and time
+        to the FrameUniforms block read by the pipelines, once per frame before render()
+        """
+        camera = getattr(self, "camera", None)
+        if camera is None:
+            return
+        if self.frame_uniforms is None:
+            self.frame_uniforms = FrameUniforms()
+        self.render_queue.set_camera(camera)
+        self.culler.update(camera)
+        self.frame_uniforms.update(
+            camera, self.window_width, self.window_height, sdl2.SDL_GetTicks() / 1000
+        )
+
     def run(self):
         if self.running:
             logging.error("Application is already running")
             return
         self.running = True
         self.init()
-        self.setup()
-        self.main_loop()
+        self.load_assets()
+        self.loading_loop()
+        if self.running:
+            self.setup()
+            self.main_loop()
         self.quit()
 
+    def loading_loop(self):
+        """
+        Keep rendering render_loading() frames until every declared asset is ready
+        """
+        while self.running and not self.assets.done():
+            self.poll_events()
+            # the loading frames have no other work, give the uploads most of the frame
+            self.assets.process_uploads(budget=0.012)
+            self.render_loading(self.assets.progress)
+            self.set_window_title(f"{self.window_title} - loading {self.assets.progress:.0%}")
+            self.swap_buffers()
+        self.set_window_title(self.window_title)
+        if self.assets.failed > 0:
+            logging.error(f"{self.assets.failed} assets failed to load")
+
     def main_loop(self):
+        self.timestep.reset()
+        self.frames_drawn = 0
+        profiler = self.profiler
         while self.running:
-            self.event = sdl2.SDL_Event()
-            while sdl2.SDL_PollEvent(self.event):
-                if self.event.type == sdl2.SDL_QUIT:
-                    self.running = False
-                elif self.event.type == sdl2.SDL_KEYDOWN:
-                    if self.event.key.keysym.sym == sdl2.SDLK_ESCAPE:
-                        self.running = False
+            profiler.begin_frame()
+            self.poll_events()
+            # finish the assets requested after the loading phase
+            with profiler.scope("uploads"):
+                self.assets.process_uploads(self.upload_budget)
             # update frame time
             self.frameTime = sdl2.SDL_GetTicks()
-            self.update()  # Update the application state
-            self.render()  # Render the application
-            sdl2.SDL_GL_SwapWindow(self.window)  # Swap the window buffers
+            with profiler.scope("update"):
+                for _ in range(self.timestep.advance()):
+                    self.update()  # Update the application state, at the fixed tick rate
+            with profiler.scope("render"), profiler.gpu_scope("render"):
+                self.update_frame_uniforms()  # Upload the camera for all the pipelines
+                self.render(self.timestep.alpha)  # Render the application
+                with profiler.scope("flush"), profiler.gpu_scope("flush"):
+                    self.render_queue.flush()  # Execute the queued draws, sorted
+            self.present_frame()  # Swap the window buffers
+            gl_state.end_frame()  # binds and enables issued and saved this frame
+            self.culler.end_frame()  # objects tested and culled this frame
             self.frameCount += 1
+            self.finish_frame()  # frame rate cap and frame limit
         self.quit()
 
     def quit(self):
-        sdl2.SDL_GL_DeleteContext(self.context)
-        sdl2.SDL_DestroyWindow(self.window)
-        sdl2.SDL_Quit()
-        logging.info("Application closed")
+        self.assets.shutdown()
+        if self.frame_uniforms is not None:
+            self.frame_uniforms.delete()
+            self.frame_uniforms = None
+        self.close_backend()
 
 
 if __name__ == "__main__":
@@ -176,8 +276,8 @@ if __name__ == "__main__":
 
             # OpenGL Initialization
             GL.glClearColor(0.2, 0.2, 0.2, 1)
-            GL.glEnable(GL.GL_DEPTH_TEST)
-            GL.glEnable(GL.GL_MULTISAMPLE)
+            gl_state.enable(GL.GL_DEPTH_TEST)
+            gl_state.enable(GL.GL_MULTISAMPLE)
 
             # Pipeline (shaders)
             self.shader = ShaderProgram("SimplePipeline")
@@ -192,12 +292,12 @@ if __name__ == "__main__":
             color = array("f", [1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0])
 
             self.triangleArrayBufferId = GL.glGenVertexArrays(1)
-            GL.glBindVertexArray(self.triangleArrayBufferId)
+            gl_state.bind_vertex_array(self.triangleArrayBufferId)
             GL.glEnableVertexAttribArray(0)
             GL.glEnableVertexAttribArray(1)
 
             idVertexBuff = GL.glGenBuffers(1)
-            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, idVertexBuff)
+            gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, idVertexBuff)
             GL.glBufferData(
                 GL.GL_ARRAY_BUFFER,
                 len(position) * position.itemsize,
@@ -207,7 +307,7 @@ if __name__ == "__main__":
             GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
 
             idColorBuff = GL.glGenBuffers(1)
-            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, idColorBuff)
+            gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, idColorBuff)
             GL.glBufferData(
                 GL.GL_ARRAY_BUFFER,
                 len(color) * color.itemsize,
@@ -228,26 +328,30 @@ if __name__ == "__main__":
             self.camera.process_mouse_movement(x.value, y.value)
 
             rich.print(
-                f"Frame rate: {self.frameCount/self.frameTime:.2f} FPS \t Frame time: {self.frameTime/self.frameCount:.2f} ms \t Camera Position: {self.camera.position}",
+                f"{self.profiler.summary()} \t Camera Position: {self.camera.position} \t GL calls saved: {gl_state.last_frame[1]} \t Culled: {self.culler.last_frame[2]}",
                 end="\r",
             )
 
-        def render(self):
+        def render(self, alpha):
             GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
             with self.shader as shader:
-                shader.set_uniform(b"view_matrix", self.camera.get_view_matrix())
-                shader.set_uniform(b"proj_matrix", self.camera.projection)
+                # looked up once, set for every triangle
+                set_model_matrix = shader.setter(b"model_matrix")
                 # draw a serpinski triangle
                 def draw_triangle(position, size, iterations, rotation):
                     if iterations == 0:
                         return
+                    # the children are at most 2 * sqrt(2) * size away,
+                    # a sphere of 3 * size holds the whole subtree
+                    if not self.culler.sphere_visible(position, 3 * size):
+                        return
                     mat = glm.mat4(1.0)
                     mat = glm.translate(mat, position)
                     mat = glm.scale(mat, glm.vec3(size))
                     mat = glm.rotate(mat, glm.radians(rotation.x), glm.vec3(1, 0, 0)) # x
                     mat = glm.rotate(mat, glm.radians(rotation.y), glm.vec3(0, 1, 0)) # y
                     mat = glm.rotate(mat, glm.radians(rotation.z), glm.vec3(0, 0, 1)) # z
-                    shader.set_uniform(b"model_matrix", mat)
+                    set_model_matrix(mat)
                     GL.glDrawArrays(GL.GL_TRIANGLES, 0, 3)
                     draw_triangle(
                         position + glm.vec3(0, size, 0), size / 2, iterations - 1 , rotation
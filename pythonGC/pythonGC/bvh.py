@@ -0,0 +1,648 @@
+from __future__ import annotations
+
+import glm
+import numpy as np
+
+from culling import boxes_visible, frustum_planes
+
+"""
+Bounding volume hierarchies for ray picking and frustum queries:
+BVH over axis aligned boxes (the objects of a scene) and TriangleBVH over
+the triangles of a mesh.
+
+The tree is built one level at a time, all the nodes of a level are split together
+with a binned surface area heuristic (SAH) computed with numpy over all their items,
+so the Python work grows with the depth of the tree and not with the number of nodes.
+The nodes live in flat arrays, the two children of a node are stored next to each other.
+Queries walk the tree the same way, a level of (ray, node) pairs at a time,
+so many rays are traced together.
+"""
+
+# bins of the surface area heuristic per axis
+bvh_bins = 16
+# largest number of items in a leaf
+bvh_leaf_size = 4
+# rays and triangles closer than this do not hit
+ray_epsilon = 1e-7
+
+
+def _area(box_min: np.ndarray, box_max: np.ndarray) -> np.ndarray:
+    # half the surface area, the heuristic only compares them
+    size = box_max - box_min
+    return (
+        size[..., 0] * size[..., 1]
+        + size[..., 1] * size[..., 2]
+        + size[..., 2] * size[..., 0]
+    )
+
+
+def _segment_positions(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # the positions start, start + 1, ... of every segment, concatenated
+    total = int(counts.sum())
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + (np.arange(total) - offsets)
+
+
+def _slab(box_min, box_max, origins, inverse) -> np.ndarray:
+    # entry distance of the rays in the boxes, inf when they miss,
+    # fmin and fmax skip the nan of a ray parallel to a face and lying on it
+    t1 = (box_min - origins) * inverse
+    t2 = (box_max - origins) * inverse
+    near = np.fmax.reduce(np.fmin(t1, t2), axis=1)
+    far = np.fmin.reduce(np.fmax(t1, t2), axis=1)
+    near = np.maximum(near, 0.0)
+    return np.where(far >= near, near, np.inf)
+
+
+def intersect_triangles(origins, directions, v0, edge1, edge2) -> np.ndarray:
+    """
+    intersect_triangles(origins, directions, v0, edge1, edge2)
+    Distances along the rays of their hits on the triangles (Moller-Trumbore),
+    one ray per triangle (or broadcast), inf when they miss
+    """
+    p = np.cross(directions, edge2)
+    det = (edge1 * p).sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inverse = 1.0 / det
+        s = origins - v0
+        u = (s * p).sum(axis=-1) * inverse
+        q = np.cross(s, edge1)
+        v = (directions * q).sum(axis=-1) * inverse
+        t = (edge2 * q).sum(axis=-1) * inverse
+    hit = (
+        (np.abs(det) > ray_epsilon)
+        & (u >= 0.0)
+        & (v >= 0.0)
+        & (u + v <= 1.0)
+        & (t > ray_epsilon)
+    )
+    return np.where(hit, t, np.inf)
+
+
+def world_boxes(matrices: np.ndarray, box_min, box_max) -> tuple:
+    """
+    world_boxes(matrices, box_min, box_max)
+    The world axis aligned boxes of local boxes moved by (n, 16) model matrices
+    (column by column, like glm), one box for all or one per matrix
+    """
+    matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+    box_min = np.asarray(box_min, dtype=np.float32)
+    box_max = np.asarray(box_max, dtype=np.float32)
+    center = (box_min + box_max) / 2
+    extent = (box_max - box_min) / 2
+    # indexed [matrix, column, row]
+    linear = matrices[:, :3, :3]
+    center = np.einsum(
+        "ncr,nc->nr", linear, np.broadcast_to(center, (len(matrices), 3))
+    )
+    center += matrices[:, 3, :3]
+    extent = np.einsum(
+        "ncr,nc->nr", np.abs(linear), np.broadcast_to(extent, (len(matrices), 3))
+    )
+    return center - extent, center + extent
+
+
+def screen_rays(camera, x, y, width: int, height: int) -> tuple:
+    """
+    screen_rays(camera, x, y, width, height)
+    Rays from the camera through window positions in pixels (the mouse position,
+    y down like SDL), x and y are numbers or arrays.
+    Returns the (n, 3) origins and normalized directions
+    """
+    inverse = np.array(glm.inverse(camera.get_view_projection_matrix()).to_list()).T
+    x = np.atleast_1d(np.asarray(x, dtype=np.float64))
+    y = np.atleast_1d(np.asarray(y, dtype=np.float64))
+    ndc_x = (x + 0.5) / width * 2.0 - 1.0
+    ndc_y = 1.0 - (y + 0.5) / height * 2.0
+    # points on the near and far planes
+    points = []
+    for z in (-1.0, 1.0):
+        clip = np.stack(
+            [ndc_x, ndc_y, np.full_like(ndc_x, z), np.ones_like(ndc_x)], axis=1
+        )
+        world = clip @ inverse.T
+        points.append(world[:, :3] / world[:, 3:])
+    directions = points[1] - points[0]
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+    return points[0], directions
+
+
+class BVH:
+    """
+    BVH class:
+    Bounding volume hierarchy over (n, 3) boxes, the items are the box indices.
+    Node i is a leaf with counts[i] items from order[firsts[i]],
+    or has the children firsts[i] and firsts[i] + 1 when counts[i] is 0
+    """
+
+    def __init__(
+        self,
+        box_min: np.ndarray,
+        box_max: np.ndarray,
+        leaf_size: int = bvh_leaf_size,
+        bins: int = bvh_bins,
+    ):
+        self.leaf_size = leaf_size
+        self.bins = bins
+        self.box_min = np.asarray(box_min, dtype=np.float32).reshape(-1, 3)
+        self.box_max = np.asarray(box_max, dtype=np.float32).reshape(-1, 3)
+        self.build()
+
+    @property
+    def count(self) -> int:
+        return len(self.box_min)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.counts)
+
+    def build(self):
+        """
+        build()
+        Build the tree from the item boxes, level by level
+        """
+        n = self.count
+        capacity = max(2 * n - 1, 1)
+        self.node_min = np.zeros((capacity, 3), dtype=np.float32)
+        self.node_max = np.zeros((capacity, 3), dtype=np.float32)
+        self.firsts = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.parents = np.full(capacity, -1, dtype=np.int64)
+        self.depths = np.zeros(capacity, dtype=np.int64)
+        self.order = np.zeros(n, dtype=np.int64)
+        centers = (self.box_min + self.box_max) / 2
+        # the items of the nodes of the current level, node by node
+        items = np.arange(n)
+        nodes = np.zeros(1, dtype=np.int64)
+        sizes = np.array([n], dtype=np.int64)
+        next_node = 1
+        placed = 0
+        depth = 0
+        while n and len(nodes):
+            starts = np.cumsum(sizes) - sizes
+            self.node_min[nodes] = np.minimum.reduceat(self.box_min[items], starts)
+            self.node_max[nodes] = np.maximum.reduceat(self.box_max[items], starts)
+            self.depths[nodes] = depth
+            axes, splits, bin_ids = self._best_splits(
+                items, centers[items], starts, sizes
+            )
+            split = (sizes > self.leaf_size) & (axes >= 0)
+
+            # the leaves take their items from the order
+            leaves = nodes[~split]
+            leaf_sizes = sizes[~split]
+            self.firsts[leaves] = placed + np.cumsum(leaf_sizes) - leaf_sizes
+            self.counts[leaves] = leaf_sizes
+            owner = np.repeat(np.arange(len(nodes)), sizes)
+            in_leaf = ~split[owner]
+            self.order[placed : placed + int(leaf_sizes.sum())] = items[in_leaf]
+            placed += int(leaf_sizes.sum())
+
+            # the split nodes get two consecutive children
+            parents = nodes[split]
+            children = next_node + 2 * np.arange(len(parents))
+            next_node += 2 * len(parents)
+            self.firsts[parents] = children
+            self.counts[parents] = 0
+            self.parents[children] = parents
+            self.parents[children + 1] = parents
+            rank = np.cumsum(split) - 1
+            owner, items, bin_ids = owner[~in_leaf], items[~in_leaf], bin_ids[~in_leaf]
+            right = bin_ids[np.arange(len(items)), axes[owner]] > splits[owner]
+            child = 2 * rank[owner] + right
+            sort = np.argsort(child, kind="stable")
+            items = items[sort]
+            sizes = np.bincount(child, minlength=2 * len(parents))
+            nodes = np.stack([children, children + 1], axis=1).reshape(-1)
+            depth += 1
+        self._trim(next_node if n else 0)
+
+    def _trim(self, node_count: int):
+        for name in ("node_min", "node_max", "firsts", "counts", "parents", "depths"):
+            setattr(self, name, getattr(self, name)[:node_count])
+        # leaf of every item and the inner nodes of every depth, the deepest first
+        self.item_leaf = np.zeros(self.count, dtype=np.int64)
+        leaves = np.flatnonzero(self.counts)
+        self.item_leaf[self.order] = np.repeat(leaves, self.counts[leaves])
+        inner = np.flatnonzero(self.counts == 0)
+        self.levels = [
+            inner[self.depths[inner] == depth]
+            for depth in range(int(self.depths.max(initial=0)), -1, -1)
+        ]
+
+    def _best_splits(self, items, centers, starts, sizes) -> tuple:
+        # the axis and bin of the cheapest split of every node (axis -1 without one),
+        # and the bins of the items on the 3 axes
+        bins = self.bins
+        k = len(sizes)
+        low = np.minimum.reduceat(centers, starts)
+        high = np.maximum.reduceat(centers, starts)
+        extent = high - low
+        owner = np.repeat(np.arange(k), sizes)
+        with np.errstate(divide="ignore"):
+            scale = np.where(extent > 0, bins / extent, 0.0)
+        bin_ids = ((centers - low[owner]) * scale[owner]).astype(np.int64)
+        np.minimum(bin_ids, bins - 1, out=bin_ids)
+        box_min = self.box_min[items]
+        box_max = self.box_max[items]
+        costs = np.full((3, k, bins - 1), np.inf)
+        for axis in range(3):
+            keys = owner * bins + bin_ids[:, axis]
+            counts = np.bincount(keys, minlength=k * bins).reshape(k, bins)
+            # bounds of the non empty bins, reduced over the items sorted by bin
+            sort = np.argsort(keys, kind="stable")
+            filled = np.flatnonzero(counts.reshape(-1))
+            bin_starts = (
+                np.cumsum(counts.reshape(-1)[filled]) - counts.reshape(-1)[filled]
+            )
+            bin_min = np.full((k * bins, 3), np.inf, dtype=np.float32)
+            bin_max = np.full((k * bins, 3), -np.inf, dtype=np.float32)
+            bin_min[filled] = np.minimum.reduceat(box_min[sort], bin_starts)
+            bin_max[filled] = np.maximum.reduceat(box_max[sort], bin_starts)
+            bin_min = bin_min.reshape(k, bins, 3)
+            bin_max = bin_max.reshape(k, bins, 3)
+            # boxes and counts on the left of split i (bins 0..i) and on its right
+            left_count = np.cumsum(counts, axis=1)[:, :-1]
+            right_count = sizes[:, None] - left_count
+            with np.errstate(invalid="ignore"):
+                left = _area(
+                    np.minimum.accumulate(bin_min, axis=1)[:, :-1],
+                    np.maximum.accumulate(bin_max, axis=1)[:, :-1],
+                )
+                right = _area(
+                    np.minimum.accumulate(bin_min[:, ::-1], axis=1)[:, ::-1][:, 1:],
+                    np.maximum.accumulate(bin_max[:, ::-1], axis=1)[:, ::-1][:, 1:],
+                )
+                cost = left_count * left + right_count * right
+            valid = (
+                (left_count > 0) & (right_count > 0) & (extent[:, axis] > 0)[:, None]
+            )
+            costs[axis] = np.where(valid, cost, np.inf)
+        costs = costs.transpose(1, 0, 2).reshape(k, -1)
+        best = np.argmin(costs, axis=1)
+        found = np.isfinite(costs[np.arange(k), best])
+        axes = np.where(found, best // (bins - 1), -1)
+        return axes, best % (bins - 1), bin_ids
+
+    def _set_leaf_bounds(self, leaves: np.ndarray):
+        counts = self.counts[leaves]
+        items = self.order[_segment_positions(self.firsts[leaves], counts)]
+        starts = np.cumsum(counts) - counts
+        self.node_min[leaves] = np.minimum.reduceat(self.box_min[items], starts)
+        self.node_max[leaves] = np.maximum.reduceat(self.box_max[items], starts)
+
+    def refit(
+        self, box_min: np.ndarray = None, box_max: np.ndarray = None, items=None
+    ) -> int:
+        """
+        refit(box_min, box_max, items)
+        Update the node boxes after the item boxes moved, keeping the tree.
+        With items only those boxes changed (box_min and box_max hold their new boxes)
+        and only their leaves and the nodes above them are updated.
+        Returns the number of nodes updated
+        """
+        if not self.node_count:
+            return 0
+        if items is None:
+            if box_min is not None:
+                self.box_min[:] = np.asarray(box_min, dtype=np.float32).reshape(-1, 3)
+                self.box_max[:] = np.asarray(box_max, dtype=np.float32).reshape(-1, 3)
+            leaves = np.flatnonzero(self.counts)
+            dirty = np.ones(self.node_count, dtype=bool)
+        else:
+            items = np.atleast_1d(np.asarray(items, dtype=np.int64))
+            self.box_min[items] = np.asarray(box_min, dtype=np.float32).reshape(-1, 3)
+            self.box_max[items] = np.asarray(box_max, dtype=np.float32).reshape(-1, 3)
+            leaves = np.unique(self.item_leaf[items])
+            dirty = np.zeros(self.node_count, dtype=bool)
+            nodes = leaves
+            while len(nodes):
+                nodes = np.unique(self.parents[nodes])
+                nodes = nodes[nodes >= 0]
+                nodes = nodes[~dirty[nodes]]
+                dirty[nodes] = True
+            dirty[leaves] = True
+        self._set_leaf_bounds(leaves)
+        for level in self.levels:
+            nodes = level[dirty[level]]
+            left = self.firsts[nodes]
+            self.node_min[nodes] = np.minimum(
+                self.node_min[left], self.node_min[left + 1]
+            )
+            self.node_max[nodes] = np.maximum(
+                self.node_max[left], self.node_max[left + 1]
+            )
+        return int(np.count_nonzero(dirty))
+
+    def _leaf_pairs(self, origins, inverse, limits):
+        # walk the tree a level of (ray, node) pairs at a time, pairs farther than
+        # the limit of their ray are dropped (the limits may shrink between levels),
+        # yields the (ray, item) pairs of the leaves reached
+        rays = np.arange(len(origins))
+        nodes = np.zeros(len(origins), dtype=np.int64)
+        while len(rays):
+            near = _slab(
+                self.node_min[nodes], self.node_max[nodes], origins[rays], inverse[rays]
+            )
+            keep = near < limits[rays]
+            rays, nodes = rays[keep], nodes[keep]
+            leaf = self.counts[nodes] > 0
+            if leaf.any():
+                counts = self.counts[nodes[leaf]]
+                positions = _segment_positions(self.firsts[nodes[leaf]], counts)
+                yield np.repeat(rays[leaf], counts), self.order[positions]
+            rays, nodes = rays[~leaf], self.firsts[nodes[~leaf]]
+            rays = np.concatenate([rays, rays])
+            nodes = np.concatenate([nodes, nodes + 1])
+
+    @staticmethod
+    def _rays(origins, directions) -> tuple:
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        with np.errstate(divide="ignore"):
+            inverse = 1.0 / directions
+        return origins, directions, inverse
+
+    def _intersect_items(self, rays, items, origins, directions, inverse) -> np.ndarray:
+        # distances of the (ray, item) pairs, the item boxes for a BVH of boxes
+        return _slab(
+            self.box_min[items], self.box_max[items], origins[rays], inverse[rays]
+        )
+
+    def intersect(
+        self, origins: np.ndarray, directions: np.ndarray, t_max=np.inf
+    ) -> tuple:
+        """
+        intersect(origins, directions, t_max)
+        The nearest item hit by each of the (n, 3) rays closer than t_max.
+        Returns the (n,) distances (inf for a miss) and items (-1 for a miss)
+        """
+        origins, directions, inverse = self._rays(origins, directions)
+        best_t = np.full(len(origins), t_max, dtype=np.float64)
+        best_item = np.full(len(origins), -1, dtype=np.int64)
+        if not self.node_count:
+            return best_t, best_item
+        for rays, items in self._leaf_pairs(origins, inverse, best_t):
+            t = self._intersect_items(rays, items, origins, directions, inverse)
+            hit = t < best_t[rays]
+            rays, items, t = rays[hit], items[hit], t[hit]
+            if len(rays):
+                # the nearest pair of every ray
+                sort = np.lexsort((t, rays))
+                rays, items, t = rays[sort], items[sort], t[sort]
+                first = np.unique(rays, return_index=True)[1]
+                best_t[rays[first]] = t[first]
+                best_item[rays[first]] = items[first]
+        return best_t, best_item
+
+    def candidates(self, origins: np.ndarray, directions: np.ndarray) -> tuple:
+        """
+        candidates(origins, directions)
+        Every (ray, item) pair whose item box is hit,
+        returns the rays, items and entry distances sorted by ray and distance
+        """
+        origins, directions, inverse = self._rays(origins, directions)
+        limits = np.full(len(origins), np.inf)
+        found = [
+            (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+        ]
+        if self.node_count:
+            for rays, items in self._leaf_pairs(origins, inverse, limits):
+                t = BVH._intersect_items(
+                    self, rays, items, origins, directions, inverse
+                )
+                hit = np.isfinite(t)
+                found.append((rays[hit], items[hit], t[hit]))
+        rays, items, t = (np.concatenate(column) for column in zip(*found))
+        sort = np.lexsort((t, rays))
+        return rays[sort], items[sort], t[sort]
+
+    def query_frustum(self, planes: np.ndarray) -> np.ndarray:
+        """
+        query_frustum(planes)
+        Sorted indices of the items whose boxes touch the frustum
+        (planes from culling.frustum_planes)
+        """
+        found = [np.zeros(0, dtype=np.int64)]
+        nodes = np.zeros(min(self.node_count, 1), dtype=np.int64)
+        while len(nodes):
+            nodes = nodes[
+                boxes_visible(planes, self.node_min[nodes], self.node_max[nodes])
+            ]
+            leaf = self.counts[nodes] > 0
+            if leaf.any():
+                counts = self.counts[nodes[leaf]]
+                items = self.order[_segment_positions(self.firsts[nodes[leaf]], counts)]
+                found.append(
+                    items[
+                        boxes_visible(planes, self.box_min[items], self.box_max[items])
+                    ]
+                )
+            nodes = self.firsts[nodes[~leaf]]
+            nodes = np.concatenate([nodes, nodes + 1])
+        return np.sort(np.concatenate(found))
+
+
+class TriangleBVH(BVH):
+    """
+    TriangleBVH class:
+    BVH over the triangles of a mesh, (n, 3) positions and (m, 3) vertex indices,
+    the items are the triangle indices
+    """
+
+    def __init__(
+        self,
+        positions: np.ndarray,
+        triangles: np.ndarray,
+        leaf_size: int = bvh_leaf_size,
+        bins: int = bvh_bins,
+    ):
+        self.triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        self._set_positions(positions)
+        super().__init__(self._box_min, self._box_max, leaf_size, bins)
+
+    @staticmethod
+    def from_arrays(arrays: dict, **kwargs) -> TriangleBVH:
+        """
+        Static method to build the BVH of the arrays of load_model_arrays
+        """
+        return TriangleBVH(arrays["position"], arrays["indices"], **kwargs)
+
+    def _set_positions(self, positions: np.ndarray):
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        corners = positions[self.triangles]
+        self.v0 = corners[:, 0]
+        self.edge1 = corners[:, 1] - corners[:, 0]
+        self.edge2 = corners[:, 2] - corners[:, 0]
+        self._box_min = corners.min(axis=1)
+        self._box_max = corners.max(axis=1)
+
+    def refit(self, positions: np.ndarray = None) -> int:
+        """
+        refit(positions)
+        Update the tree after the vertices moved (same triangles)
+        """
+        if positions is None:
+            return super().refit()
+        self._set_positions(positions)
+        return super().refit(self._box_min, self._box_max)
+
+    def _intersect_items(self, rays, items, origins, directions, inverse) -> np.ndarray:
+        return intersect_triangles(
+            origins[rays],
+            directions[rays],
+            self.v0[items],
+            self.edge1[items],
+            self.edge2[items],
+        )
+
+
+class SceneBVH:
+    """
+    SceneBVH class:
+    BVH over the world boxes of models
+    (their box_min and box_max moved by the model matrix),
+    refit() follows the models that moved.
+    A model with a triangle_bvh is picked on its triangles, the others on their box
+    """
+
+    def __init__(self, models: list, leaf_size: int = 2):
+        self.models = list(models)
+        self.matrices = self._matrices()
+        self.bvh = BVH(*self._boxes(self.matrices), leaf_size=leaf_size)
+
+    def _matrices(self) -> np.ndarray:
+        # glm matrices expose their columns as the second axis
+        matrices = [
+            np.asarray(model.get_model_matrix()).T.reshape(-1) for model in self.models
+        ]
+        return np.array(matrices, dtype=np.float32).reshape(-1, 16)
+
+    def _boxes(self, matrices: np.ndarray, models: list = None) -> tuple:
+        models = self.models if models is None else models
+        box_min = np.array([tuple(model.box_min) for model in models], dtype=np.float32)
+        box_max = np.array([tuple(model.box_max) for model in models], dtype=np.float32)
+        return world_boxes(matrices, box_min.reshape(-1, 3), box_max.reshape(-1, 3))
+
+    def refit(self) -> int:
+        """
+        refit()
+        Refit the tree over the models whose model matrix changed,
+        returns the number of models that moved
+        """
+        matrices = self._matrices()
+        moved = np.flatnonzero((matrices != self.matrices).any(axis=1))
+        if len(moved):
+            self.matrices[moved] = matrices[moved]
+            models = [self.models[i] for i in moved.tolist()]
+            self.bvh.refit(*self._boxes(matrices[moved], models), items=moved)
+        return len(moved)
+
+    def visible(self, planes: np.ndarray) -> list:
+        """
+        visible(planes)
+        The models whose world box touches the frustum
+        """
+        return [self.models[i] for i in self.bvh.query_frustum(planes).tolist()]
+
+    def pick(self, origin, direction) -> tuple:
+        """
+        pick(origin, direction)
+        The nearest model hit by a ray, as (model, distance, triangle),
+        triangle is -1 for a model without triangle_bvh. None when nothing is hit
+        """
+        _, items, entries = self.bvh.candidates(origin, direction)
+        origin = np.append(np.asarray(origin, dtype=np.float64).reshape(3), 1.0)
+        direction = np.append(np.asarray(direction, dtype=np.float64).reshape(3), 0.0)
+        best = None
+        best_t = np.inf
+        for item, entry in zip(items.tolist(), entries.tolist()):
+            if entry >= best_t:
+                break
+            model = self.models[item]
+            triangles = getattr(model, "triangle_bvh", None)
+            if triangles is None:
+                t, triangle = entry, -1
+            else:
+                # the ray in model space has the same distances
+                inverse = np.linalg.inv(
+                    self.matrices[item].reshape(4, 4).T.astype(np.float64)
+                )
+                t, triangle = triangles.intersect(
+                    (inverse @ origin)[:3], (inverse @ direction)[:3], best_t
+                )
+                t, triangle = float(t[0]), int(triangle[0])
+            if t < best_t:
+                best, best_t = (model, t, triangle), t
+        return best
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from model_util import load_model_arrays
+
+    # build and query times of the triangle BVH of a model,
+    # against testing every triangle
+    if len(sys.argv) < 2:
+        print("usage: python pythonGC/bvh.py model.ply [rays]")
+        sys.exit(1)
+    ray_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    arrays = load_model_arrays(sys.argv[1])
+    start = time.perf_counter()
+    bvh = TriangleBVH.from_arrays(arrays)
+    build = time.perf_counter() - start
+    print(
+        f"{len(bvh.triangles)} triangles, {bvh.node_count} nodes, "
+        f"depth {len(bvh.levels)}, built in {build * 1000:.0f} ms"
+    )
+
+    # rays from a sphere around the model towards points inside its box
+    random = np.random.default_rng(0)
+    low, high = bvh.node_min[0].astype(np.float64), bvh.node_max[0].astype(np.float64)
+    center, size = (low + high) / 2, float(np.linalg.norm(high - low))
+    origins = random.normal(size=(ray_count, 3))
+    origins = center + origins / np.linalg.norm(origins, axis=1)[:, None] * size
+    directions = random.uniform(low, high, size=(ray_count, 3)) - origins
+    directions /= np.linalg.norm(directions, axis=1)[:, None]
+
+    start = time.perf_counter()
+    t, triangles = bvh.intersect(origins, directions)
+    traced = time.perf_counter() - start
+    start = time.perf_counter()
+    brute = np.array(
+        [
+            intersect_triangles(origin, direction, bvh.v0, bvh.edge1, bvh.edge2).min()
+            for origin, direction in zip(origins, directions)
+        ]
+    )
+    brute_time = time.perf_counter() - start
+    same = np.allclose(t, brute, rtol=1e-5) and np.array_equal(
+        np.isinf(t), np.isinf(brute)
+    )
+    print(
+        f"{ray_count} rays, {np.isfinite(t).sum()} hits: BVH {traced * 1000:.1f} ms, "
+        f"every triangle {brute_time * 1000:.1f} ms ({brute_time / traced:.1f}x), "
+        f"same hits: {same}"
+    )
+
+    # a narrow frustum looking at a corner of the model
+    view = glm.lookAt(
+        glm.vec3(*(center + (0.0, 0.0, size))),
+        glm.vec3(*((center + high) / 2)),
+        glm.vec3(0, 1, 0),
+    )
+    projection = glm.perspective(glm.radians(30.0), 1.0, size / 100, size * 10)
+    planes = frustum_planes(projection * view)
+    start = time.perf_counter()
+    inside = bvh.query_frustum(planes)
+    queried = time.perf_counter() - start
+    start = time.perf_counter()
+    brute = np.flatnonzero(boxes_visible(planes, bvh.box_min, bvh.box_max))
+    brute_time = time.perf_counter() - start
+    print(
+        f"frustum: {len(inside)} triangles inside, BVH {queried * 1000:.2f} ms, "
+        f"every triangle {brute_time * 1000:.2f} ms, "
+        f"same: {np.array_equal(inside, brute)}"
+    )
@@ -21,11 +21,16 @@ class Camera:
         self.pitch = pitch
         self.front = glm.vec3(0.0, 0.0, -1.0)
         self.update_camera_vectors()
+        self.near = near
+        self.far = far
         self.projection = glm.perspective(glm.radians(fov), width / height, near, far)
 
     def get_view_matrix(self):
         return glm.lookAt(self.position, self.position + self.front, self.up)
 
+    def get_view_projection_matrix(self):
+        return self.projection * self.get_view_matrix()
+
     def process_keyboard(self, keys, velocity):
         if keys[sdl2.SDL_SCANCODE_W]:
             self.position += self.front * velocity
@@ -69,4 +74,6 @@ class Camera:
     def update_projection_matrix(
         self, width=800, height=600, near=0.1, far=100.0, fov=45.0
     ):
+        self.near = near
+        self.far = far
         self.projection = glm.perspective(glm.radians(fov), width / height, near, far)
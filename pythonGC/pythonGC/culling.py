@@ -0,0 +1,227 @@
+import numpy as np
+
+"""
+View frustum culling: the 6 planes of the frustum are taken from the
+view projection matrix (Gribb and Hartmann) and the bounding spheres or boxes
+of many objects are tested against them at once with numpy.
+A plane is (a, b, c, d) with the normal pointing inside, a point p is inside
+when a * x + b * y + c * z + d >= 0.
+"""
+
+# left, right, bottom, top, near, far
+plane_names = ("left", "right", "bottom", "top", "near", "far")
+
+
+def _matrix_rows(matrix) -> np.ndarray:
+    # a glm matrix or 16 floats column by column, as a 4x4 array indexed [row, column]
+    if hasattr(matrix, "to_list"):
+        return np.array(matrix.to_list(), dtype=np.float64).T
+    return np.asarray(matrix, dtype=np.float64).reshape(4, 4).T
+
+
+def frustum_planes(view_projection) -> np.ndarray:
+    """
+    frustum_planes(view_projection)
+    The (6, 4) normalized planes of the frustum of a view projection matrix
+    (glm or 16 floats column by column), normals pointing inside
+    """
+    rows = _matrix_rows(view_projection)
+    planes = np.array(
+        [
+            rows[3] + rows[0],
+            rows[3] - rows[0],
+            rows[3] + rows[1],
+            rows[3] - rows[1],
+            rows[3] + rows[2],
+            rows[3] - rows[2],
+        ]
+    )
+    planes /= np.linalg.norm(planes[:, :3], axis=1)[:, None]
+    return planes
+
+
+def _inside(
+    planes: np.ndarray, x: np.ndarray, y: np.ndarray, z: np.ndarray, reach
+) -> np.ndarray:
+    # per plane operations on contiguous rows of coordinates
+    visible = np.ones(len(x), dtype=bool)
+    for a, b, c, d in planes.tolist():
+        distance = a * x + b * y + c * z
+        visible &= distance >= -d - reach
+    return visible
+
+
+def spheres_visible(planes: np.ndarray, centers: np.ndarray, radii) -> np.ndarray:
+    """
+    spheres_visible(planes, centers, radii)
+    Mask of the (n, 3) spheres that touch the frustum, radii is one or n radii
+    """
+    x, y, z = np.ascontiguousarray(
+        np.asarray(centers, dtype=np.float32).reshape(-1, 3).T
+    )
+    return _inside(planes, x, y, z, np.asarray(radii, dtype=np.float32))
+
+
+def boxes_visible(
+    planes: np.ndarray, box_min: np.ndarray, box_max: np.ndarray
+) -> np.ndarray:
+    """
+    boxes_visible(planes, box_min, box_max)
+    Mask of the (n, 3) axis aligned boxes that touch the frustum,
+    for each plane only the corner farthest along its normal is tested
+    """
+    box_min = np.asarray(box_min, dtype=np.float32).reshape(-1, 3)
+    box_max = np.asarray(box_max, dtype=np.float32).reshape(-1, 3)
+    center = (box_min + box_max) / 2
+    extent = (box_max - box_min) / 2
+    normals = planes[:, :3].T.astype(np.float32)
+    # distance of the center plus the projection of the half extents on the normal
+    distances = center @ normals + planes[:, 3].astype(np.float32)
+    reach = extent @ np.abs(normals)
+    return (distances >= -reach).all(axis=1)
+
+
+def sphere_visible(planes: list, center, radius: float) -> bool:
+    """
+    sphere_visible(planes, center, radius)
+    Test of a single sphere without numpy, planes as returned by planes.tolist(),
+    cheaper for a few objects tested one by one (like a recursion)
+    """
+    x, y, z = center[0], center[1], center[2]
+    for a, b, c, d in planes:
+        if a * x + b * y + c * z + d < -radius:
+            return False
+    return True
+
+
+# the upper 3x3 elements of a matrix stored column by column
+_linear_elements = (0, 1, 2, 4, 5, 6, 8, 9, 10)
+
+
+def _center_weights(center) -> np.ndarray:
+    # (16, 3) weights, flat matrices times them are the moved centers
+    weights = np.zeros((16, 3), dtype=np.float32)
+    for r in range(3):
+        weights[r::4, r] = (*center, 1.0)
+    return weights
+
+
+def _transform_rows(matrices: np.ndarray, weights: np.ndarray, radius: float) -> tuple:
+    # a single matrix product gives contiguous rows of the weighted sums
+    # and the 3x3 elements,
+    # numpy is much faster along long rows than across the 16 columns of every matrix
+    matrices = np.asarray(matrices, dtype=np.float32).reshape(-1, 16)
+    select = np.zeros((16, 9), dtype=np.float32)
+    select[_linear_elements, range(9)] = 1.0
+    rows = np.concatenate([weights, select], axis=1).T @ matrices.T
+    linear = rows[-9:]
+    # squared length of every column, the largest is the largest scale
+    squares = [
+        linear[i] ** 2 + linear[i + 1] ** 2 + linear[i + 2] ** 2 for i in (0, 3, 6)
+    ]
+    scale = np.maximum(np.maximum(squares[0], squares[1]), squares[2])
+    return rows[:-9], np.sqrt(scale) * radius
+
+
+def transform_spheres(matrices: np.ndarray, center, radius: float) -> tuple:
+    """
+    transform_spheres(matrices, center, radius)
+    A model space bounding sphere moved by (n, 16) model matrices (column by column),
+    the radius grows with the largest scale of every matrix.
+    Returns the (n, 3) centers and (n,) radii
+    """
+    centers, radii = _transform_rows(matrices, _center_weights(center), radius)
+    return centers.T, radii
+
+
+class FrustumCuller:
+    """
+    FrustumCuller class:
+    Culls against the frustum of a camera,
+    update() once per frame after the camera moves.
+    Counts the objects tested and drawn since the last end_frame()
+    """
+
+    def __init__(self):
+        self.planes = None
+        self.planes_list = None
+        self.tested = 0
+        self.visible = 0
+        # (tested, visible, culled) of the last frame
+        self.last_frame = (0, 0, 0)
+
+    def update(self, camera):
+        """
+        update(camera)
+        Take the frustum of the camera
+        """
+        self.planes = frustum_planes(camera.get_view_projection_matrix())
+        self.planes_list = self.planes.tolist()
+
+    def _count(self, mask: np.ndarray) -> np.ndarray:
+        self.tested += len(mask)
+        self.visible += int(np.count_nonzero(mask))
+        return mask
+
+    def cull_spheres(self, centers: np.ndarray, radii) -> np.ndarray:
+        """
+        cull_spheres(centers, radii)
+        Indices of the visible spheres
+        """
+        return np.flatnonzero(self._count(spheres_visible(self.planes, centers, radii)))
+
+    def cull_boxes(self, box_min: np.ndarray, box_max: np.ndarray) -> np.ndarray:
+        """
+        cull_boxes(box_min, box_max)
+        Indices of the visible boxes
+        """
+        return np.flatnonzero(self._count(boxes_visible(self.planes, box_min, box_max)))
+
+    def cull_instances(self, matrices: np.ndarray, center, radius: float) -> np.ndarray:
+        """
+        cull_instances(matrices, center, radius)
+        The (n, 16) model matrices of the instances whose bounding sphere is visible,
+        compacted and ready for an instance buffer
+        """
+        # the plane distances of the moved centers come out of the same product
+        normals = self.planes[:, :3].T.astype(np.float32)
+        distances, radii = _transform_rows(
+            matrices, _center_weights(center) @ normals, radius
+        )
+        visible = np.ones(len(radii), dtype=bool)
+        for distance, offset in zip(distances, self.planes[:, 3].tolist()):
+            visible &= distance >= -offset - radii
+        mask = self._count(visible)
+        return np.asarray(matrices).reshape(-1, 16)[mask]
+
+    def cull_models(self, models: list) -> list:
+        """
+        cull_models(models)
+        The models whose bounding sphere (moved by the model matrix) is visible
+        """
+        if not models:
+            return []
+        spheres = [model.world_sphere() for model in models]
+        centers = np.array([tuple(center) for center, _ in spheres], dtype=np.float32)
+        radii = np.array([radius for _, radius in spheres], dtype=np.float32)
+        return [models[i] for i in self.cull_spheres(centers, radii)]
+
+    def sphere_visible(self, center, radius: float) -> bool:
+        """
+        sphere_visible(center, radius)
+        Test and count a single sphere
+        """
+        visible = sphere_visible(self.planes_list, center, radius)
+        self.tested += 1
+        self.visible += visible
+        return visible
+
+    def end_frame(self) -> tuple:
+        """
+        end_frame()
+        Close the counters of the frame, returns the objects tested, visible and culled
+        """
+        self.last_frame = (self.tested, self.visible, self.tested - self.visible)
+        self.tested = 0
+        self.visible = 0
+        return self.last_frame
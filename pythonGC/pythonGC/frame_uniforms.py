@@ -0,0 +1,98 @@
+import ctypes
+
+import numpy as np
+from OpenGL import GL
+
+from gl_state import gl_state
+from shader import uniform_block_bindings
+
+"""
+Per frame data shared by every pipeline in a uniform buffer:
+the block is bound to a fixed binding point, the programs that declare it
+are attached to that point when they link (see ShaderProgram.link),
+so the camera is uploaded once per frame with a single glBufferSubData
+no matter how many programs draw.
+
+The pipelines declare the block as:
+
+    layout(std140) uniform FrameUniforms {
+        mat4 view_matrix;
+        mat4 proj_matrix;
+        mat4 view_proj_matrix;
+        vec4 camera_position;
+        vec4 viewport;
+        float time;
+    };
+"""
+
+frame_block_name = b"FrameUniforms"
+
+frame_binding = uniform_block_bindings[frame_block_name]
+
+# the std140 layout of the block, every member starts at a multiple of 16 bytes
+frame_dtype = np.dtype(
+    {
+        "names": [
+            "view_matrix",
+            "proj_matrix",
+            "view_proj_matrix",
+            "camera_position",
+            "viewport",
+            "time",
+        ],
+        "formats": [
+            (np.float32, (16,)),
+            (np.float32, (16,)),
+            (np.float32, (16,)),
+            (np.float32, (4,)),
+            (np.float32, (4,)),
+            np.float32,
+        ],
+        "offsets": [0, 64, 128, 192, 208, 224],
+        "itemsize": 240,
+    }
+)
+
+
+class FrameUniforms:
+    """
+    FrameUniforms class:
+    The uniform buffer of the FrameUniforms block,
+    update() fills it from the camera once per frame
+    """
+
+    def __init__(self, binding: int = frame_binding):
+        self.binding = binding
+        self.data = np.zeros(1, dtype=frame_dtype)
+        self.ubo = GL.glGenBuffers(1)
+        gl_state.bind_buffer_base(GL.GL_UNIFORM_BUFFER, binding, self.ubo)
+        GL.glBufferData(
+            GL.GL_UNIFORM_BUFFER, self.data.nbytes, None, GL.GL_DYNAMIC_DRAW
+        )
+
+    def update(self, camera, width: int, height: int, time: float):
+        """
+        update(camera, width, height, time)
+        Upload the matrices and position of the camera, the viewport size and the time
+        in seconds, with a single call
+        """
+        view = camera.get_view_matrix()
+        projection = camera.projection
+        frame = self.data
+        # glm matrices expose their columns as the second axis
+        frame["view_matrix"] = np.asarray(view).T.reshape(-1)
+        frame["proj_matrix"] = np.asarray(projection).T.reshape(-1)
+        frame["view_proj_matrix"] = np.asarray(projection * view).T.reshape(-1)
+        frame["camera_position"] = (*camera.position, 1.0)
+        frame["viewport"] = (width, height, 1.0 / width, 1.0 / height)
+        frame["time"] = time
+        gl_state.bind_buffer(GL.GL_UNIFORM_BUFFER, self.ubo)
+        GL.glBufferSubData(
+            GL.GL_UNIFORM_BUFFER,
+            0,
+            self.data.nbytes,
+            ctypes.c_void_p(self.data.ctypes.data),
+        )
+
+    def delete(self):
+        gl_state.delete_buffer(self.ubo)
@@ -0,0 +1,150 @@
+from OpenGL import GL
+
+"""
+Shadow of the OpenGL binding state of the context:
+the bound program, vertex array, buffers, texture units and enabled capabilities
+are remembered and the calls that would not change them are dropped,
+through PyOpenGL every call costs microseconds.
+The modules that bind things (shader, texture, vertex_layout, model_util and the apps)
+go through the gl_state instance,
+a raw GL call to the same state makes the shadow wrong,
+call gl_state.invalidate() after code that does it.
+"""
+
+
+class GLState:
+    """
+    GLState class:
+    Binds and enables only when the value changes,
+    counts the calls issued and the calls saved since the last end_frame()
+    """
+
+    def __init__(self):
+        self.issued = 0
+        self.saved = 0
+        # (issued, saved) of the last frame
+        self.last_frame = (0, 0)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        invalidate()
+        Forget the shadowed state, the next calls all go to OpenGL.
+        Used for a new context and after raw GL calls
+        """
+        self.program = None
+        self.vertex_array = None
+        self.buffers = {}
+        self.active_unit = None
+        self.textures = {}
+        self.capabilities = {}
+
+    def use_program(self, program: int):
+        if program == self.program:
+            self.saved += 1
+            return
+        GL.glUseProgram(program)
+        self.program = program
+        self.issued += 1
+
+    def bind_vertex_array(self, vertex_array: int):
+        if vertex_array == self.vertex_array:
+            self.saved += 1
+            return
+        GL.glBindVertexArray(vertex_array)
+        self.vertex_array = vertex_array
+        # the element buffer binding is part of the vertex array
+        self.buffers.pop(GL.GL_ELEMENT_ARRAY_BUFFER, None)
+        self.issued += 1
+
+    def bind_buffer(self, target: int, buffer: int):
+        if self.buffers.get(target) == buffer:
+            self.saved += 1
+            return
+        GL.glBindBuffer(target, buffer)
+        self.buffers[target] = buffer
+        self.issued += 1
+
+    def bind_buffer_base(self, target: int, index: int, buffer: int):
+        """
+        bind_buffer_base(target, index, buffer)
+        Bind a buffer to an indexed binding point, it also becomes the target binding
+        """
+        GL.glBindBufferBase(target, index, buffer)
+        self.buffers[target] = buffer
+        self.issued += 1
+
+    def active_texture(self, unit: int):
+        """
+        active_texture(unit)
+        Select the texture unit, unit is the index (0 for GL_TEXTURE0)
+        """
+        if unit == self.active_unit:
+            self.saved += 1
+            return
+        GL.glActiveTexture(GL.GL_TEXTURE0 + unit)
+        self.active_unit = unit
+        self.issued += 1
+
+    def bind_texture(self, target: int, texture: int, unit: int = None):
+        """
+        bind_texture(target, texture, unit)
+        Bind a texture to a unit, without a unit to the active one
+        """
+        if unit is not None:
+            self.active_texture(unit)
+        key = (self.active_unit, target)
+        if self.active_unit is not None and self.textures.get(key) == texture:
+            self.saved += 1
+            return
+        GL.glBindTexture(target, texture)
+        self.textures[key] = texture
+        self.issued += 1
+
+    def enable(self, capability: int):
+        if self.capabilities.get(capability) is True:
+            self.saved += 1
+            return
+        GL.glEnable(capability)
+        self.capabilities[capability] = True
+        self.issued += 1
+
+    def disable(self, capability: int):
+        if self.capabilities.get(capability) is False:
+            self.saved += 1
+            return
+        GL.glDisable(capability)
+        self.capabilities[capability] = False
+        self.issued += 1
+
+    def delete_program(self, program: int):
+        # deleted names are reused, a new object must not look bound
+        GL.glDeleteProgram(program)
+        if program == self.program:
+            self.program = None
+
+    def delete_vertex_array(self, vertex_array: int):
+        GL.glDeleteVertexArrays(1, [vertex_array])
+        if vertex_array == self.vertex_array:
+            self.vertex_array = None
+            self.buffers.pop(GL.GL_ELEMENT_ARRAY_BUFFER, None)
+
+    def delete_buffer(self, buffer: int):
+        GL.glDeleteBuffers(1, [buffer])
+        for target, bound in list(self.buffers.items()):
+            if bound == buffer:
+                del self.buffers[target]
+
+    def end_frame(self) -> tuple:
+        """
+        end_frame()
+        Close the counters of the frame, returns the calls issued and saved
+        """
+        self.last_frame = (self.issued, self.saved)
+        self.issued = 0
+        self.saved = 0
+        return self.last_frame
+
+
+# the state of the context of the application (one context per process)
+gl_state = GLState()
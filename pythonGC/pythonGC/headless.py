@@ -0,0 +1,397 @@
+import ctypes
+import logging
+import os
+
+import numpy as np
+import sdl2
+from OpenGL import GL
+
+from gl_state import gl_state
+from profiler import Profiler
+from timestep import FixedTimestep
+
+"""
+Headless OpenGL contexts for OpenGLApp, to render without a window or a display:
+a surfaceless EGL context (Mesa llvmpipe or a GPU driver) or an OSMesa context,
+drawing into a Framebuffer of the requested size instead of a window.
+AppBackend holds what OpenGLApp and BasicOpenGLApp share: the SDL window or
+headless context, the fixed timestep, the profiler and the end of every frame.
+PyOpenGL loads its functions for one platform, chosen before OpenGL is first imported,
+so run the application with PYOPENGL_PLATFORM=egl or PYOPENGL_PLATFORM=osmesa:
+    PYOPENGL_PLATFORM=egl python GL3StanfordBunny.py
+"""
+
+headless_backends = ("egl", "osmesa")
+
+# OpenGL version asked to the headless contexts,
+# compatibility profile like the SDL windows
+context_version = (3, 3)
+
+# eglGetPlatformDisplayEXT platforms
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+EGL_PLATFORM_DEVICE_EXT = 0x313F
+
+
+def default_backend() -> str:
+    """
+    default_backend()
+    The headless backend PyOpenGL was loaded for, "sdl" (a window) otherwise
+    """
+    platform = os.environ.get("PYOPENGL_PLATFORM", "").lower()
+    return platform if platform in headless_backends else "sdl"
+
+
+def _check_platform(backend: str):
+    if default_backend() != backend:
+        raise Exception(
+            f"The {backend} backend needs PyOpenGL loaded for it, "
+            f"run with PYOPENGL_PLATFORM={backend}"
+        )
+
+
+class EGLContext:
+    """
+    EGLContext class:
+    A context without surfaces on the Mesa surfaceless platform,
+    or on the first EGL device (GPU servers without Mesa)
+    """
+
+    def __init__(self, width: int, height: int):
+        _check_platform("egl")
+        from OpenGL import EGL
+
+        self.EGL = EGL
+        self.width = width
+        self.height = height
+        self.display = self._display()
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(
+            self.display, ctypes.pointer(major), ctypes.pointer(minor)
+        ):
+            raise Exception("Could not initialize EGL")
+        # fmt: off
+        config_attributes = [
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_NONE,
+        ]
+        # fmt: on
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        EGL.eglChooseConfig(
+            self.display,
+            (EGL.EGLint * len(config_attributes))(*config_attributes),
+            ctypes.pointer(config),
+            1,
+            ctypes.pointer(count),
+        )
+        if count.value == 0:
+            raise Exception("No EGL config with desktop OpenGL")
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        compatibility_profile = EGL.EGL_CONTEXT_OPENGL_COMPATIBILITY_PROFILE_BIT
+        # fmt: off
+        context_attributes = [
+            EGL.EGL_CONTEXT_MAJOR_VERSION, context_version[0],
+            EGL.EGL_CONTEXT_MINOR_VERSION, context_version[1],
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, compatibility_profile,
+            EGL.EGL_NONE,
+        ]
+        # fmt: on
+        self.context = EGL.eglCreateContext(
+            self.display,
+            config,
+            EGL.EGL_NO_CONTEXT,
+            (EGL.EGLint * len(context_attributes))(*context_attributes),
+        )
+        if not self.context:
+            raise Exception(f"Could not create an OpenGL {context_version} EGL context")
+        self.make_current()
+
+    def _display(self):
+        EGL = self.EGL
+        extensions = (
+            EGL.eglQueryString(EGL.EGL_NO_DISPLAY, EGL.EGL_EXTENSIONS) or b""
+        ).split()
+        if b"EGL_EXT_platform_base" not in extensions:
+            return EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        from OpenGL.EGL.EXT.platform_base import eglGetPlatformDisplayEXT
+
+        if b"EGL_MESA_platform_surfaceless" in extensions:
+            return eglGetPlatformDisplayEXT(EGL_PLATFORM_SURFACELESS_MESA, None, None)
+        if b"EGL_EXT_platform_device" in extensions:
+            from OpenGL.EGL.EXT.device_enumeration import eglQueryDevicesEXT
+
+            devices = (EGL.EGLDeviceEXT * 1)()
+            count = EGL.EGLint()
+            eglQueryDevicesEXT(1, devices, ctypes.pointer(count))
+            if count.value > 0:
+                return eglGetPlatformDisplayEXT(
+                    EGL_PLATFORM_DEVICE_EXT, devices[0], None
+                )
+        return EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+
+    def make_current(self):
+        EGL = self.EGL
+        surface = EGL.EGL_NO_SURFACE
+        if not EGL.eglMakeCurrent(self.display, surface, surface, self.context):
+            raise Exception("Could not make the EGL context current")
+
+    def delete(self):
+        EGL = self.EGL
+        if self.context is not None:
+            surface = EGL.EGL_NO_SURFACE
+            EGL.eglMakeCurrent(self.display, surface, surface, EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroyContext(self.display, self.context)
+            EGL.eglTerminate(self.display)
+            self.context = None
+
+
+class OSMesaContext:
+    """
+    OSMesaContext class:
+    A Mesa software context, its own color buffer is not used
+    since the frames are drawn in a Framebuffer
+    """
+
+    def __init__(self, width: int, height: int):
+        _check_platform("osmesa")
+        from OpenGL import osmesa
+
+        self.osmesa = osmesa
+        self.width = width
+        self.height = height
+        self.context = None
+        if bool(osmesa.OSMesaCreateContextAttribs):
+            # fmt: off
+            attributes = [
+                osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+                osmesa.OSMESA_DEPTH_BITS, 24,
+                osmesa.OSMESA_PROFILE, osmesa.OSMESA_COMPAT_PROFILE,
+                osmesa.OSMESA_CONTEXT_MAJOR_VERSION, context_version[0],
+                osmesa.OSMESA_CONTEXT_MINOR_VERSION, context_version[1],
+                0,
+            ]
+            # fmt: on
+            self.context = osmesa.OSMesaCreateContextAttribs(
+                (ctypes.c_int * len(attributes))(*attributes), None
+            )
+        if not self.context:
+            # older Mesa, whatever version the driver gives
+            self.context = osmesa.OSMesaCreateContextExt(
+                osmesa.OSMESA_RGBA, 24, 0, 0, None
+            )
+        if not self.context:
+            raise Exception("Could not create an OSMesa context")
+        # OSMesa needs a buffer to make the context current
+        self.buffer = np.zeros((height, width, 4), dtype=np.uint8)
+        self.make_current()
+
+    def make_current(self):
+        if not self.osmesa.OSMesaMakeCurrent(
+            self.context, self.buffer, GL.GL_UNSIGNED_BYTE, self.width, self.height
+        ):
+            raise Exception("Could not make the OSMesa context current")
+
+    def delete(self):
+        if self.context is not None:
+            self.osmesa.OSMesaDestroyContext(self.context)
+            self.context = None
+            self.buffer = None
+
+
+def create_context(backend: str, width: int, height: int):
+    """
+    create_context(backend, width, height)
+    A current headless context, backend is "egl" or "osmesa"
+    """
+    if backend == "egl":
+        return EGLContext(width, height)
+    if backend == "osmesa":
+        return OSMesaContext(width, height)
+    raise Exception(
+        f"Unknown headless backend {backend}, expected one of {headless_backends}"
+    )
+
+
+class Framebuffer:
+    """
+    Framebuffer class:
+    An RGBA8 color and a 24 bit depth, 8 bit stencil renderbuffer,
+    the target of the frames of a headless application
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.fbo = GL.glGenFramebuffers(1)
+        self.color, self.depth = GL.glGenRenderbuffers(2)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.fbo)
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, self.color)
+        GL.glRenderbufferStorage(GL.GL_RENDERBUFFER, GL.GL_RGBA8, width, height)
+        GL.glFramebufferRenderbuffer(
+            GL.GL_FRAMEBUFFER, GL.GL_COLOR_ATTACHMENT0, GL.GL_RENDERBUFFER, self.color
+        )
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, self.depth)
+        GL.glRenderbufferStorage(
+            GL.GL_RENDERBUFFER, GL.GL_DEPTH24_STENCIL8, width, height
+        )
+        GL.glFramebufferRenderbuffer(
+            GL.GL_FRAMEBUFFER,
+            GL.GL_DEPTH_STENCIL_ATTACHMENT,
+            GL.GL_RENDERBUFFER,
+            self.depth,
+        )
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, 0)
+        status = GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER)
+        if status != GL.GL_FRAMEBUFFER_COMPLETE:
+            self.delete()
+            raise Exception(f"Framebuffer incomplete: {status}")
+        GL.glViewport(0, 0, width, height)
+
+    def bind(self):
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self.fbo)
+        GL.glViewport(0, 0, self.width, self.height)
+
+    def read_pixels(self) -> np.ndarray:
+        """
+        read_pixels()
+        The color buffer as a (height, width, 4) uint8 array, first row at the top
+        """
+        GL.glBindFramebuffer(GL.GL_READ_FRAMEBUFFER, self.fbo)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        data = GL.glReadPixels(
+            0, 0, self.width, self.height, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE
+        )
+        pixels = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 4)
+        return pixels[::-1].copy()
+
+    def delete(self):
+        if self.fbo is not None:
+            GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, 0)
+            GL.glDeleteRenderbuffers(2, [self.color, self.depth])
+            GL.glDeleteFramebuffers(1, [self.fbo])
+            self.fbo = None
+
+
+class AppBackend:
+    """
+    AppBackend class:
+    The window or headless context and the frame lifecycle of an application,
+    the base of OpenGLApp and BasicOpenGLApp
+    """
+
+    def _init_backend(
+        self,
+        tick_rate: float,
+        max_steps: int,
+        frame_rate: float,
+        backend: str,
+        frames: int,
+        trace_file: str = None,
+    ):
+        self.running = False
+        self.window = None
+        self.context = None
+        self.event = None
+        # update() runs tick_rate times per second, frame_rate caps the rendered frames
+        self.timestep = FixedTimestep(tick_rate, max_steps, frame_rate)
+        # CPU and GPU times of the frames, written to trace_file (Chrome trace) on quit
+        self.profiler = Profiler()
+        self.trace_file = trace_file
+        # "sdl" for a window, "egl" or "osmesa" to render into self.framebuffer
+        # without a display
+        self.backend = backend or default_backend()
+        self.framebuffer = None
+        # main_loop() stops after this many frames, None runs until stopped
+        self.frames = frames
+        self.frames_drawn = 0
+
+    def init_headless(self):
+        """
+        Create the headless context and the framebuffer the frames are drawn in,
+        SDL only keeps the timer and the events, there is no window
+        """
+        sdl2.SDL_Init(sdl2.SDL_INIT_TIMER | sdl2.SDL_INIT_EVENTS)
+        logging.info(
+            f"Headless {self.backend}: {self.window_width}x{self.window_height}"
+        )
+        self.context = create_context(
+            self.backend, self.window_width, self.window_height
+        )
+        gl_state.invalidate()
+        self.framebuffer = Framebuffer(self.window_width, self.window_height)
+
+    def swap_buffers(self):
+        if self.window is not None:
+            sdl2.SDL_GL_SwapWindow(self.window)
+        else:
+            # nothing to show, send the frame to the GPU like a swap would
+            GL.glFlush()
+
+    def poll_events(self):
+        self.event = sdl2.SDL_Event()
+        while sdl2.SDL_PollEvent(self.event):
+            if self.event.type == sdl2.SDL_QUIT:
+                self.running = False
+            elif self.event.type == sdl2.SDL_KEYDOWN:
+                if self.event.key.keysym.sym == sdl2.SDLK_ESCAPE:
+                    self.running = False
+
+    def frame_drawn(self):
+        """
+        Called after every frame is drawn
+        With a headless backend self.framebuffer.read_pixels() returns the frame.
+        It can be overwritten in the child class
+        """
+        pass
+
+    def present_frame(self):
+        """
+        present_frame()
+        Swap the rendered frame and call frame_drawn()
+        """
+        with self.profiler.scope("swap"):
+            self.swap_buffers()  # Swap the window buffers
+        self.frame_drawn()
+
+    def finish_frame(self):
+        """
+        finish_frame()
+        Wait for the frame rate cap, close the profiler frame
+        and stop the main loop after self.frames frames
+        """
+        with self.profiler.scope("wait"):
+            self.timestep.wait()  # frame rate cap
+        self.profiler.end_frame()
+        self.frames_drawn += 1
+        if self.frames is not None and self.frames_drawn >= self.frames:
+            self.stop()
+
+    def stop(self):
+        """
+        End the main loop after the current frame
+        """
+        self.running = False
+
+    def close_backend(self):
+        """
+        close_backend()
+        Write the trace, delete the profiler queries, the framebuffer
+        and the context (or the window) and quit SDL
+        """
+        if self.trace_file is not None:
+            self.profiler.export_chrome_trace(self.trace_file)
+            self.trace_file = None
+        self.profiler.delete()
+        if self.framebuffer is not None:
+            self.framebuffer.delete()
+            self.framebuffer = None
+        if self.backend != "sdl":
+            if self.context is not None:
+                self.context.delete()
+                self.context = None
+        else:
+            sdl2.SDL_GL_DeleteContext(self.context)
+            sdl2.SDL_DestroyWindow(self.window)
+        sdl2.SDL_Quit()
+        logging.info("Application closed")
@@ -0,0 +1,389 @@
+from __future__ import annotations
+import numpy as np
+import glm
+
+from model_util import Model, bounding_sphere, load_model_arrays
+from mesh_cache import MeshCache
+from shader import ShaderProgram
+
+"""
+Levels of detail:
+a chain of simplified meshes generated with quadric error edge collapses
+(Garland and Heckbert 1997), collapsed in batches of independent edges
+so every pass is a handful of numpy operations,
+and a model that draws the level matching its size on the screen.
+"""
+
+# triangles kept from one level to the next
+lod_ratio = 0.25
+
+# screen size (pixels of the bounding sphere diameter) under which the first
+# simplified level is used, every next level halves it
+lod_base_pixels = 400.0
+
+# fraction of the switching size a model must cross before it changes level again
+lod_hysteresis = 0.15
+
+# weight of the planes that keep the open borders of a mesh in place
+boundary_weight = 10.0
+
+# at most this fraction of the edges is collapsed in a single pass
+collapse_fraction = 0.25
+
+
+def _plane_quadrics(positions: np.ndarray, triangles: np.ndarray) -> tuple:
+    # area weighted plane quadric of every triangle and the triangle normals
+    a, b, c = (positions[triangles[:, i]] for i in range(3))
+    normals = np.cross(b - a, c - a)
+    areas = np.linalg.norm(normals, axis=1)
+    unit = normals / np.maximum(areas, 1e-30)[:, None]
+    planes = np.concatenate([unit, -(unit * a).sum(axis=1, keepdims=True)], axis=1)
+    quadrics = planes[:, :, None] * planes[:, None, :] * (areas / 2)[:, None, None]
+    return quadrics, unit
+
+
+def _edges(triangles: np.ndarray) -> tuple:
+    # unique edges (low, high) and, for every corner edge, its unique edge
+    corner_edges = np.stack(
+        [triangles, np.roll(triangles, -1, axis=1)], axis=2
+    ).reshape(-1, 2)
+    low = corner_edges.min(axis=1).astype(np.int64)
+    high = corner_edges.max(axis=1).astype(np.int64)
+    # a single integer key per edge is much faster to sort than rows
+    stride = int(high.max()) + 1 if len(high) else 1
+    keys, inverse, counts = np.unique(
+        low * stride + high, return_inverse=True, return_counts=True
+    )
+    edges = np.stack([keys // stride, keys % stride], axis=1)
+    return edges, inverse.reshape(-1), counts
+
+
+def vertex_quadrics(positions: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """
+    vertex_quadrics(positions, triangles)
+    The error quadric of every vertex, the sum of the planes of its triangles
+    plus planes perpendicular to the open borders
+    """
+    vertex_count = len(positions)
+    quadrics, normals = _plane_quadrics(positions, triangles)
+    result = np.zeros((vertex_count, 16))
+    flat = quadrics.reshape(-1, 16)
+    for corner in range(3):
+        for j in range(16):
+            result[:, j] += np.bincount(triangles[:, corner], flat[:, j], vertex_count)
+    # edges used by a single triangle are borders
+    edges, inverse, counts = _edges(triangles)
+    border = counts[inverse] == 1
+    if border.any():
+        corners = np.stack([triangles, np.roll(triangles, -1, axis=1)], axis=2).reshape(
+            -1, 2
+        )
+        corners = corners[border]
+        faces = np.nonzero(border)[0] // 3
+        direction = positions[corners[:, 1]] - positions[corners[:, 0]]
+        length = np.linalg.norm(direction, axis=1)
+        normal = np.cross(direction, normals[faces])
+        normal /= np.maximum(np.linalg.norm(normal, axis=1), 1e-30)[:, None]
+        planes = np.concatenate(
+            [normal, -(normal * positions[corners[:, 0]]).sum(axis=1, keepdims=True)],
+            axis=1,
+        )
+        border_quadrics = (
+            planes[:, :, None]
+            * planes[:, None, :]
+            * (boundary_weight * length**2)[:, None, None]
+        ).reshape(-1, 16)
+        for end in range(2):
+            for j in range(16):
+                result[:, j] += np.bincount(
+                    corners[:, end], border_quadrics[:, j], vertex_count
+                )
+    return result.reshape(-1, 4, 4)
+
+
+def _alive(triangles: np.ndarray) -> np.ndarray:
+    # triangles that still have three different vertices
+    return (
+        (triangles[:, 0] != triangles[:, 1])
+        & (triangles[:, 1] != triangles[:, 2])
+        & (triangles[:, 0] != triangles[:, 2])
+    )
+
+
+def _flips(
+    positions: np.ndarray,
+    triangles: np.ndarray,
+    normals: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+    target: np.ndarray,
+    selected: np.ndarray,
+) -> np.ndarray:
+    """
+    The selected collapses (second into first, moved to target)
+    that turn a triangle around when they are done together
+    """
+    vertex_count = len(positions)
+    chosen = np.nonzero(selected)[0]
+    moved = positions.copy()
+    moved[first[chosen]] = target[chosen]
+    remap = np.arange(vertex_count)
+    remap[second[chosen]] = first[chosen]
+    collapse = np.full(vertex_count, -1, dtype=np.int64)
+    collapse[first[chosen]] = chosen
+    collapse[second[chosen]] = chosen
+    after = remap[triangles]
+    _, normals_after = _plane_quadrics(moved, after)
+    flipped = _alive(after) & ((normals * normals_after).sum(axis=1) < 0)
+    rejected = collapse[triangles[flipped]].reshape(-1)
+    return np.unique(rejected[rejected >= 0])
+
+
+def _quadric_error(quadrics: np.ndarray, points: np.ndarray) -> np.ndarray:
+    homogeneous = np.concatenate([points, np.ones((len(points), 1))], axis=1)
+    return np.einsum("ni,nij,nj->n", homogeneous, quadrics, homogeneous)
+
+
+def simplify(arrays: dict, target_triangles: int, max_passes: int = 100) -> dict:
+    """
+    simplify(arrays, target_triangles, max_passes)
+    Simplify the arrays of a triangulated model (position, attributes and indices)
+    down to about target_triangles with quadric error edge collapses.
+    Every pass collapses the cheapest edges that share no vertex,
+    each one to the end point or the middle point with the smallest error,
+    the other vertex attributes follow the chosen point.
+    Returns new arrays with only the used vertices
+    """
+    positions = np.asarray(arrays["position"], dtype=np.float64).copy()
+    attributes = {
+        name: np.asarray(value).astype(np.float64)
+        for name, value in arrays.items()
+        if name not in ("position", "indices")
+    }
+    triangles = np.asarray(arrays["indices"], dtype=np.int64).reshape(-1, 3)
+    quadrics = vertex_quadrics(positions, triangles)
+    vertex_count = len(positions)
+
+    for _ in range(max_passes):
+        if len(triangles) <= target_triangles:
+            break
+        edges, _, _ = _edges(triangles)
+        first, second = edges[:, 0], edges[:, 1]
+        edge_quadrics = quadrics[first] + quadrics[second]
+        candidates = np.stack(
+            [
+                positions[first],
+                positions[second],
+                (positions[first] + positions[second]) / 2,
+            ]
+        )
+        errors = np.stack([_quadric_error(edge_quadrics, p) for p in candidates])
+        choice = errors.argmin(axis=0)
+        cost = errors[choice, np.arange(len(edges))]
+
+        # every collapse removes about two triangles
+        wanted = (len(triangles) - target_triangles) // 2 + 1
+        limit = max(1, min(wanted, int(len(edges) * collapse_fraction)))
+        rank = np.empty(len(edges), dtype=np.int64)
+        rank[np.argsort(cost, kind="stable")] = np.arange(len(edges))
+        target = candidates[choice, np.arange(len(edges))]
+        _, normals_before = _plane_quadrics(positions, triangles)
+        available = rank < limit
+        selected = np.zeros(len(edges), dtype=bool)
+        for _ in range(8):
+            # add the edges that are the cheapest available one
+            # of both of their vertices
+            used = np.zeros(vertex_count, dtype=bool)
+            used[first[selected]] = True
+            used[second[selected]] = True
+            free = available & ~selected & ~used[first] & ~used[second]
+            best = np.full(vertex_count, len(edges), dtype=np.int64)
+            np.minimum.at(best, first[free], rank[free])
+            np.minimum.at(best, second[free], rank[free])
+            added = free & (best[first] == rank) & (best[second] == rank)
+            if not added.any():
+                break
+            selected |= added
+            # drop the collapses that would flip a triangle, they are not tried again
+            flipped = _flips(
+                positions, triangles, normals_before, first, second, target, selected
+            )
+            selected[flipped] = False
+            available[flipped] = False
+        chosen = np.nonzero(selected)[0]
+        if len(chosen) == 0:
+            break
+
+        keep, drop = first[chosen], second[chosen]
+        positions[keep] = target[chosen]
+        for name, value in attributes.items():
+            ends = np.stack([value[keep], value[drop], (value[keep] + value[drop]) / 2])
+            value[keep] = ends[choice[chosen], np.arange(len(chosen))]
+        quadrics[keep] += quadrics[drop]
+        remap = np.arange(vertex_count)
+        remap[drop] = keep
+        triangles = remap[triangles]
+        triangles = triangles[_alive(triangles)]
+
+    # keep only the used vertices, in first use order
+    used, first_use = np.unique(triangles.reshape(-1), return_index=True)
+    order = used[np.argsort(first_use, kind="stable")]
+    remap = np.empty(vertex_count, dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    result = {"position": positions[order].astype(np.float32)}
+    for name, value in attributes.items():
+        result[name] = value[order].astype(np.asarray(arrays[name]).dtype)
+    result["indices"] = remap[triangles].astype(np.uint32)
+    return result
+
+
+def simplify_chain(arrays: dict, levels: int = 4, ratio: float = lod_ratio) -> list:
+    """
+    simplify_chain(arrays, levels, ratio)
+    The arrays of every level, the first one is the original mesh
+    and each next level keeps ratio of the triangles of the previous one
+    """
+    chain = [arrays]
+    for _ in range(levels - 1):
+        previous = chain[-1]
+        target = int(len(np.asarray(previous["indices"]).reshape(-1, 3)) * ratio)
+        if target < 4:
+            break
+        chain.append(simplify(previous, target))
+    return chain
+
+
+class LODModel(Model):
+    """
+    LODModel class:
+    A model with several levels of detail, update() picks the level
+    from the size of the bounding sphere on the screen and draw() draws it.
+    A level only changes after the size moves lod_hysteresis past the switching size,
+    so a model near the limit does not switch every frame
+    """
+
+    def __init__(
+        self, levels: list, thresholds: list = None, hysteresis: float = lod_hysteresis
+    ):
+        if not levels:
+            raise Exception("A LOD model needs at least one level")
+        self._set_defaults()
+        self.levels = levels
+        # level i + 1 is used under thresholds[i] pixels
+        if thresholds is None:
+            thresholds = [lod_base_pixels / 2**i for i in range(len(levels) - 1)]
+        self.thresholds = thresholds
+        self.hysteresis = hysteresis
+        self.level = 0
+        self.center = levels[0].center
+        self.radius = levels[0].radius
+        self.box_min = levels[0].box_min
+        self.box_max = levels[0].box_max
+
+    @staticmethod
+    def from_arrays(
+        arrays: dict,
+        levels: int = 4,
+        ratio: float = lod_ratio,
+        program: ShaderProgram = None,
+    ) -> LODModel:
+        """
+        Static method to create a LOD model generating the simplified levels
+        """
+        chain = simplify_chain(arrays, levels, ratio)
+        return LODModel([Model.from_arrays(level, program=program) for level in chain])
+
+    @staticmethod
+    def from_files(
+        file_paths: list,
+        cache: MeshCache = None,
+        program: ShaderProgram = None,
+        **options,
+    ) -> LODModel:
+        """
+        Static method to create a LOD model from files with the levels,
+        the most detailed first, like the bunny and its _res2 to _res4 versions
+        """
+        return LODModel(
+            [
+                Model.from_arrays(
+                    load_model_arrays(path, cache, **options), program=program
+                )
+                for path in file_paths
+            ]
+        )
+
+    def screen_size(self, camera, viewport_height: int) -> float:
+        """
+        screen_size(camera, viewport_height)
+        Diameter of the bounding sphere on the screen, in pixels
+        """
+        scale = max(abs(self.scale.x), abs(self.scale.y), abs(self.scale.z))
+        center = self.position + self.center * self.scale
+        distance = glm.distance(camera.position, center)
+        radius = self.radius * scale
+        if distance <= radius:
+            return float("inf")
+        # projection[1][1] is the cotangent of half the vertical field of view
+        return radius / distance * camera.projection[1][1] * viewport_height
+
+    def select_level(self, size: float, level: int = None) -> int:
+        """
+        select_level(size, level)
+        The level for a screen size, starting from the current level
+        """
+        level = self.level if level is None else level
+        # coarser while the size is under the limit of the next level
+        coarser = 1 - self.hysteresis
+        while level < len(self.thresholds) and size < self.thresholds[level] * coarser:
+            level += 1
+        # finer while the size is over the limit of the current level
+        finer = 1 + self.hysteresis
+        while level > 0 and size > self.thresholds[level - 1] * finer:
+            level -= 1
+        return level
+
+    def update(self, camera, viewport_height: int) -> int:
+        """
+        update(camera, viewport_height)
+        Choose the level to draw for the camera
+        """
+        self.level = self.select_level(self.screen_size(camera, viewport_height))
+        return self.level
+
+    def bind_attributes(self, program: ShaderProgram):
+        for level in self.levels:
+            level.bind_attributes(program)
+
+    @property
+    def index_count(self) -> int:
+        return self.levels[self.level].index_count
+
+    def draw(self):
+        """
+        draw()
+        Draw the current level
+        """
+        self.levels[self.level].draw()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    # print the levels generated for a model
+    if len(sys.argv) < 2:
+        print("usage: python pythonGC/lod.py model.ply [levels]")
+        sys.exit(1)
+    levels = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    arrays = load_model_arrays(sys.argv[1])
+    start = time.perf_counter()
+    chain = simplify_chain(arrays, levels)
+    elapsed = time.perf_counter() - start
+    for i, level in enumerate(chain):
+        center, radius = bounding_sphere(level["position"])
+        print(
+            f"level {i}: {len(level['indices'])} triangles, "
+            f"{len(level['position'])} vertices, radius {radius:.4f}"
+        )
+    print(f"simplified in {elapsed * 1000:.0f} ms")
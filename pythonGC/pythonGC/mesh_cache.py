@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+# bump when the loaders change what they produce, so old entries are not used
+cache_version = 1
+
+cache_folder_name = ".mesh_cache"
+
+cache_extension = ".mesh"
+
+# magic, header length
+cache_header = struct.Struct("<8sI")
+cache_magic = b"PGCMESH1"
+
+
+def write_arrays(file_path: str, arrays: dict):
+    """
+    write_arrays(file_path, arrays)
+    Write named numpy arrays to a single binary file:
+    a json table with the dtype, shape and offset of every array
+    followed by the raw data
+    """
+    table = {}
+    offset = 0
+    for name, value in arrays.items():
+        value = np.ascontiguousarray(value)
+        table[name] = {
+            "dtype": value.dtype.str,
+            "shape": list(value.shape),
+            "offset": offset,
+        }
+        offset += value.nbytes
+    header = json.dumps(table).encode("utf-8")
+    with open(file_path, "wb") as f:
+        f.write(cache_header.pack(cache_magic, len(header)))
+        f.write(header)
+        for value in arrays.values():
+            f.write(np.ascontiguousarray(value).tobytes())
+
+
+def read_arrays(file_path: str) -> dict:
+    """
+    read_arrays(file_path)
+    Read the arrays written by write_arrays with a single read,
+    the arrays share the memory of the file content
+    """
+    with open(file_path, "rb") as f:
+        data = f.read()
+    magic, length = cache_header.unpack_from(data)
+    if magic != cache_magic:
+        raise Exception(f"Not a mesh cache file: {file_path}")
+    table = json.loads(data[cache_header.size : cache_header.size + length])
+    start = cache_header.size + length
+    arrays = {}
+    for name, entry in table.items():
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"]))
+        arrays[name] = np.frombuffer(
+            data, dtype, count, start + entry["offset"]
+        ).reshape(entry["shape"])
+    return arrays
+
+
+def hash_file(file_path: str) -> str:
+    """
+    hash_file(file_path)
+    Hash of the content of a file
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalize_options(value):
+    """
+    normalize_options(options)
+    The loader options in a canonical form for the cache key:
+    numbers as floats, flags as bools and sequences as lists,
+    so scale=20 and scale=20.0 (or a tuple and a list) share the entry
+    """
+    if isinstance(value, dict):
+        return {str(name): normalize_options(item) for name, item in value.items()}
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [normalize_options(item) for item in value]
+    return value
+
+
+class MeshCache:
+    """
+    MeshCache class:
+    On disk cache of processed mesh arrays,
+    entries are keyed by the content of the source file and the loader options,
+    the least recently used entries are removed when the folder grows over max_bytes
+    """
+
+    def __init__(self, folder: str = None, max_bytes: int = 512 * 2**20):
+        if folder is None:
+            folder = os.path.join(os.getcwd(), cache_folder_name)
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, file_path: str, options: dict) -> str:
+        """
+        key(file_path, options)
+        Cache key of a source file loaded with the given options
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(hash_file(file_path).encode("utf-8"))
+        digest.update(
+            json.dumps(normalize_options(options), sort_keys=True).encode("utf-8")
+        )
+        digest.update(str(cache_version).encode("utf-8"))
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, key + cache_extension)
+
+    def load(self, key: str) -> dict:
+        """
+        load(key)
+        The arrays stored with the key, or None if there is no such entry
+        """
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            arrays = read_arrays(path)
+        except Exception as e:
+            logging.warning(f"Removing broken mesh cache entry {path}: {e}")
+            os.remove(path)
+            return None
+        # the modification time is the last use, used for the LRU eviction
+        os.utime(path)
+        return arrays
+
+    def store(self, key: str, arrays: dict):
+        """
+        store(key, arrays)
+        Store arrays with the key, evicting old entries if needed
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        # write to a temporary file first so readers never see a partial entry
+        handle, temporary = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        os.close(handle)
+        try:
+            write_arrays(temporary, arrays)
+            os.replace(temporary, self.path(key))
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        self.evict()
+
+    def evict(self):
+        """
+        evict()
+        Remove the least recently used entries until the folder fits in max_bytes
+        """
+        if not os.path.isdir(self.folder):
+            return
+        entries = []
+        for name in os.listdir(self.folder):
+            if name.endswith(cache_extension):
+                stat = os.stat(os.path.join(self.folder, name))
+                entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.folder, name))
+            total -= size
+
+    def clear(self):
+        """
+        clear()
+        Remove every entry of the cache
+        """
+        if not os.path.isdir(self.folder):
+            return
+        for name in os.listdir(self.folder):
+            if name.endswith(cache_extension):
+                os.remove(os.path.join(self.folder, name))
+
+    def load_or_create(self, file_path: str, options: dict, loader) -> dict:
+        """
+        load_or_create(file_path, options, loader)
+        The cached arrays of file_path with options,
+        on a miss loader() is called and its arrays are stored
+        """
+        key = self.key(file_path, options)
+        arrays = self.load(key)
+        if arrays is not None:
+            self.hits += 1
+            return arrays
+        self.misses += 1
+        arrays = loader()
+        self.store(key, arrays)
+        return arrays
+
+
+if __name__ == "__main__":
+    from model_util import load_model_arrays, models_extensions
+
+    parser = argparse.ArgumentParser(description="Pre-warm the mesh cache")
+    parser.add_argument(
+        "folder", nargs="?", default="objs", help="folder with the models"
+    )
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument(
+        "--attributes",
+        nargs="*",
+        default=None,
+        help="extra vertex attributes to keep (color for PLY, uv and normal for OBJ)",
+    )
+    parser.add_argument("--no-triangulate", action="store_true")
+    parser.add_argument(
+        "--optimize", action="store_true", help="reorder for the vertex caches"
+    )
+    parser.add_argument(
+        "--overdraw", action="store_true", help="also sort clusters for overdraw"
+    )
+    parser.add_argument("--cache", default=None, help="cache folder")
+    parser.add_argument("--max-mb", type=int, default=512)
+    args = parser.parse_args()
+
+    default_attributes = {
+        models_extensions["ply"]: ["color"],
+        models_extensions["obj"]: ["uv", "normal"],
+    }
+    cache = MeshCache(args.cache, args.max_mb * 2**20)
+    for name in sorted(os.listdir(args.folder)):
+        file_path = os.path.join(args.folder, name)
+        extension = os.path.splitext(name)[1]
+        if extension not in default_attributes:
+            continue
+        attributes = default_attributes[extension]
+        options = dict(
+            scale=args.scale,
+            attributes=attributes if args.attributes is None else args.attributes,
+            triangulate_faces=not args.no_triangulate,
+            optimize=args.optimize,
+            overdraw=args.overdraw,
+        )
+        hits = cache.hits
+        load_model_arrays(file_path, cache, **options)
+        print(f"{file_path}: {'already cached' if cache.hits > hits else 'cached'}")
+    print(f"{cache.misses} models cached, {cache.hits} already in the cache")
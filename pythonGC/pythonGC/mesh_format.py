@@ -0,0 +1,333 @@
+import ctypes
+import mmap
+import os
+import struct
+
+import numpy as np
+from OpenGL import GL
+
+"""
+Binary mesh format (.bmesh):
+a header, the bounds of the positions, a table with one entry per vertex attribute
+and two raw blocks,
+the interleaved vertex buffer and the index buffer, each one aligned to a page.
+The blocks are stored exactly as the GPU wants them,
+so they can be mapped and handed to glBufferData without any copy in Python.
+"""
+
+mesh_magic = b"PGCBMESH"
+mesh_version = 2
+
+# magic, version, attribute count, stride, index type,
+# vertex count, index count, vertex block offset, vertex block size,
+# index block offset, index block size
+mesh_header = struct.Struct("<8sIIIIQQQQQQ")
+
+# box min, box max, sphere center and radius of the positions (from version 2),
+# the radius is NaN for meshes without positions
+mesh_bounds = struct.Struct("<10f")
+
+# name, components, type, normalized, offset in the vertex
+mesh_attribute = struct.Struct("<32sIIII")
+
+# blocks start at a page boundary so they can be mapped and released page by page
+mesh_alignment = mmap.PAGESIZE
+
+# numpy types and the matching OpenGL types
+gl_types = {
+    np.dtype(np.int8): GL.GL_BYTE,
+    np.dtype(np.uint8): GL.GL_UNSIGNED_BYTE,
+    np.dtype(np.int16): GL.GL_SHORT,
+    np.dtype(np.uint16): GL.GL_UNSIGNED_SHORT,
+    np.dtype(np.int32): GL.GL_INT,
+    np.dtype(np.uint32): GL.GL_UNSIGNED_INT,
+    np.dtype(np.float32): GL.GL_FLOAT,
+}
+numpy_types = {value: key for key, value in gl_types.items()}
+
+
+def _align(offset: int) -> int:
+    return (offset + mesh_alignment - 1) // mesh_alignment * mesh_alignment
+
+
+def interleave(attributes: dict, normalized=()) -> tuple:
+    """
+    interleave(attributes, normalized)
+    Interleave attribute arrays, attributes maps a name to a (n, components) array,
+    they are interleaved in the given order with a single structured assignment.
+    Returns the packed vertex array and its list of MeshAttribute
+    """
+    arrays = {}
+    for name, value in attributes.items():
+        value = np.asarray(value)
+        if value.ndim == 1:
+            value = value.reshape(-1, 1)
+        if value.dtype not in gl_types:
+            value = value.astype(np.float32)
+        arrays[name] = value
+    vertex_count = len(next(iter(arrays.values()))) if arrays else 0
+    vertex_type = np.dtype(
+        [(name, value.dtype, (value.shape[1],)) for name, value in arrays.items()]
+    )
+    vertices = np.empty(vertex_count, dtype=vertex_type)
+    table = []
+    for name, value in arrays.items():
+        if len(value) != vertex_count:
+            raise Exception(
+                f"Attribute {name} has {len(value)} values, expected {vertex_count}"
+            )
+        vertices[name] = value
+        table.append(
+            MeshAttribute(
+                name,
+                value.shape[1],
+                gl_types[value.dtype],
+                name in normalized,
+                vertex_type.fields[name][1],
+            )
+        )
+    return vertices, table
+
+
+def position_bounds(positions: np.ndarray) -> tuple:
+    """
+    position_bounds(positions)
+    The bounding box of the positions and a sphere centered on it.
+    Returns the box min and max, the sphere center (numpy arrays) and radius
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    if len(positions) == 0:
+        zero = np.zeros(3, dtype=np.float32)
+        return zero, zero, zero, 0.0
+    low, high = positions.min(axis=0), positions.max(axis=0)
+    center = (low + high) / 2
+    radius = float(np.sqrt(((positions - center) ** 2).sum(axis=1).max()))
+    return low, high, center, radius
+
+
+def write_mesh(file_path: str, attributes: dict, indices: np.ndarray, normalized=()):
+    """
+    write_mesh(file_path, attributes, indices, normalized)
+    Write a .bmesh file, attributes maps a name to a (n, components) array,
+    they are interleaved in the given order. Indices use 16 bits when they fit.
+    Attributes named in normalized are flagged to be normalized by OpenGL.
+    The bounds of the positions are stored, opening the file does not scan them
+    """
+    vertices, table = interleave(attributes, normalized)
+    indices = np.asarray(indices).reshape(-1)
+    index_dtype = np.uint16 if len(vertices) <= 0xFFFF else np.uint32
+    indices = indices.astype(index_dtype)
+
+    if "position" in attributes:
+        low, high, center, radius = position_bounds(attributes["position"])
+        bounds = [*low.tolist(), *high.tolist(), *center.tolist(), radius]
+    else:
+        bounds = [0.0] * 9 + [float("nan")]
+
+    table_size = mesh_attribute.size * len(table)
+    vertex_offset = _align(mesh_header.size + mesh_bounds.size + table_size)
+    index_offset = _align(vertex_offset + vertices.nbytes)
+    with open(file_path, "wb") as f:
+        f.write(
+            mesh_header.pack(
+                mesh_magic,
+                mesh_version,
+                len(table),
+                vertices.dtype.itemsize,
+                gl_types[np.dtype(index_dtype)],
+                len(vertices),
+                len(indices),
+                vertex_offset,
+                vertices.nbytes,
+                index_offset,
+                indices.nbytes,
+            )
+        )
+        f.write(mesh_bounds.pack(*bounds))
+        for attribute in table:
+            f.write(
+                mesh_attribute.pack(
+                    attribute.name.encode("utf-8"),
+                    attribute.components,
+                    attribute.type,
+                    int(attribute.normalized),
+                    attribute.offset,
+                )
+            )
+        f.seek(vertex_offset)
+        f.write(vertices.tobytes())
+        f.seek(index_offset)
+        f.write(indices.tobytes())
+
+
+class MeshAttribute:
+    """
+    MeshAttribute class:
+    An entry of the attribute table of a .bmesh file
+    """
+
+    def __init__(
+        self, name: str, components: int, type: int, normalized: bool, offset: int
+    ):
+        self.name = name
+        self.components = components
+        self.type = type
+        self.normalized = normalized
+        self.offset = offset
+
+    def __repr__(self):
+        return (
+            f"MeshAttribute({self.name}, {self.components}, {self.type}, "
+            f"{self.normalized}, {self.offset})"
+        )
+
+
+class MappedMesh:
+    """
+    MappedMesh class:
+    A .bmesh file opened with mmap, the blocks are read by the OS on demand
+    and can be uploaded to OpenGL straight from the mapped pages
+    """
+
+    def __init__(self, file_path: str):
+        if not os.path.isfile(file_path):
+            raise Exception(f"File not found: {file_path}")
+        self.file_path = file_path
+        self.file = open(file_path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            version,
+            attribute_count,
+            self.stride,
+            self.index_type,
+            self.vertex_count,
+            self.index_count,
+            self.vertex_offset,
+            self.vertex_size,
+            self.index_offset,
+            self.index_size,
+        ) = mesh_header.unpack_from(self.map)
+        if magic != mesh_magic or version not in (1, mesh_version):
+            self.close()
+            raise Exception(f"Not a binary mesh file: {file_path}")
+        # (box min, box max, center, radius) of the positions, None if the file has none
+        self.bounds = None
+        table_offset = mesh_header.size
+        if version >= 2:
+            values = mesh_bounds.unpack_from(self.map, table_offset)
+            table_offset += mesh_bounds.size
+            if values[9] == values[9]:
+                self.bounds = (values[0:3], values[3:6], values[6:9], values[9])
+        self.attributes = []
+        for i in range(attribute_count):
+            name, components, type, normalized, offset = mesh_attribute.unpack_from(
+                self.map, table_offset + i * mesh_attribute.size
+            )
+            self.attributes.append(
+                MeshAttribute(
+                    name.rstrip(b"\0").decode("utf-8"),
+                    components,
+                    type,
+                    bool(normalized),
+                    offset,
+                )
+            )
+
+    def vertex_array(self) -> np.ndarray:
+        """
+        vertex_array()
+        The vertex block as a read only structured array backed by the mapping
+        """
+        dtype = np.dtype(
+            {
+                "names": [a.name for a in self.attributes],
+                "formats": [
+                    (numpy_types[a.type], (a.components,)) for a in self.attributes
+                ],
+                "offsets": [a.offset for a in self.attributes],
+                "itemsize": self.stride,
+            }
+        )
+        return np.frombuffer(self.map, dtype, self.vertex_count, self.vertex_offset)
+
+    def index_array(self) -> np.ndarray:
+        """
+        index_array()
+        The index block as a read only array backed by the mapping
+        """
+        return np.frombuffer(
+            self.map, numpy_types[self.index_type], self.index_count, self.index_offset
+        )
+
+    def upload(
+        self,
+        target: int,
+        offset: int,
+        size: int,
+        chunk_bytes: int = 64 * 2**20,
+        allocate: bool = True,
+    ):
+        """
+        upload(target, offset, size, chunk_bytes, allocate)
+        Upload a block of the file to the buffer bound to target.
+        The buffer storage is allocated once (unless it already was)
+        and filled with glBufferSubData straight from the mapped pages, chunk by chunk,
+        releasing every chunk after the upload
+        so the resident memory stays around chunk_bytes
+        """
+        if allocate:
+            GL.glBufferData(target, size, None, GL.GL_STATIC_DRAW)
+        chunk_bytes = max(
+            mesh_alignment, chunk_bytes // mesh_alignment * mesh_alignment
+        )
+        for start in range(0, size, chunk_bytes):
+            length = min(chunk_bytes, size - start)
+            view = np.frombuffer(self.map, np.uint8, length, offset + start)
+            GL.glBufferSubData(target, start, length, ctypes.c_void_p(view.ctypes.data))
+            # the view must be released before the mapping can be closed
+            del view
+            self.release(offset + start, length)
+
+    def release(self, offset: int, length: int):
+        """
+        release(offset, length)
+        Tell the OS the mapped pages of a range are no longer needed,
+        offset must be page aligned
+        """
+        if hasattr(self.map, "madvise"):
+            length = min(_align(length), len(self.map) - offset)
+            self.map.madvise(mmap.MADV_DONTNEED, offset, length)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from model_util import load_ply_arrays
+
+    parser = argparse.ArgumentParser(description="Convert a PLY model to a .bmesh file")
+    parser.add_argument("model", help="PLY model")
+    parser.add_argument("output", help=".bmesh file")
+    parser.add_argument("scale", nargs="?", type=float, default=1.0)
+    parser.add_argument(
+        "--attributes",
+        nargs="*",
+        default=["color"],
+        help="vertex attributes to keep besides the position (color, intensity, ...)",
+    )
+    args = parser.parse_args()
+    arrays = load_ply_arrays(args.model, scale=args.scale, attributes=args.attributes)
+    indices = arrays.pop("indices")
+    write_mesh(args.output, arrays, indices)
+    with MappedMesh(args.output) as mesh:
+        print(f"{mesh.vertex_count} vertices, {mesh.index_count} indices")
+        print(mesh.attributes)
@@ -0,0 +1,310 @@
+import logging
+from collections import deque
+
+import numpy as np
+
+"""
+Index and vertex reordering for the GPU caches:
+the triangles are reordered for the post-transform vertex cache (Tipsify),
+optionally grouped in clusters drawn from the outside in to reduce overdraw,
+and the vertices are renumbered in first use order for the pre-transform fetch.
+"""
+
+# size of the simulated post-transform vertex cache (FIFO),
+# used for the order and the stats
+vertex_cache_size = 16
+
+# clusters are split where their miss ratio is below this fraction of the mesh ratio
+overdraw_threshold = 0.9
+
+# clusters are never split below this number of triangles
+overdraw_min_triangles = 64
+
+
+def vertex_cache_stats(
+    indices: np.ndarray, vertex_count: int = None, cache_size: int = vertex_cache_size
+) -> tuple:
+    """
+    vertex_cache_stats(indices, vertex_count, cache_size)
+    Simulate a FIFO vertex cache over the triangles.
+    Returns the ACMR (misses per triangle, 0.5 is the ideal for big meshes, 3 the worst)
+    and the ATVR (misses per vertex, 1 is the ideal)
+    """
+    indices = np.asarray(indices).reshape(-1)
+    if vertex_count is None:
+        vertex_count = int(indices.max()) + 1 if len(indices) else 0
+    cache = deque()
+    cached = set()
+    misses = 0
+    for v in indices.tolist():
+        if v in cached:
+            continue
+        misses += 1
+        cache.append(v)
+        cached.add(v)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    triangles = len(indices) // 3
+    acmr = misses / triangles if triangles else 0.0
+    atvr = misses / vertex_count if vertex_count else 0.0
+    return acmr, atvr
+
+
+def triangle_adjacency(indices: np.ndarray, vertex_count: int) -> tuple:
+    """
+    triangle_adjacency(indices, vertex_count)
+    The triangles of every vertex,
+    those of vertex v are triangles[offsets[v]:offsets[v + 1]]
+    """
+    indices = np.asarray(indices).reshape(-1)
+    order = np.argsort(indices, kind="stable")
+    counts = np.bincount(indices, minlength=vertex_count)
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets, order // 3
+
+
+def tipsify(
+    indices: np.ndarray, vertex_count: int, cache_size: int = vertex_cache_size
+) -> tuple:
+    """
+    tipsify(indices, vertex_count, cache_size)
+    Reorder triangles for the vertex cache in linear time
+    (Sander, Nehab and Barczak 2007):
+    the triangles around a vertex are emitted as a fan and the next fan is a vertex
+    of the last one that will still be in the cache when its triangles are emitted.
+    Returns the reordered (m, 3) triangles and the first triangle of every cluster,
+    a new cluster starts where the order jumps to a vertex out of the cache
+    """
+    triangles = np.asarray(indices).reshape(-1, 3)
+    offsets, adjacency = triangle_adjacency(triangles, vertex_count)
+    offsets = offsets.tolist()
+    adjacency = adjacency.tolist()
+    corners = triangles.tolist()
+    # live triangles of every vertex
+    live = np.diff(offsets).tolist()
+    stamp = [0] * vertex_count
+    emitted = [False] * len(corners)
+    dead_ends = []
+    order = []
+    clusters = [0]
+    time = cache_size + 1
+    cursor = 0
+    fan = 0
+    while fan >= 0:
+        ring = []
+        for t in adjacency[offsets[fan] : offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in corners[t]:
+                dead_ends.append(v)
+                ring.append(v)
+                live[v] -= 1
+                if time - stamp[v] > cache_size:
+                    stamp[v] = time
+                    time += 1
+        # the next fan is the vertex of the ring that stays longest in the cache
+        fan = -1
+        best = -1
+        for v in ring:
+            if live[v] > 0:
+                age = time - stamp[v]
+                priority = age if age + 2 * live[v] <= cache_size else 0
+                if priority > best:
+                    best = priority
+                    fan = v
+        if fan >= 0:
+            continue
+        # dead end, go back to a recent vertex or to the next one with triangles left
+        while dead_ends:
+            v = dead_ends.pop()
+            if live[v] > 0:
+                fan = v
+                break
+        else:
+            while cursor < vertex_count:
+                if live[cursor] > 0:
+                    fan = cursor
+                    break
+                cursor += 1
+        if fan >= 0 and len(order) > clusters[-1]:
+            clusters.append(len(order))
+    order = np.array(order, dtype=np.int64)
+    return triangles[order], np.array(clusters, dtype=np.int64)
+
+
+def _split_clusters(
+    triangles: np.ndarray, clusters: np.ndarray, cache_size: int, threshold: float
+) -> np.ndarray:
+    # split the clusters where their running miss ratio is low, there a break is cheap
+    starts = []
+    bounds = clusters.tolist() + [len(triangles)]
+    corners = triangles.tolist()
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        starts.append(first)
+        cache = deque()
+        cached = set()
+        misses = 0
+        start = first
+        for t in range(first, last):
+            for v in corners[t]:
+                if v not in cached:
+                    misses += 1
+                    cache.append(v)
+                    cached.add(v)
+                    if len(cache) > cache_size:
+                        cached.discard(cache.popleft())
+            size = t + 1 - start
+            if (
+                size >= overdraw_min_triangles
+                and t + 1 < last
+                and misses / size <= threshold
+            ):
+                starts.append(t + 1)
+                start = t + 1
+                misses = 0
+                cache.clear()
+                cached.clear()
+    return np.array(starts, dtype=np.int64)
+
+
+def overdraw_order(
+    triangles: np.ndarray,
+    positions: np.ndarray,
+    clusters: np.ndarray,
+    cache_size: int = vertex_cache_size,
+    threshold: float = overdraw_threshold,
+) -> np.ndarray:
+    """
+    overdraw_order(triangles, positions, clusters, cache_size, threshold)
+    Sort the clusters of a cache optimized order so the ones facing out of the mesh
+    are drawn first, the triangles behind them then fail the depth test
+    instead of being shaded and overwritten. The clusters are split first
+    where the split costs few extra cache misses
+    """
+    triangles = np.asarray(triangles).reshape(-1, 3)
+    if len(triangles) == 0:
+        return triangles
+    acmr, _ = vertex_cache_stats(triangles, len(positions), cache_size)
+    starts = _split_clusters(triangles, clusters, cache_size, threshold * acmr)
+    a, b, c = (positions[triangles[:, i]].astype(np.float64) for i in range(3))
+    # the cross product is the normal weighted by twice the area
+    normals = np.cross(b - a, c - a)
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = (a + b + c) / 3
+    mesh_centroid = (centroids * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-30)
+    cluster_areas = np.maximum(np.add.reduceat(areas, starts), 1e-30)
+    cluster_centroids = (
+        np.add.reduceat(centroids * areas[:, None], starts) / cluster_areas[:, None]
+    )
+    cluster_normals = np.add.reduceat(normals, starts)
+    facing = ((cluster_centroids - mesh_centroid) * cluster_normals).sum(axis=1)
+    ends = np.append(starts[1:], len(triangles))
+    order = np.argsort(-facing, kind="stable")
+    return np.concatenate([triangles[starts[i] : ends[i]] for i in order])
+
+
+def reorder_vertices(indices: np.ndarray, vertex_count: int) -> tuple:
+    """
+    reorder_vertices(indices, vertex_count)
+    Renumber the vertices in the order the triangles first use them,
+    unused vertices go to the end.
+    Returns the new order of the old vertices and the renumbered indices
+    """
+    flat = np.asarray(indices).reshape(-1)
+    used, first = np.unique(flat, return_index=True)
+    order = used[np.argsort(first, kind="stable")]
+    unused = np.setdiff1d(np.arange(vertex_count), used, assume_unique=True)
+    order = np.concatenate([order, unused])
+    remap = np.empty(vertex_count, dtype=np.uint32)
+    remap[order] = np.arange(vertex_count, dtype=np.uint32)
+    return order, remap[flat].reshape(np.shape(indices))
+
+
+def optimize_arrays(
+    arrays: dict, overdraw: bool = False, cache_size: int = vertex_cache_size
+) -> tuple:
+    """
+    optimize_arrays(arrays, overdraw, cache_size)
+    Optimize the arrays of a triangulated model (position, attributes and indices)
+    for the vertex caches,
+    with overdraw the clusters are also sorted from the outside in.
+    Returns the new arrays and the ACMR and ATVR before and after
+    """
+    if "indices" not in arrays:
+        raise Exception("Only triangulated models can be optimized")
+    vertex_count = len(arrays["position"])
+    indices = np.asarray(arrays["indices"]).reshape(-1, 3)
+    stats = {}
+    stats["acmr_before"], stats["atvr_before"] = vertex_cache_stats(
+        indices, vertex_count, cache_size
+    )
+    triangles, clusters = tipsify(indices, vertex_count, cache_size)
+    if overdraw:
+        triangles = overdraw_order(triangles, arrays["position"], clusters, cache_size)
+    order, triangles = reorder_vertices(triangles, vertex_count)
+    # the indices are renumbered already,
+    # only the vertex attributes follow the new order
+    result = {
+        name: np.asarray(value)[order]
+        for name, value in arrays.items()
+        if name != "indices"
+    }
+    result["indices"] = triangles.astype(np.uint32)
+    stats["acmr_after"], stats["atvr_after"] = vertex_cache_stats(
+        triangles, vertex_count, cache_size
+    )
+    logging.info(
+        f"Vertex cache ACMR {stats['acmr_before']:.3f} -> {stats['acmr_after']:.3f}, "
+        f"ATVR {stats['atvr_before']:.3f} -> {stats['atvr_after']:.3f}"
+    )
+    return result, stats
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from model_util import load_model_arrays
+
+    if "--check" in sys.argv:
+        # a quad and a mesh with unused vertices: more vertices than triangles
+        for arrays in (
+            {
+                "position": np.array(
+                    [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], np.float32
+                ),
+                "indices": np.array([0, 1, 2, 0, 2, 3], np.uint32),
+            },
+            {
+                "position": np.arange(30, dtype=np.float32).reshape(10, 3),
+                "intensity": np.arange(10, dtype=np.float32),
+                "indices": np.array([[7, 8, 9]], np.uint32),
+            },
+        ):
+            result, _ = optimize_arrays(arrays)
+            old = arrays["position"][np.asarray(arrays["indices"]).reshape(-1, 3)]
+            new = result["position"][result["indices"].reshape(-1, 3)]
+            if len(result["position"]) != len(arrays["position"]) or sorted(
+                map(lambda t: t.tobytes(), old)
+            ) != sorted(map(lambda t: t.tobytes(), new)):
+                raise Exception("The optimized triangles are not the original ones")
+        print("ok")
+        sys.exit(0)
+    # report the vertex cache stats of a model before and after the optimization
+    if len(sys.argv) < 2:
+        print(
+            "usage: python pythonGC/mesh_optimizer.py model.ply [--overdraw] | --check"
+        )
+        sys.exit(1)
+    arrays = load_model_arrays(sys.argv[1])
+    start = time.perf_counter()
+    arrays, stats = optimize_arrays(arrays, overdraw="--overdraw" in sys.argv)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{len(arrays['indices'])} triangles, {len(arrays['position'])} vertices, "
+        f"optimized in {elapsed * 1000:.0f} ms\n"
+        f"ACMR {stats['acmr_before']:.3f} -> {stats['acmr_after']:.3f}\n"
+        f"ATVR {stats['atvr_before']:.3f} -> {stats['atvr_after']:.3f}"
+    )
@@ -1,16 +1,918 @@
 from __future__ import annotations
 import ctypes
 import os
+import re
 import glm
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
 from OpenGL import GL
-from array import array
 from shader import ShaderProgram
+from gl_state import gl_state
+from mesh_cache import MeshCache
+from mesh_format import MappedMesh, gl_types, mesh_alignment
+from mesh_optimizer import optimize_arrays
+from vertex_layout import VertexArray, VertexLayout
 
 models_extensions = {
     "ply": ".ply",
     "obj": ".obj",
+    "bmesh": ".bmesh",
 }
 
+# elements with less records than this are never split between processes
+parallel_min_rows = 100000
+
+# OBJ blocks smaller than this are never split between processes
+parallel_min_bytes = 8 * 2**20
+
+# bytes a streaming model uploads per frame and per glBufferSubData call
+stream_frame_bytes = 4 * 2**20
+stream_chunk_bytes = 256 * 2**10
+
+# OBJ statements read by the loader, the rest of the line is captured
+obj_statements = {
+    name: re.compile(rb"^[ \t]*" + name + rb"[ \t]+([^\r\n#]*)", re.M)
+    for name in (b"v", b"vt", b"vn", b"f")
+}
+
+# PLY scalar types and their numpy equivalents
+ply_types = {
+    "char": "i1",
+    "int8": "i1",
+    "uchar": "u1",
+    "uint8": "u1",
+    "short": "i2",
+    "int16": "i2",
+    "ushort": "u2",
+    "uint16": "u2",
+    "int": "i4",
+    "int32": "i4",
+    "uint": "u4",
+    "uint32": "u4",
+    "float": "f4",
+    "float32": "f4",
+    "double": "f8",
+    "float64": "f8",
+}
+
+# PLY body formats and the byte order they use (ascii has none)
+ply_formats = {
+    "ascii": "",
+    "binary_little_endian": "<",
+    "binary_big_endian": ">",
+}
+
+
+class PlyProperty:
+    """
+    PlyProperty class:
+    A property declared in a PLY header, either a scalar
+    or a list (count_type is set only for lists)
+    """
+
+    def __init__(self, name: str, type: str, count_type: str = None):
+        self.name = name
+        self.type = type
+        self.count_type = count_type
+
+    @property
+    def is_list(self) -> bool:
+        return self.count_type is not None
+
+
+class PlyElement:
+    """
+    PlyElement class:
+    An element declared in a PLY header, after decoding `data` holds
+    the scalar properties as a numpy structured array and `lists`
+    holds every list property as a (counts, values) pair of flat arrays
+    """
+
+    def __init__(self, name: str, count: int):
+        self.name = name
+        self.count = count
+        self.properties = []
+        self.data = None
+        self.lists = {}
+
+    def scalar_dtype(self, byte_order: str = "=") -> np.dtype:
+        """
+        scalar_dtype(byte_order)
+        Structured dtype with only the scalar properties of the element
+        """
+        return np.dtype(
+            [(p.name, byte_order + ply_types[p.type]) for p in self.properties if not p.is_list]
+        )
+
+    def list_properties(self) -> list:
+        return [p for p in self.properties if p.is_list]
+
+
+class PlyData:
+    """
+    PlyData class:
+    The header and decoded elements of a PLY file
+    """
+
+    def __init__(self, format: str, elements: list, comments: list):
+        self.format = format
+        self.elements = elements
+        self.comments = comments
+
+    def __getitem__(self, name: str) -> PlyElement:
+        for element in self.elements:
+            if element.name == name:
+                return element
+        raise KeyError(f"Element {name} not found")
+
+    def __contains__(self, name: str) -> bool:
+        return any(element.name == name for element in self.elements)
+
+
+def read_ply_header(data: bytes) -> tuple:
+    """
+    read_ply_header(data)
+    Parse the header of a PLY file,
+    returns the PlyData (without decoded elements) and the offset where the body starts
+    """
+    if not data.startswith(b"ply"):
+        raise Exception("Not a PLY file")
+    end = data.find(b"end_header")
+    if end == -1:
+        raise Exception("PLY header has no end_header")
+    # the body starts right after the end_header line break
+    body_start = data.find(b"\n", end) + 1
+    if body_start == 0:
+        body_start = len(data)
+    format = None
+    elements = []
+    comments = []
+    for line in data[:end].decode("ascii").splitlines()[1:]:
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        if parts[0] == "format":
+            if parts[1] not in ply_formats:
+                raise Exception(f"PLY format not supported: {parts[1]}")
+            format = parts[1]
+        elif parts[0] in ("comment", "obj_info"):
+            comments.append(line[len(parts[0]) + 1 :])
+        elif parts[0] == "element":
+            elements.append(PlyElement(parts[1], int(parts[2])))
+        elif parts[0] == "property":
+            if len(elements) == 0:
+                raise Exception(f"PLY property outside of an element: {line}")
+            if parts[1] == "list":
+                property = PlyProperty(parts[4], parts[3], parts[2])
+            else:
+                property = PlyProperty(parts[2], parts[1])
+            for type in (property.type, property.count_type):
+                if type is not None and type not in ply_types:
+                    raise Exception(f"PLY property type not supported: {type}")
+            elements[-1].properties.append(property)
+        else:
+            raise Exception(f"Unknown PLY header line: {line}")
+    if format is None:
+        raise Exception("PLY header has no format line")
+    return PlyData(format, elements, comments), body_start
+
+
+def _record_dtype(element: PlyElement, widths: tuple, byte_order: str) -> np.dtype:
+    """
+    Dtype of a record of an element whose list properties
+    all have the given widths, in declaration order
+    """
+    fields = []
+    lists = iter(widths)
+    for p in element.properties:
+        if p.is_list:
+            fields.append((p.name + "__count", byte_order + ply_types[p.count_type]))
+            fields.append((p.name, byte_order + ply_types[p.type], (next(lists),)))
+        else:
+            fields.append((p.name, byte_order + ply_types[p.type]))
+    return np.dtype(fields)
+
+
+def _record_widths(element: PlyElement, buffer, offset: int, byte_order: str) -> tuple:
+    """
+    Read the list widths of the single binary record starting at offset
+    """
+    widths = []
+    for p in element.properties:
+        if p.is_list:
+            count_type = np.dtype(byte_order + ply_types[p.count_type])
+            width = int(np.frombuffer(buffer, count_type, 1, offset)[0])
+            widths.append(width)
+            offset += count_type.itemsize + width * np.dtype(ply_types[p.type]).itemsize
+        else:
+            offset += np.dtype(ply_types[p.type]).itemsize
+    return tuple(widths)
+
+
+def _store_runs(element: PlyElement, runs: list):
+    """
+    Concatenate decoded runs of records with the same list widths
+    into the element data and lists,
+    every run is a (length, fields, widths) tuple
+    """
+    native = element.scalar_dtype()
+    element.data = np.empty(element.count, native)
+    start = 0
+    for length, fields, _ in runs:
+        for name in native.names or ():
+            element.data[name][start : start + length] = fields[name]
+        start += length
+    for i, p in enumerate(element.list_properties()):
+        counts = np.concatenate(
+            [np.full(length, widths[i], np.uint32) for length, _, widths in runs]
+            or [np.empty(0, np.uint32)]
+        )
+        values = np.concatenate(
+            [fields[p.name].reshape(-1) for _, fields, _ in runs]
+            or [np.empty(0, ply_types[p.type])]
+        ).astype(ply_types[p.type], copy=False)
+        element.lists[p.name] = (counts, values)
+
+
+def _decode_binary(element: PlyElement, buffer, offset: int, byte_order: str) -> int:
+    """
+    Decode a binary element starting at offset, returns the offset after it
+
+    Records are read in runs that share the same list widths: the widths of the
+    first record are assumed for a whole block, the block is decoded with a single
+    np.frombuffer and is cut at the first record whose counts disagree.
+    A mesh with only triangles is therefore read in a handful of calls.
+    """
+    if len(element.list_properties()) == 0:
+        dtype = element.scalar_dtype(byte_order)
+        element.data = np.frombuffer(buffer, dtype, element.count, offset).astype(
+            element.scalar_dtype()
+        )
+        return offset + element.count * dtype.itemsize
+    runs = []
+    done = 0
+    block_size = 4096
+    while done < element.count:
+        widths = _record_widths(element, buffer, offset, byte_order)
+        dtype = _record_dtype(element, widths, byte_order)
+        n = min(element.count - done, block_size, (len(buffer) - offset) // dtype.itemsize)
+        if n == 0:
+            raise Exception(f"PLY element {element.name} is truncated")
+        block = np.frombuffer(buffer, dtype, n, offset)
+        match = np.ones(n, bool)
+        for p, width in zip(element.list_properties(), widths):
+            match &= block[p.name + "__count"] == width
+        run = n if match.all() else int(np.argmin(match))
+        runs.append((run, block[:run], widths))
+        offset += run * dtype.itemsize
+        done += run
+        # grow the block while the widths stay the same
+        block_size = block_size * 2 if run == n else max(64, run * 2)
+    _store_runs(element, runs)
+    return offset
+
+
+def _decode_ascii(element: PlyElement, lines: list, line: int) -> int:
+    """
+    Decode an ascii element starting at the given line, returns the line after it
+    """
+    rows = lines[line : line + element.count]
+    if len(rows) < element.count:
+        raise Exception(f"PLY element {element.name} is truncated")
+    native = element.scalar_dtype()
+    if len(element.list_properties()) == 0:
+        values = np.array(b" ".join(rows).split(), dtype=np.float64)
+        values = values.reshape(element.count, len(element.properties))
+        element.data = np.empty(element.count, native)
+        for i, p in enumerate(element.properties):
+            element.data[p.name] = values[:, i]
+        return line + element.count
+    # records with lists have a variable number of tokens,
+    # find the token index where each property starts in every row
+    scalars = {p.name: [] for p in element.properties if not p.is_list}
+    counts = {p.name: [] for p in element.list_properties()}
+    values = {p.name: [] for p in element.list_properties()}
+    for row in rows:
+        tokens = row.split()
+        i = 0
+        for p in element.properties:
+            if p.is_list:
+                width = int(tokens[i])
+                counts[p.name].append(width)
+                values[p.name].extend(tokens[i + 1 : i + 1 + width])
+                i += 1 + width
+            else:
+                scalars[p.name].append(tokens[i])
+                i += 1
+    element.data = np.empty(element.count, native)
+    for name, column in scalars.items():
+        element.data[name] = np.array(column, dtype=np.float64)
+    for p in element.list_properties():
+        element.lists[p.name] = (
+            np.array(counts[p.name], dtype=np.uint32),
+            np.array(values[p.name], dtype=np.float64).astype(ply_types[p.type]),
+        )
+    return line + element.count
+
+
+def _decode_tokens(element: PlyElement, tokens: np.ndarray, position: int) -> int:
+    """
+    Decode an ascii element from the flat array with every number of the body,
+    starting at the given token, returns the token after the element
+
+    Works like _decode_binary: records are reshaped in runs that share the same
+    list widths, so a mesh with only triangles is a single reshape.
+    """
+    columns = len(element.properties)
+    if len(element.list_properties()) == 0:
+        values = tokens[position : position + element.count * columns]
+        if len(values) < element.count * columns:
+            raise Exception(f"PLY element {element.name} is truncated")
+        values = values.reshape(element.count, columns)
+        element.data = np.empty(element.count, element.scalar_dtype())
+        for i, p in enumerate(element.properties):
+            element.data[p.name] = values[:, i]
+        return position + element.count * columns
+    runs = []
+    done = 0
+    block_size = element.count
+    while done < element.count:
+        # column of every property for the widths of the current record
+        widths = []
+        layout = []
+        i = position
+        for p in element.properties:
+            layout.append(i - position)
+            if p.is_list:
+                width = int(tokens[i])
+                widths.append(width)
+                i += 1 + width
+            else:
+                i += 1
+        length = i - position
+        n = min(element.count - done, block_size, (len(tokens) - position) // length)
+        if n == 0:
+            raise Exception(f"PLY element {element.name} is truncated")
+        block = tokens[position : position + n * length].reshape(n, length)
+        match = np.ones(n, bool)
+        k = 0
+        for p, column in zip(element.properties, layout):
+            if p.is_list:
+                match &= block[:, column] == widths[k]
+                k += 1
+        run = n if match.all() else int(np.argmin(match))
+        fields = {}
+        k = 0
+        for p, column in zip(element.properties, layout):
+            if p.is_list:
+                fields[p.name] = block[:run, column + 1 : column + 1 + widths[k]]
+                k += 1
+            else:
+                fields[p.name] = block[:run, column]
+        runs.append((run, fields, tuple(widths)))
+        position += run * length
+        done += run
+        block_size = block_size * 2 if run == n else max(64, run * 2)
+    _store_runs(element, runs)
+    return position
+
+
+def line_chunks(newlines: np.ndarray, first_line: int, count: int, chunks: int) -> list:
+    """
+    line_chunks(newlines, first_line, count, chunks)
+    Split `count` lines starting at `first_line` into byte ranges that begin and
+    end at line breaks, `newlines` holds the position of every line break,
+    returns a list of (first row, rows, start byte, end byte)
+    """
+    def line_start(line):
+        if line == 0:
+            return 0
+        return int(newlines[line - 1]) + 1 if line <= len(newlines) else None
+
+    ranges = []
+    for i in range(chunks):
+        begin = first_line + count * i // chunks
+        end = first_line + count * (i + 1) // chunks
+        if end == begin:
+            continue
+        start = line_start(begin)
+        stop = line_start(end)
+        ranges.append((begin - first_line, end - begin, start, stop))
+    return ranges
+
+
+def _read_range(file_path: str, start: int, end: int) -> bytes:
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        return f.read(-1 if end is None else end - start)
+
+
+def _count_tokens(file_path: str, start: int, end: int) -> int:
+    """
+    Number of whitespace separated tokens in a byte range of a file
+    """
+    block = np.frombuffer(_read_range(file_path, start, end), np.uint8)
+    if len(block) == 0:
+        return 0
+    space = block <= ord(" ")
+    return int(np.count_nonzero(space[:-1] & ~space[1:])) + int(not space[0])
+
+
+def _shared_array(name: str, dtype, count: int) -> tuple:
+    """
+    Attach a numpy array to an existing shared memory block
+    """
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(count, dtype=dtype, buffer=memory.buf)
+
+
+def _decode_chunk(
+    file_path: str,
+    element: PlyElement,
+    chunk: tuple,
+    integer: bool,
+    shared: dict,
+    value_start: int,
+):
+    """
+    Process pool worker: decode the records of one chunk of an ascii element
+    and write them into the shared arrays of the whole element
+    """
+    row, rows, start, end = chunk
+    tokens = np.fromstring(
+        _read_range(file_path, start, end),
+        dtype=np.int64 if integer else np.float64,
+        sep=" ",
+    )
+    part = PlyElement(element.name, rows)
+    part.properties = element.properties
+    if _decode_tokens(part, tokens, 0) != len(tokens):
+        raise Exception(f"PLY element {element.name} has extra values")
+    writes = [("data", part.data.dtype, element.count, row, part.data)]
+    for p in element.list_properties():
+        counts, values = part.lists[p.name]
+        writes.append((p.name + "__count", np.uint32, element.count, row, counts))
+        writes.append((p.name, ply_types[p.type], value_start + len(values), value_start, values))
+    for name, dtype, count, offset, values in writes:
+        memory, view = _shared_array(shared[name], dtype, count)
+        view[offset : offset + len(values)] = values
+        # the view must be released before the block can be closed
+        del view
+        memory.close()
+
+
+def _decode_parallel(
+    file_path: str,
+    element: PlyElement,
+    chunks: list,
+    integer: bool,
+    executor: ProcessPoolExecutor,
+):
+    """
+    Decode an ascii element with a process pool, one task per chunk of lines.
+    The results are written by the workers straight into shared memory, list
+    values go to the offset given by a first pass that counts the tokens of each chunk.
+    """
+    lists = element.list_properties()
+    value_starts = [0] * len(chunks)
+    total_values = 0
+    if len(lists) > 0:
+        tokens = executor.map(
+            _count_tokens,
+            repeat(file_path),
+            [chunk[2] for chunk in chunks],
+            [chunk[3] for chunk in chunks],
+        )
+        # every record has one token per scalar and one count per list
+        for i, (chunk, n) in enumerate(zip(chunks, tokens)):
+            value_starts[i] = total_values
+            total_values += n - chunk[1] * len(element.properties)
+    blocks = {}
+    sizes = {"data": (element.scalar_dtype(), element.count)}
+    for p in lists:
+        sizes[p.name + "__count"] = (np.dtype(np.uint32), element.count)
+        sizes[p.name] = (np.dtype(ply_types[p.type]), total_values)
+    try:
+        for name, (dtype, count) in sizes.items():
+            blocks[name] = shared_memory.SharedMemory(
+                create=True, size=max(1, dtype.itemsize * count)
+            )
+        shared = {name: block.name for name, block in blocks.items()}
+        # consume the results so worker errors are raised here
+        list(
+            executor.map(
+                _decode_chunk,
+                repeat(file_path),
+                repeat(element),
+                chunks,
+                repeat(integer),
+                repeat(shared),
+                value_starts,
+            )
+        )
+        arrays = {
+            name: np.ndarray(count, dtype=dtype, buffer=blocks[name].buf).copy()
+            for name, (dtype, count) in sizes.items()
+        }
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+    element.data = arrays["data"]
+    for p in lists:
+        element.lists[p.name] = (arrays[p.name + "__count"], arrays[p.name])
+
+
+def read_ply(file_path: str, bulk: bool = True, workers: int = 1) -> PlyData:
+    """
+    read_ply(file_path, bulk=True, workers=1)
+    Read a PLY file in ascii, binary_little_endian or binary_big_endian format,
+    every element is decoded into numpy arrays
+
+    With bulk an ascii body is parsed as one buffer with a single numeric parse
+    per element, without it the body is parsed line by line (slower, but it
+    also accepts blank lines between records).
+    With more than one worker, large ascii elements are split into chunks of lines
+    that are parsed by a process pool (elements with more than one list
+    property are always parsed in this process)
+    """
+    if not os.path.isfile(file_path):
+        raise Exception(f"File not found: {file_path}")
+    with open(file_path, "rb") as f:
+        data = f.read()
+    ply, body_start = read_ply_header(data)
+    if ply.format == "ascii" and bulk:
+        body = data[body_start:]
+        # every record is one line, so each element block ends at a known line break
+        newlines = np.flatnonzero(np.frombuffer(body, np.uint8) == ord("\n"))
+        executor = ProcessPoolExecutor(workers) if workers > 1 else None
+        try:
+            line = 0
+            start = 0
+            for element in ply.elements:
+                end = line + element.count
+                end = newlines[end - 1] + 1 if 0 < end <= len(newlines) else len(body)
+                # integer parsing is much faster, use it for blocks without floats
+                types = [p.type for p in element.properties]
+                types += [p.count_type for p in element.list_properties()]
+                integer = all(np.dtype(ply_types[x]).kind in "iu" for x in types)
+                if (
+                    executor is not None
+                    and element.count >= parallel_min_rows
+                    and len(element.list_properties()) <= 1
+                ):
+                    chunks = line_chunks(newlines, line, element.count, workers * 4)
+                    chunks = [
+                        (row, rows, body_start + a, len(data) if b is None else body_start + b)
+                        for row, rows, a, b in chunks
+                    ]
+                    _decode_parallel(file_path, element, chunks, integer, executor)
+                else:
+                    tokens = np.fromstring(
+                        body[start:end], dtype=np.int64 if integer else np.float64, sep=" "
+                    )
+                    _decode_tokens(element, tokens, 0)
+                line += element.count
+                start = end
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    elif ply.format == "ascii":
+        lines = [x for x in data[body_start:].split(b"\n") if x.strip()]
+        line = 0
+        for element in ply.elements:
+            line = _decode_ascii(element, lines, line)
+    else:
+        byte_order = ply_formats[ply.format]
+        buffer = memoryview(data)
+        offset = body_start
+        for element in ply.elements:
+            offset = _decode_binary(element, buffer, offset, byte_order)
+    return ply
+
+
+def triangulate(counts: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    triangulate(counts, values)
+    Fan triangulate polygons given as (counts, flat vertex indices),
+    returns a (n, 3) uint32 array of triangles
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    values = np.asarray(values)
+    if len(counts) > 0 and np.all(counts == 3):
+        return values.reshape(-1, 3).astype(np.uint32)
+    starts = np.cumsum(counts) - counts
+    # polygons with less than 3 vertices produce no triangles
+    triangles_per_face = np.maximum(counts - 2, 0)
+    face = np.repeat(np.arange(len(counts)), triangles_per_face)
+    first_triangle = np.cumsum(triangles_per_face) - triangles_per_face
+    corner = np.arange(len(face)) - first_triangle[face] + 1
+    base = starts[face]
+    triangles = np.empty((len(face), 3), dtype=np.uint32)
+    triangles[:, 0] = values[base]
+    triangles[:, 1] = values[base + corner]
+    triangles[:, 2] = values[base + corner + 1]
+    return triangles
+
+
+def load_ply_arrays(
+    file_path: str,
+    scale: float = 1.0,
+    attributes: list = (),
+    triangulate_faces: bool = True,
+    bulk: bool = True,
+    workers: int = 1,
+) -> dict:
+    """
+    load_ply_arrays(file_path, scale, attributes, triangulate_faces)
+    Load a PLY file into the arrays used to build a Model:
+    "position" (n, 3) float32 scaled by scale, one array per extra vertex
+    attribute ("color" is red, green and blue normalized to 0-1) and either
+    "indices" (m, 3) uint32 triangles or, without triangulate_faces,
+    the polygons as "face_counts" and "face_indices"
+    """
+    ply = read_ply(file_path, bulk, workers)
+    vertex = ply["vertex"].data
+    arrays = {}
+    # get the vertices
+    positions = np.stack([vertex["x"], vertex["y"], vertex["z"]], axis=1)
+    arrays["position"] = positions.astype(np.float32) * np.float32(scale)
+    for name in attributes:
+        if name == "color":
+            # 8 bit colors are normalized to 0-1
+            if not all(x in vertex.dtype.names for x in ("red", "green", "blue")):
+                continue
+            colors = np.stack([vertex["red"], vertex["green"], vertex["blue"]], axis=1)
+            if vertex.dtype["red"].kind == "u":
+                colors = colors / np.iinfo(vertex.dtype["red"]).max
+            arrays["color"] = colors.astype(np.float32)
+        elif name in vertex.dtype.names:
+            arrays[name] = vertex[name].astype(np.float32)
+        else:
+            raise Exception(f"Vertex attribute {name} not found in {file_path}")
+    # get the faces, the list is named vertex_indices or vertex_index
+    counts = np.empty(0, dtype=np.uint32)
+    values = np.empty(0, dtype=np.uint32)
+    if "face" in ply:
+        lists = ply["face"].lists
+        for name in ("vertex_indices", "vertex_index"):
+            if name in lists:
+                counts, values = lists[name]
+                break
+    if triangulate_faces:
+        arrays["indices"] = triangulate(counts, values)
+    else:
+        arrays["face_counts"] = counts.astype(np.uint32)
+        arrays["face_indices"] = values.astype(np.uint32)
+    return arrays
+
+
+def _parse_numbers(block: bytes, integer: bool) -> np.ndarray:
+    """
+    Parse every whitespace separated number of a block
+    """
+    return np.fromstring(block, dtype=np.int64 if integer else np.float64, sep=" ")
+
+
+def parse_numbers(
+    block: bytes, integer: bool, executor: ProcessPoolExecutor = None, chunks: int = 1
+) -> np.ndarray:
+    """
+    parse_numbers(block, integer, executor, chunks)
+    Parse every number of a block of lines, with an executor large blocks
+    are cut at line breaks and the chunks are parsed by the pool
+    """
+    if executor is None or chunks <= 1 or len(block) < parallel_min_bytes:
+        return _parse_numbers(block, integer)
+    cuts = [0]
+    for i in range(1, chunks):
+        cut = block.find(b"\n", len(block) * i // chunks)
+        cuts.append(len(block) if cut == -1 else cut + 1)
+    cuts.append(len(block))
+    parts = [block[a:b] for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+    return np.concatenate(list(executor.map(_parse_numbers, parts, repeat(integer))))
+
+
+def _parse_rows(lines: list, columns: int, executor=None, chunks: int = 1) -> np.ndarray:
+    """
+    Parse OBJ statement arguments into a (n, columns) float array,
+    extra values on a line (like w or vertex colors) are dropped
+    """
+    if len(lines) == 0:
+        return np.empty((0, columns), dtype=np.float32)
+    width = len(lines[0].split())
+    values = parse_numbers(b"\n".join(lines), False, executor, chunks)
+    if width >= columns and values.size == len(lines) * width:
+        return values.reshape(-1, width)[:, :columns].astype(np.float32)
+    # lines with different widths, parse one by one
+    rows = [line.split()[:columns] for line in lines]
+    return np.array(rows, dtype=np.float64).astype(np.float32)
+
+
+def _line_starts(data: bytes, statement: bytes) -> np.ndarray:
+    return np.array([m.start() for m in obj_statements[statement].finditer(data)], dtype=np.int64)
+
+
+def read_obj(file_path: str, workers: int = 1) -> dict:
+    """
+    read_obj(file_path, workers=1)
+    Read the geometry of an OBJ file into numpy arrays:
+    "position" (n, 3), "uv" (n, 2), "normal" (n, 3),
+    "face_counts" with the number of corners of each face and
+    "corners" (m, 3) with the zero based position, uv and normal index
+    of every corner (-1 when missing)
+    """
+    if not os.path.isfile(file_path):
+        raise Exception(f"File not found: {file_path}")
+    with open(file_path, "rb") as f:
+        data = f.read()
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        chunks = workers * 4
+        statements = {
+            name: expression.findall(data) for name, expression in obj_statements.items()
+        }
+        positions = _parse_rows(statements[b"v"], 3, executor, chunks)
+        uvs = _parse_rows(statements[b"vt"], 2, executor, chunks)
+        normals = _parse_rows(statements[b"vn"], 3, executor, chunks)
+        faces = statements[b"f"]
+        if len(faces) == 0:
+            raise Exception(f"No faces in {file_path}")
+        block = b"\n".join(faces)
+        # count the corners of each face: tokens that start after a blank
+        characters = np.frombuffer(block, np.uint8)
+        blank = characters <= ord(" ")
+        starts = ~blank & np.concatenate(([True], blank[:-1]))
+        line = np.cumsum(characters == ord("\n"))
+        counts = np.bincount(line[starts], minlength=len(faces))
+        # every corner is p, p/t, p//n or p/t/n, all the faces must use the same form
+        first = faces[0].split()[0].split(b"/")
+        has_uv = len(first) > 1 and first[1] != b""
+        has_normal = len(first) > 2 and first[2] != b""
+        columns = 1 + has_uv + has_normal
+        block = block.replace(b"//", b" ").replace(b"/", b" ")
+        values = parse_numbers(block, True, executor, chunks)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if values.size != counts.sum() * columns:
+        raise Exception(f"Faces of {file_path} mix corner formats")
+    values = values.reshape(-1, columns)
+    corners = np.full((len(values), 3), -1, dtype=np.int64)
+    sources = [(0, positions, b"v")]
+    if has_uv:
+        sources.append((1, uvs, b"vt"))
+    if has_normal:
+        sources.append((2, normals, b"vn"))
+    face_starts = None
+    for column, (target, source, statement) in enumerate(sources):
+        index = values[:, column]
+        if (index < 0).any():
+            # negative indices are relative to the values declared before the face
+            if face_starts is None:
+                face_starts = np.repeat(_line_starts(data, b"f"), counts)
+            declared = np.searchsorted(_line_starts(data, statement), face_starts)
+            index = np.where(index < 0, declared + index, index - 1)
+        else:
+            index = index - 1
+        if len(index) > 0 and (index.min() < 0 or index.max() >= len(source)):
+            raise Exception(f"Face index out of range in {file_path}")
+        corners[:, target] = index
+    return {
+        "position": positions,
+        "uv": uvs,
+        "normal": normals,
+        "face_counts": counts.astype(np.uint32),
+        "corners": corners,
+    }
+
+
+def weld_corners(corners: np.ndarray, sizes: tuple) -> tuple:
+    """
+    weld_corners(corners, sizes)
+    Find the unique (position, uv, normal) combinations of the corners,
+    sizes is the number of positions, uvs and normals.
+    Every combination is packed into a single integer key and the keys are
+    deduplicated in one vectorized pass, vertices keep the order of first use.
+    Returns the corner of each unique vertex and the vertex of each corner
+    """
+    keys = np.zeros(len(corners), dtype=np.int64)
+    total = 1
+    for size in sizes:
+        total *= size + 1
+    if total < 2**63:
+        for column, size in enumerate(sizes):
+            keys = keys * (size + 1) + corners[:, column] + 1
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(corners, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    # renumber the vertices in the order they are first used
+    order = np.argsort(first, kind="stable")
+    rank = np.empty(len(order), dtype=np.uint32)
+    rank[order] = np.arange(len(order), dtype=np.uint32)
+    return first[order], rank[inverse]
+
+
+def load_obj_arrays(
+    file_path: str,
+    scale: float = 1.0,
+    attributes: list = ("uv", "normal"),
+    triangulate_faces: bool = True,
+    workers: int = 1,
+) -> dict:
+    """
+    load_obj_arrays(file_path, scale, attributes, triangulate_faces)
+    Load an OBJ file into the arrays used to build a Model: an indexed mesh
+    with one vertex per unique (position, uv, normal) combination,
+    "position" (n, 3) float32 scaled by scale, "uv" and "normal" when they
+    are in attributes and in the file, and "indices" (m, 3) uint32 triangles
+    or, without triangulate_faces, "face_counts" and "face_indices"
+    """
+    obj = read_obj(file_path, workers)
+    used = [0]
+    for column, name in ((1, "uv"), (2, "normal")):
+        if name in attributes and (obj["corners"][:, column] >= 0).all():
+            used.append(column)
+    names = ["position", "uv", "normal"]
+    corners = obj["corners"][:, used]
+    unique, vertex = weld_corners(corners, [len(obj[names[column]]) for column in used])
+    arrays = {"position": obj["position"][corners[unique, 0]] * np.float32(scale)}
+    for i, column in enumerate(used[1:], 1):
+        arrays[names[column]] = obj[names[column]][corners[unique, i]]
+    if triangulate_faces:
+        arrays["indices"] = triangulate(obj["face_counts"], vertex)
+    else:
+        arrays["face_counts"] = obj["face_counts"]
+        arrays["face_indices"] = vertex
+    return arrays
+
+
+def load_model_arrays(
+    file_path: str,
+    cache: MeshCache = None,
+    optimize: bool = False,
+    overdraw: bool = False,
+    **options,
+) -> dict:
+    """
+    load_model_arrays(file_path, cache, optimize, overdraw, **options)
+    Load the arrays of a PLY or OBJ file with load_ply_arrays or load_obj_arrays,
+    through the cache when one is given. With optimize the triangles and vertices
+    are reordered for the vertex caches (and the clusters for overdraw with overdraw),
+    the optimized arrays are the ones stored in the cache.
+    It does not use OpenGL, so it can run in a worker thread or process
+    """
+    extension = os.path.splitext(file_path)[1]
+    if extension == models_extensions["ply"]:
+        loader = load_ply_arrays
+    elif extension == models_extensions["obj"]:
+        loader = load_obj_arrays
+    else:
+        raise Exception(f"File extension not supported: {file_path}")
+
+    def load():
+        arrays = loader(file_path, **options)
+        if optimize or overdraw:
+            arrays, _ = optimize_arrays(arrays, overdraw)
+        return arrays
+
+    if cache is None:
+        return load()
+    # workers and bulk do not change the result, keep them out of the key
+    key_options = {k: v for k, v in options.items() if k not in ("workers", "bulk")}
+    if optimize or overdraw:
+        key_options["optimize"] = "overdraw" if overdraw else "vertex cache"
+    return cache.load_or_create(file_path, key_options, load)
+
+
+def bounding_sphere(positions: np.ndarray) -> tuple:
+    """
+    bounding_sphere(positions)
+    A sphere around the positions, centered on their bounding box.
+    Returns the center and the radius
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    if len(positions) == 0:
+        return glm.vec3(0.0), 0.0
+    center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+    radius = float(np.sqrt(((positions - center) ** 2).sum(axis=1).max()))
+    return glm.vec3(*center.tolist()), radius
+
+
+def bounding_box(positions: np.ndarray) -> tuple:
+    """
+    bounding_box(positions)
+    The axis aligned box around the positions.
+    Returns its min and max corners
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    if len(positions) == 0:
+        return glm.vec3(0.0), glm.vec3(0.0)
+    return glm.vec3(*positions.min(axis=0).tolist()), glm.vec3(*positions.max(axis=0).tolist())
+
 
 class Model:
     """
@@ -27,164 +929,227 @@ class Model:
         position: glm.vec3 = glm.vec3(0.0, 0.0, 0.0),
         rotation: glm.vec3 = glm.vec3(0.0, 0.0, 0.0),
         scale: glm.vec3 = glm.vec3(1.0, 1.0, 1.0),
+        program: ShaderProgram = None,
     ):
         if faces is None or vertices is None:
             raise Exception("Faces and vertices cannot be None")
-        self.vertices = array("f", vertices)
-        self.faces = array("I", faces) 
-        self.colors = array("f", colors) if colors else None # array of floats
-        self.uvs = array("f", uvs) if uvs else None # array of floats
+        self.vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.faces = np.asarray(faces, dtype=np.uint32).reshape(-1)
+        # one color and one uv per vertex
+        self.colors = (
+            np.asarray(colors, dtype=np.float32).reshape(len(self.vertices), -1)
+            if colors is not None and len(colors)
+            else None
+        )
+        self.uvs = (
+            np.asarray(uvs, dtype=np.float32).reshape(-1, 2)
+            if uvs is not None and len(uvs)
+            else None
+        )
 
         self.position = position
         self.rotation = rotation
         self.scale = scale
 
-        # create the vertex array
-        self.vao = GL.glGenVertexArrays(1)
-        # bind the vertex array
-        GL.glBindVertexArray(self.vao)
-        # create the vertex buffer
-        self.vbo = GL.glGenBuffers(1)
-        # bind the vertex buffer
-        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
-        # create the vertex buffer data
-        self.vbo_data = array("f", [])
-        for i in range(len(self.vertices)):
-            self.vbo_data.append(self.vertices[i])
-            if self.colors:
-                self.vbo_data.append(self.colors[i])
-        # upload the vertex buffer data
-        GL.glBufferData(
-            GL.GL_ARRAY_BUFFER,
-            len(self.vbo_data) * self.vbo_data.itemsize,
-            ctypes.c_void_p(self.vbo_data.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
-        )
-        # create the element buffer
-        self.ebo = GL.glGenBuffers(1)
-        # bind the element buffer
-        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
-        # upload the element buffer data
-        GL.glBufferData(
-            GL.GL_ELEMENT_ARRAY_BUFFER,
-            len(self.faces) * self.faces.itemsize,
-            ctypes.c_void_p(self.faces.buffer_info()[0]),
-            GL.GL_STATIC_DRAW,
-        )
-        # set the vertex attribute pointer
-        GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, GL.GL_FALSE, 0, None)
-        # enable the vertex attribute pointer
-        GL.glEnableVertexAttribArray(0)
-        # unbind the vertex array
-        GL.glBindVertexArray(0)
+        arrays = {"position": self.vertices}
+        if self.colors is not None:
+            arrays["color"] = self.colors
+        if self.uvs is not None:
+            arrays["uv"] = self.uvs
+        self._upload(arrays, self.faces, program)
 
-    def open_from_file(self, file_path: str) -> Model:
+    @staticmethod
+    def _empty() -> Model:
+        """
+        A model without buffers, used by the loaders that upload their own data
+        """
+        model = Model.__new__(Model)
+        model._set_defaults()
+        return model
+
+    def _set_defaults(self):
+        self.vertices = None
+        self.faces = None
+        self.colors = None
+        self.uvs = None
+        self.position = glm.vec3(0.0, 0.0, 0.0)
+        self.rotation = glm.vec3(0.0, 0.0, 0.0)
+        self.scale = glm.vec3(1.0, 1.0, 1.0)
+        # bounding sphere and box in model space
+        self.center = glm.vec3(0.0, 0.0, 0.0)
+        self.radius = 0.0
+        self.box_min = glm.vec3(0.0, 0.0, 0.0)
+        self.box_max = glm.vec3(0.0, 0.0, 0.0)
+        # triangle BVH for ray picking (bvh.py), only built when needed
+        self.triangle_bvh = None
+
+    def _set_vertex_array(self, vertex_array: VertexArray):
+        self.vertex_array = vertex_array
+        self.layout = vertex_array.layout
+        self.attributes = vertex_array.layout.attributes
+        self.vao = vertex_array.vao
+        self.vbo = vertex_array.vbo
+        self.ebo = vertex_array.ebo
+        self.index_count = vertex_array.count
+        self.index_type = vertex_array.index_type
+
+    def _upload(self, arrays: dict, indices: np.ndarray, program: ShaderProgram = None):
+        # a single interleaved buffer, the attributes in the dict order
+        layout, vertices = VertexLayout.from_arrays(arrays)
+        indices = np.ascontiguousarray(indices, dtype=np.uint32).reshape(-1)
+        self._set_vertex_array(VertexArray(layout, vertices, indices, program=program))
+        self._set_bounds(arrays["position"])
+
+    def _set_bounds(self, positions: np.ndarray):
+        # bounding volumes for the culling and the level of detail
+        self.center, self.radius = bounding_sphere(positions)
+        self.box_min, self.box_max = bounding_box(positions)
+
+    def _set_stored_bounds(self, bounds: tuple):
+        # bounds computed before, (box min, box max, center, radius) like MappedMesh.bounds
+        box_min, box_max, center, radius = bounds
+        self.box_min, self.box_max = glm.vec3(*box_min), glm.vec3(*box_max)
+        self.center, self.radius = glm.vec3(*center), float(radius)
+
+    def world_sphere(self) -> tuple:
+        """
+        world_sphere()
+        The bounding sphere moved by the model matrix,
+        the radius grows with the largest scale
+        """
+        center = glm.vec3(self.get_model_matrix() * glm.vec4(self.center, 1.0))
+        scale = max(abs(self.scale.x), abs(self.scale.y), abs(self.scale.z))
+        return center, self.radius * scale
+
+    def bind_attributes(self, program: ShaderProgram):
+        """
+        bind_attributes(program)
+        Bind the vertex attributes to the inputs of a program by name,
+        for models uploaded before the program was linked
+        """
+        self.vertex_array.bind(program)
+
+    @staticmethod
+    def from_arrays(
+        arrays: dict, indices: np.ndarray = None, program: ShaderProgram = None
+    ) -> Model:
+        """
+        Static method to create a model from attribute arrays,
+        arrays maps an attribute name to a (n, components) array,
+        they are interleaved into a single vertex buffer in the dict order.
+        Without indices they are taken from arrays["indices"].
+        With a program the attributes are bound to its inputs by name
+        """
+        if indices is None:
+            arrays = dict(arrays)
+            indices = arrays.pop("indices")
+        model = Model._empty()
+        model._upload(arrays, indices, program)
+        return model
+
+    @staticmethod
+    def open_mesh(
+        file_path: str, chunk_bytes: int = 64 * 2**20, program: ShaderProgram = None
+    ) -> Model:
+        """
+        Static method to open a .bmesh model from a file,
+        the file is mapped and its blocks go to the GPU without copies in Python
+        """
+        model = Model._empty()
+        with MappedMesh(file_path) as mesh:
+            layout = VertexLayout(mesh.attributes, mesh.stride)
+            vertex_array = VertexArray(
+                layout, mesh.vertex_size, mesh.index_size, mesh.index_type, program
+            )
+            gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, vertex_array.vbo)
+            mesh.upload(
+                GL.GL_ARRAY_BUFFER, mesh.vertex_offset, mesh.vertex_size, chunk_bytes, False
+            )
+            gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, 0)
+            gl_state.bind_vertex_array(vertex_array.vao)
+            mesh.upload(
+                GL.GL_ELEMENT_ARRAY_BUFFER, mesh.index_offset, mesh.index_size, chunk_bytes, False
+            )
+            gl_state.bind_vertex_array(0)
+            vertex_array.count = mesh.index_count
+            model._set_vertex_array(vertex_array)
+            if mesh.bounds is not None:
+                model._set_stored_bounds(mesh.bounds)
+            elif "position" in layout.dtype.names:
+                # files written before the bounds were stored
+                model._set_bounds(mesh.vertex_array()["position"])
+        return model
+
+    def draw(self):
+        """
+        draw()
+        Draw the model triangles
+        """
+        gl_state.bind_vertex_array(self.vao)
+        GL.glDrawElements(GL.GL_TRIANGLES, self.index_count, self.index_type, None)
+
+    @staticmethod
+    def open_from_file(file_path: str, **kwargs) -> Model:
         """
         Static method to open a model from a file
         """
         # verify if the file extension is supported
-        if not file_path.endswith(models_extensions.values()):
+        if not file_path.endswith(tuple(models_extensions.values())):
             raise Exception(f"File extension not supported: {file_path}")
         # verify if the file exists
         if not os.path.isfile(file_path):
             raise Exception(f"File not found: {file_path}")
-        file_extension = file_path.split(".")[-1]
+        file_extension = os.path.splitext(file_path)[1]
         if file_extension == models_extensions["ply"]:
-            Model = Model.open_ply(file_path)
+            return Model.open_ply(file_path, **kwargs)
         elif file_extension == models_extensions["obj"]:
-            Model = Model.open_obj(file_path)
+            return Model.open_obj(file_path, **kwargs)
+        elif file_extension == models_extensions["bmesh"]:
+            return Model.open_mesh(file_path)
         else:
             raise Exception(f"File extension not supported: {file_path}")
 
-    def open_ply(file_path: str):
+    @staticmethod
+    def open_ply(
+        file_path: str,
+        scale: float = 1.0,
+        bulk: bool = True,
+        workers: int = 1,
+        cache: MeshCache = None,
+    ) -> Model:
         """
-        Static method to open a ply model from a file
+        Static method to open a ply model from a file,
+        with a cache the processed arrays are stored on disk and reused
         """
-        # verify if the file exists
-        if not os.path.isfile(file_path):
-            raise Exception(f"File not found: {file_path}")
-        # open the file
-        with open(file_path, "r") as f:
-            # read the file
-            file_content = f.read()
-            # split the file content into lines
-            file_content = file_content.split("\n")
-            # remove all empty lines
-            file_content = [x for x in file_content if x]
-            # remove all comments
-            file_content = [x for x in file_content if not x.startswith("comment")]
-            # remove all empty lines
-            file_content = [x for x in file_content if x]
-            # get the header
-            header = file_content[0:3]
-            # get the number of vertices
-            n_vertices = int(header[0].split(" ")[2])
-            # get the number of faces
-            n_faces = int(header[1].split(" ")[2])
-            # get the number of colors
-            n_colors = int(header[2].split(" ")[2])
-            # get the vertices
-            vertices = file_content[3 : 3 + n_vertices]
-            # get the faces
-            faces = file_content[3 + n_vertices : 3 + n_vertices + n_faces]
-            # get the colors
-            colors = file_content[
-                3 + n_vertices + n_faces : 3 + n_vertices + n_faces + n_colors
-            ]
-            # convert the vertices to a list of floats
-            vertices = [float(x) for x in vertices[0].split(" ")]
-            # convert the faces to a list of ints
-            faces = [int(x) for x in faces[0].split(" ")]
-            # convert the colors to a list of floats
-            colors = [float(x) for x in colors[0].split(" ")]
-            # convert the vertices to a numpy array
-            vertices = array("f", vertices)
-            # convert the faces to a numpy array
-            faces = array("I", faces)
-            # convert the colors to a numpy array
-            colors = array("f", colors)
-            # create the model
-            return Model(vertices, faces, colors)
-
-    def open_obj(file_path: str):
-        """
-        Static method to open a obj model from a file
+        arrays = load_model_arrays(
+            file_path,
+            cache,
+            scale=scale,
+            attributes=["color"],
+            triangulate_faces=True,
+            bulk=bulk,
+            workers=workers,
+        )
+        return Model.from_arrays(arrays)
+
+    @staticmethod
+    def open_obj(
+        file_path: str, scale: float = 1.0, workers: int = 1, cache: MeshCache = None
+    ) -> Model:
         """
-        # verify if the file exists
-        if not os.path.isfile(file_path):
-            raise Exception(f"File not found: {file_path}")
-        # open the file
-        with open(file_path, "r") as f:
-            # read the file
-            file_content = f.read()
-            # split the file content into lines
-            file_content = file_content.split("\n")
-            # remove all empty lines
-            file_content = [x for x in file_content if x]
-            # remove all comments
-            file_content = [x for x in file_content if not x.startswith("#")]
-            # remove all empty lines
-            file_content = [x for x in file_content if x]
-            # get the vertices
-            vertices = [x for x in file_content if x.startswith("v ")]
-            # get the faces
-            faces = [x for x in file_content if x.startswith("f ")]
-            # get the colors
-            colors = [x for x in file_content if x.startswith("c ")]
-            # convert the vertices to a list of floats
-            vertices = [float(x) for x in vertices[0].split(" ")[1:]]
-            # convert the faces to a list of ints
-            faces = [int(x) for x in faces[0].split(" ")[1:]]
-            # convert the colors to a list of floats
-            colors = [float(x) for x in colors[0].split(" ")[1:]]
-            # convert the vertices to a numpy array
-            vertices = array("f", vertices)
-            # convert the faces to a numpy array
-            faces = array("I", faces)
-            # convert the colors to a numpy array
-            colors = array("f", colors)
-            # create the model
-            return Model(vertices, faces, colors)
+        Static method to open a obj model from a file,
+        every unique position, uv and normal combination becomes one vertex
+        of a single interleaved and indexed buffer
+        """
+        arrays = load_model_arrays(
+            file_path,
+            cache,
+            scale=scale,
+            attributes=["uv", "normal"],
+            triangulate_faces=True,
+            workers=workers,
+        )
+        return Model.from_arrays(arrays)
 
     def get_model_matrix(self) -> glm.mat4:
         """
@@ -193,13 +1158,13 @@ class Model:
         # get the model matrix
         model = glm.mat4()
         # translate the model
-        glm.translate(model, self.position)
-        # rotate the model
-        glm.rotate(model, (self.rotation.x), glm.vec3(1.0, 0.0, 0.0))
-        glm.rotate(model, (self.rotation.y), glm.vec3(0.0, 1.0, 0.0))
-        glm.rotate(model, (self.rotation.z), glm.vec3(0.0, 0.0, 1.0))
+        model = glm.translate(model, self.position)
+        # rotate the model, the angles are in degrees
+        model = glm.rotate(model, glm.radians(self.rotation.x), glm.vec3(1.0, 0.0, 0.0))
+        model = glm.rotate(model, glm.radians(self.rotation.y), glm.vec3(0.0, 1.0, 0.0))
+        model = glm.rotate(model, glm.radians(self.rotation.z), glm.vec3(0.0, 0.0, 1.0))
         # scale the model
-        glm.scale(model, self.scale)
+        model = glm.scale(model, self.scale)
         # return the model matrix
         return model
 
@@ -220,3 +1185,205 @@ class Model:
         Set the model scale
         """
         self.scale = scale
+
+
+class StreamingModel(Model):
+    """
+    StreamingModel class:
+    A model whose buffers are allocated with their final size up front
+    and filled a few chunks per frame with glBufferSubData,
+    draw() renders only the triangles whose indices and vertices are already on the GPU
+    """
+
+    def __init__(
+        self,
+        vertices: np.ndarray,
+        layout: VertexLayout,
+        indices: np.ndarray,
+        frame_bytes: int = stream_frame_bytes,
+        chunk_bytes: int = stream_chunk_bytes,
+        program: ShaderProgram = None,
+        mesh: MappedMesh = None,
+        bounds: tuple = None,
+    ):
+        self._set_defaults()
+        # raw bytes of the interleaved vertices and the typed indices
+        self.vertex_data = vertices.reshape(-1).view(np.uint8)
+        self.index_data = indices.reshape(-1)
+        self.stride = layout.stride
+        self.frame_bytes = frame_bytes
+        # chunks are a whole number of pages and of triangles
+        granularity = 3 * mesh_alignment
+        self.chunk_bytes = max(granularity, chunk_bytes // granularity * granularity)
+        # the mapped file the data comes from, released chunk by chunk
+        self.mesh = mesh
+        self.uploaded_vertex_bytes = 0
+        self.uploaded_indices = 0
+        # vertices needed by the indices uploaded so far
+        self.needed_vertices = 0
+        self.total_indices = len(self.index_data)
+
+        # the storage is allocated with the final size, the data comes later
+        self._set_vertex_array(
+            VertexArray(
+                layout,
+                self.vertex_data.nbytes,
+                self.index_data.nbytes,
+                gl_types[self.index_data.dtype],
+                program,
+            )
+        )
+        # without stored bounds they grow with every vertex chunk,
+        # scanning the whole mesh here would delay the first frame
+        self.vertex_dtype = None
+        self.bounded_vertices = 0
+        if bounds is not None:
+            self._set_stored_bounds(bounds)
+        elif "position" in layout.dtype.names:
+            self.vertex_dtype = layout.dtype
+            self._low = np.full(3, np.inf, dtype=np.float32)
+            self._high = np.full(3, -np.inf, dtype=np.float32)
+        if self.done:
+            self._finish()
+
+    @staticmethod
+    def from_arrays(arrays: dict, indices: np.ndarray = None, **kwargs) -> StreamingModel:
+        """
+        Static method to stream a model from attribute arrays,
+        the arrays are interleaved like in Model.from_arrays
+        """
+        if indices is None:
+            arrays = dict(arrays)
+            indices = arrays.pop("indices")
+        layout, vertices = VertexLayout.from_arrays(arrays)
+        indices = np.ascontiguousarray(indices, dtype=np.uint32)
+        return StreamingModel(vertices, layout, indices, **kwargs)
+
+    @staticmethod
+    def open_mesh(file_path: str, **kwargs) -> StreamingModel:
+        """
+        Static method to stream a .bmesh model,
+        the buffers are filled straight from the mapped file,
+        so the first frame does not depend on the size of the mesh
+        """
+        mesh = MappedMesh(file_path)
+        vertices = np.frombuffer(mesh.map, np.uint8, mesh.vertex_size, mesh.vertex_offset)
+        return StreamingModel(
+            vertices,
+            VertexLayout(mesh.attributes, mesh.stride),
+            mesh.index_array(),
+            mesh=mesh,
+            bounds=mesh.bounds,
+            **kwargs,
+        )
+
+    @property
+    def done(self) -> bool:
+        return self.index_count >= self.total_indices
+
+    @property
+    def progress(self) -> float:
+        if self.total_indices == 0:
+            return 1.0
+        return self.index_count / self.total_indices
+
+    def _vertices_ready(self) -> bool:
+        needed = min(self.needed_vertices * self.stride, self.vertex_data.nbytes)
+        return self.uploaded_vertex_bytes >= needed
+
+    def _upload_vertices(self) -> int:
+        start = self.uploaded_vertex_bytes
+        length = min(self.chunk_bytes, self.vertex_data.nbytes - start)
+        chunk = self.vertex_data[start : start + length]
+        gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, start, length, ctypes.c_void_p(chunk.ctypes.data))
+        self.uploaded_vertex_bytes += length
+        if self.vertex_dtype is not None:
+            self._grow_bounds()
+        del chunk
+        if self.mesh is not None:
+            self.mesh.release(self.mesh.vertex_offset + start, length)
+        return length
+
+    def _grow_bounds(self):
+        # add the positions of the vertices completed by the last chunk (still resident)
+        complete = self.uploaded_vertex_bytes // self.stride
+        if complete <= self.bounded_vertices:
+            return
+        data = self.vertex_data[self.bounded_vertices * self.stride : complete * self.stride]
+        positions = data.view(self.vertex_dtype)["position"]
+        np.minimum(self._low, positions.min(axis=0), out=self._low)
+        np.maximum(self._high, positions.max(axis=0), out=self._high)
+        del data, positions
+        self.bounded_vertices = complete
+        # the sphere around the box holds every vertex without going over them again
+        center = (self._low + self._high) / 2
+        radius = float(np.linalg.norm(self._high - self._low)) / 2
+        self._set_stored_bounds(
+            (self._low.tolist(), self._high.tolist(), center.tolist(), radius)
+        )
+
+    def _upload_indices(self) -> int:
+        start = self.uploaded_indices
+        count = self.chunk_bytes // self.index_data.itemsize
+        chunk = self.index_data[start : start + count]
+        self.needed_vertices = max(self.needed_vertices, int(chunk.max()) + 1)
+        # the element buffer is part of the vertex array state
+        gl_state.bind_vertex_array(self.vao)
+        GL.glBufferSubData(
+            GL.GL_ELEMENT_ARRAY_BUFFER,
+            start * chunk.itemsize,
+            chunk.nbytes,
+            ctypes.c_void_p(chunk.ctypes.data),
+        )
+        length = chunk.nbytes
+        del chunk
+        if self.mesh is not None:
+            self.mesh.release(self.mesh.index_offset + start * self.index_data.itemsize, length)
+        self.uploaded_indices += length // self.index_data.itemsize
+        return length
+
+    def stream(self, frame_bytes: int = None) -> int:
+        """
+        stream(frame_bytes)
+        Upload the next chunks, at most frame_bytes (but always at least one chunk).
+        Indices go up in order, before every index chunk the vertices it uses are uploaded,
+        so meshes whose vertices are stored in first use order show up front to back.
+        Returns the number of bytes uploaded
+        """
+        if frame_bytes is None:
+            frame_bytes = self.frame_bytes
+        uploaded = 0
+        while not self.done and (uploaded == 0 or uploaded + self.chunk_bytes <= frame_bytes):
+            if not self._vertices_ready():
+                uploaded += self._upload_vertices()
+            elif self.uploaded_indices < self.total_indices:
+                uploaded += self._upload_indices()
+            # the uploaded indices can be drawn once all their vertices are there
+            if self._vertices_ready():
+                self.index_count = self.uploaded_indices
+        if self.done:
+            self._finish()
+        return uploaded
+
+    def _finish(self):
+        # the data is on the GPU, drop the copies and close the mapped file
+        if self.mesh is None and self.vertex_data is None:
+            return
+        self.vertex_data = None
+        self.index_data = None
+        if self.mesh is not None:
+            self.mesh.close()
+            self.mesh = None
+
+    def draw(self):
+        """
+        draw()
+        Upload the chunks of this frame and draw the triangles uploaded so far
+        """
+        if not self.done:
+            self.stream()
+        if self.index_count == 0:
+            return
+        gl_state.bind_vertex_array(self.vao)
+        GL.glDrawElements(GL.GL_TRIANGLES, self.index_count, self.index_type, None)
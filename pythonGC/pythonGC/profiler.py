@@ -0,0 +1,323 @@
+import ctypes
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from OpenGL import GL
+
+"""
+Frame profiler: named CPU scopes timed with perf_counter_ns and GPU scopes
+timed with GL_TIMESTAMP queries (glQueryCounter). GL_TIME_ELAPSED queries
+can not be nested, a pair of timestamps per scope can.
+The GPU results are read a few frames later, only once they are available,
+so the profiler never waits for the GPU.
+
+Every scope keeps its time per frame (the sum of its calls) in a ring buffer
+of the last frames, for the p50, p95 and p99 of the scope.
+The scopes of the last frames can be exported in the Chrome trace event format,
+open the file in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+# frames kept for the percentiles
+profile_frames = 300
+# frames before the GPU queries of a frame are read
+gpu_latency = 3
+# scopes kept for the trace
+trace_events = 100000
+
+
+def _value(result) -> int:
+    # PyOpenGL returns the queried values as numbers or one element arrays
+    return int(np.asarray(result).reshape(-1)[0])
+
+
+def _query_result(query: int, name: int) -> int:
+    # PyOpenGL can not size the 64 bit outputs itself, they are read into ctypes values
+    value = ctypes.c_uint64()
+    GL.glGetQueryObjectui64v(query, name, ctypes.byref(value))
+    return value.value
+
+
+def _gpu_time() -> int:
+    value = ctypes.c_int64()
+    GL.glGetInteger64v(GL.GL_TIMESTAMP, ctypes.byref(value))
+    return value.value
+
+
+class _Ring:
+    # fixed size buffer of the last values
+    def __init__(self, size: int):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.index = 0
+        self.count = 0
+
+    def add(self, value: float):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % len(self.values)
+        self.count = min(self.count + 1, len(self.values))
+
+    def filled(self) -> np.ndarray:
+        return self.values[: self.count]
+
+
+class Profiler:
+    """
+    Profiler class:
+    begin_frame() and end_frame() around every frame, scope(name) and gpu_scope(name)
+    around the work to measure (they nest).
+    Times are in milliseconds, the trace has one CPU and one GPU track
+    """
+
+    def __init__(
+        self,
+        frames: int = profile_frames,
+        latency: int = gpu_latency,
+        events: int = trace_events,
+    ):
+        self.enabled = True
+        self.frames = frames
+        self.latency = latency
+        self.frame = 0
+        # name -> ring of the milliseconds per frame
+        self.cpu = {}
+        self.gpu = {}
+        # (name, track, start ns, duration ns, depth)
+        self.events = deque(maxlen=events)
+        self.origin = time.perf_counter_ns()
+        self._stack = []
+        self._cpu_totals = {}
+        self._gpu_stack = []
+        self._gpu_scopes = []
+        # (frame, GPU clock minus CPU clock, scopes) waiting for their results
+        self._pending = deque()
+        self._free_queries = []
+        self._gpu_offset = 0
+        self._gpu_supported = None
+        # GPU scopes opened outside of other GPU scopes,
+        # their sum is the GPU time of a frame
+        self._gpu_roots = set()
+
+    def _ring(self, rings: dict, name: str) -> _Ring:
+        ring = rings.get(name)
+        if ring is None:
+            ring = rings[name] = _Ring(self.frames)
+        return ring
+
+    def begin(self, name: str):
+        """
+        begin(name)
+        Open a CPU scope, closed by the next end()
+        """
+        self._stack.append((name, time.perf_counter_ns()) if self.enabled else None)
+
+    def end(self):
+        end = time.perf_counter_ns()
+        scope = self._stack.pop()
+        if scope is None:
+            return
+        name, start = scope
+        self._cpu_totals[name] = self._cpu_totals.get(name, 0) + end - start
+        self.events.append((name, "CPU", start, end - start, len(self._stack)))
+
+    @contextmanager
+    def scope(self, name: str):
+        """
+        scope(name)
+        Time the CPU work of a with block
+        """
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def gpu_available(self) -> bool:
+        """
+        gpu_available()
+        True when the context has timer queries (OpenGL 3.3 or ARB_timer_query)
+        """
+        if self._gpu_supported is None:
+            self._gpu_supported = bool(GL.glQueryCounter) and bool(GL.glGetInteger64v)
+        return self._gpu_supported
+
+    def _query(self) -> int:
+        if self._free_queries:
+            return self._free_queries.pop()
+        return _value(GL.glGenQueries(1))
+
+    def begin_gpu(self, name: str):
+        """
+        begin_gpu(name)
+        Open a GPU scope, closed by the next end_gpu()
+        """
+        if not self.enabled or not self.gpu_available():
+            self._gpu_stack.append(None)
+            return
+        query = self._query()
+        GL.glQueryCounter(query, GL.GL_TIMESTAMP)
+        self._gpu_stack.append((name, query))
+
+    def end_gpu(self):
+        scope = self._gpu_stack.pop()
+        if scope is None:
+            return
+        name, begin = scope
+        end = self._query()
+        GL.glQueryCounter(end, GL.GL_TIMESTAMP)
+        self._gpu_scopes.append((name, begin, end, len(self._gpu_stack)))
+        if not self._gpu_stack:
+            self._gpu_roots.add(name)
+
+    @contextmanager
+    def gpu_scope(self, name: str):
+        """
+        gpu_scope(name)
+        Time the GPU work of the GL calls of a with block
+        """
+        self.begin_gpu(name)
+        try:
+            yield
+        finally:
+            self.end_gpu()
+
+    def begin_frame(self):
+        """
+        begin_frame()
+        Start a frame, it is the outermost "frame" scope
+        """
+        if self.enabled and self.gpu_available():
+            # the GPU clock now, to place the GPU scopes on the CPU timeline
+            self._gpu_offset = _gpu_time() - time.perf_counter_ns()
+        self.begin("frame")
+
+    def end_frame(self):
+        """
+        end_frame()
+        Close the frame, store the CPU times of its scopes
+        and read the GPU results that are ready
+        """
+        self.end()
+        for name, total in self._cpu_totals.items():
+            self._ring(self.cpu, name).add(total / 1e6)
+        self._cpu_totals = {}
+        if self._gpu_scopes:
+            self._pending.append((self.frame, self._gpu_offset, self._gpu_scopes))
+            self._gpu_scopes = []
+        self._collect()
+        self.frame += 1
+
+    def _collect(self):
+        # the oldest frames first, stop at the first one not ready
+        while self._pending and self.frame - self._pending[0][0] >= self.latency:
+            frame, offset, scopes = self._pending[0]
+            last = scopes[-1][2]
+            if not _value(GL.glGetQueryObjectiv(last, GL.GL_QUERY_RESULT_AVAILABLE)):
+                break
+            self._pending.popleft()
+            totals = {}
+            for name, begin, end, depth in scopes:
+                start = _query_result(begin, GL.GL_QUERY_RESULT)
+                stop = _query_result(end, GL.GL_QUERY_RESULT)
+                totals[name] = totals.get(name, 0) + stop - start
+                self.events.append((name, "GPU", start - offset, stop - start, depth))
+                self._free_queries += [begin, end]
+            for name, total in totals.items():
+                self._ring(self.gpu, name).add(total / 1e6)
+
+    def stats(self, name: str, gpu: bool = False) -> dict:
+        """
+        stats(name, gpu)
+        The p50, p95, p99 and mean milliseconds per frame of a scope
+        over the last frames, None for a scope without times
+        """
+        ring = (self.gpu if gpu else self.cpu).get(name)
+        if ring is None or ring.count == 0:
+            return None
+        values = ring.filled()
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]).tolist()
+        return {
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "mean": float(values.mean()),
+            "frames": ring.count,
+        }
+
+    def report(self) -> dict:
+        """
+        report()
+        The stats of every CPU and GPU scope
+        """
+        return {
+            "cpu": {name: self.stats(name) for name in self.cpu},
+            "gpu": {name: self.stats(name, True) for name in self.gpu},
+        }
+
+    def summary(self) -> str:
+        """
+        summary()
+        A line with the frame time, the frame rate and the GPU time of the frames
+        """
+        frame = self.stats("frame")
+        if frame is None:
+            return "no frames"
+        text = (
+            f"Frame: {frame['p50']:.2f} ms "
+            f"(p95 {frame['p95']:.2f}, p99 {frame['p99']:.2f}) "
+            f"{1000 / frame['p50']:.0f} FPS"
+        )
+        gpu = [self.stats(name, True) for name in self.gpu if name in self._gpu_roots]
+        if gpu:
+            text += f" \t GPU: {sum(stats['p50'] for stats in gpu if stats):.2f} ms"
+        return text
+
+    def trace(self) -> dict:
+        """
+        trace()
+        The scopes kept as Chrome trace events
+        """
+        events = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 0,
+                "tid": tid,
+                "args": {"name": track},
+            }
+            for tid, track in enumerate(("CPU", "GPU"))
+        ]
+        for name, track, start, duration, depth in self.events:
+            events.append(
+                {
+                    "name": name,
+                    "cat": track,
+                    "ph": "X",
+                    "ts": (start - self.origin) / 1000,
+                    "dur": duration / 1000,
+                    "pid": 0,
+                    "tid": 0 if track == "CPU" else 1,
+                    "args": {"depth": depth},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, file_path: str):
+        """
+        export_chrome_trace(file_path)
+        Write the trace to a JSON file
+        """
+        with open(file_path, "w") as file:
+            json.dump(self.trace(), file)
+
+    def delete(self):
+        # the queries belong to the context, delete them before it goes away
+        queries = list(self._free_queries)
+        for _, _, scopes in self._pending:
+            for _, begin, end, _ in scopes:
+                queries += [begin, end]
+        if queries:
+            GL.glDeleteQueries(len(queries), queries)
+        self._free_queries = []
+        self._pending.clear()
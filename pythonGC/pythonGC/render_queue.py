@@ -0,0 +1,399 @@
+import ctypes
+import weakref
+
+import numpy as np
+from OpenGL import GL
+
+from gl_state import gl_state
+from mesh_format import numpy_types
+from shader import ShaderProgram, glm_matrix_types
+from vertex_layout import VertexArray
+
+"""
+Render queue: the draws of a frame are submitted in any order and executed
+sorted by a 64 bit key, so the program, textures and vertex array
+change as few times as possible.
+
+Opaque draws go first, sorted by program, material (the textures), mesh
+and then front to back. Blended draws go last, sorted back to front first
+so the blending is right, then by program, material and mesh.
+The items live in numpy arrays, submitting and sorting many of them
+is a few array operations.
+"""
+
+# bits of every field of the sort key
+program_bits = 11
+material_bits = 12
+mesh_bits = 12
+depth_bits = 24
+
+blended_shift = 63
+depth_max = (1 << depth_bits) - 1
+
+# opaque: program | material | mesh | depth
+opaque_shifts = {
+    "program": depth_bits + mesh_bits + material_bits,
+    "material": depth_bits + mesh_bits,
+    "mesh": depth_bits,
+    "depth": 0,
+}
+
+# blended: inverted depth | program | material | mesh
+blended_shifts = {
+    "depth": program_bits + material_bits + mesh_bits,
+    "program": material_bits + mesh_bits,
+    "mesh": 0,
+    "material": mesh_bits,
+}
+
+
+def sort_key(blended: bool, program: int, material: int, mesh: int) -> int:
+    """
+    sort_key(blended, program, material, mesh)
+    The sort key of a draw without its depth, the depths of a batch of draws
+    are added with key_depths
+    """
+    shifts = blended_shifts if blended else opaque_shifts
+    key = (program << shifts["program"]) | (material << shifts["material"])
+    key |= mesh << shifts["mesh"]
+    return key | (1 << blended_shift) if blended else key
+
+
+def key_depths(depths: np.ndarray, blended: bool) -> np.ndarray:
+    """
+    key_depths(depths, blended)
+    The depth bits of the keys, inverted for the blended draws (back to front)
+    """
+    depths = np.asarray(depths, dtype=np.uint64)
+    if blended:
+        depths = np.uint64(depth_max) - depths
+    shifts = blended_shifts if blended else opaque_shifts
+    return depths << np.uint64(shifts["depth"])
+
+
+class _Registry:
+    # small integer ids for the objects used in the keys, the objects are only
+    # referenced weakly: the id of a garbage collected (or released) object is reused.
+    # The RenderQueue keeps the objects of its queued items alive until it is cleared
+    def __init__(self, bits: int, kind: str):
+        self.limit = 1 << bits
+        self.kind = kind
+        self.ids = {}
+        self.objects = []
+        self._free = []
+        # owner id -> (keys that go away with it, its finalizer)
+        self._owned = {}
+        # key -> owner ids
+        self._owners = {}
+
+    def id(self, key, value, owners=()) -> int:
+        index = self.ids.get(key)
+        if index is not None:
+            return index
+        if self._free:
+            index = self._free.pop()
+        else:
+            index = len(self.objects)
+            if index >= self.limit:
+                raise Exception(
+                    f"Too many {self.kind} in the render queue, "
+                    f"the limit is {self.limit}"
+                )
+            self.objects.append(None)
+        self.ids[key] = index
+        self.objects[index] = value
+        self._owners[key] = [id(owner) for owner in owners]
+        for owner in owners:
+            owned = self._owned.get(id(owner))
+            if owned is None:
+                finalizer = weakref.finalize(owner, self.release, id(owner))
+                owned = self._owned[id(owner)] = (set(), finalizer)
+            owned[0].add(key)
+        return index
+
+    def release(self, owner_id: int):
+        # free the ids of the keys of an owner, it is deleted or collected
+        keys, finalizer = self._owned.pop(owner_id, ((), None))
+        if finalizer is not None:
+            finalizer.detach()
+        for key in keys:
+            for other in self._owners.pop(key, ()):
+                if other != owner_id and other in self._owned:
+                    self._owned[other][0].discard(key)
+            index = self.ids.pop(key)
+            self.objects[index] = None
+            self._free.append(index)
+
+
+class RenderQueue:
+    """
+    RenderQueue class:
+    Collects the draws of a frame, flush() sorts them by their key
+    and executes them with the fewest state changes.
+    A draw is a program, its textures (the material),
+    a vertex array with an index range,
+    an optional model matrix and other per draw uniforms
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        far: float = 100.0,
+        matrix_uniform: bytes = b"model_matrix",
+    ):
+        self.far = far
+        self.matrix_uniform = matrix_uniform
+        self.programs = _Registry(program_bits, "programs")
+        self.materials = _Registry(material_bits, "materials")
+        self.meshes = _Registry(mesh_bits, "meshes")
+        self.eye = np.zeros(3, dtype=np.float32)
+        self.forward = np.array([0.0, 0.0, -1.0], dtype=np.float32)
+        self.count = 0
+        self.capacity = 0
+        self.uniforms = []
+        # the programs, vertex arrays and textures of the queued items by id,
+        # kept alive so their ids are not freed (and reused) before the flush
+        self.resources = {}
+        # resources released while they had queued items, freed by clear()
+        self.released = []
+        # state changes of the last flush
+        self.last_stats = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        columns = {
+            "keys": (np.uint64, ()),
+            "program_ids": (np.int32, ()),
+            "material_ids": (np.int32, ()),
+            "mesh_ids": (np.int32, ()),
+            "firsts": (np.int64, ()),
+            "counts": (np.int64, ()),
+            "matrices": (np.float32, (16,)),
+            "has_matrix": (bool, ()),
+        }
+        for name, (dtype, shape) in columns.items():
+            new = np.zeros((capacity,) + shape, dtype=dtype)
+            if self.capacity:
+                new[: self.count] = getattr(self, name)[: self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def set_camera(self, camera):
+        """
+        set_camera(camera)
+        The camera the depths of the submitted positions are measured from,
+        and its far plane
+        """
+        self.eye[:] = camera.position
+        self.forward[:] = camera.front
+        self.far = camera.far
+
+    def depths(self, positions: np.ndarray) -> np.ndarray:
+        """
+        depths(positions)
+        Quantized view depths of (n, 3) positions, 0 at the camera and depth_max at far
+        """
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        distance = (positions - self.eye) @ self.forward
+        return (np.clip(distance / self.far, 0.0, 1.0) * depth_max).astype(np.uint64)
+
+    def submit(
+        self,
+        program: ShaderProgram,
+        vertex_array: VertexArray,
+        textures=(),
+        first: int = 0,
+        count: int = None,
+        model_matrix=None,
+        position=None,
+        blended: bool = False,
+        uniforms: dict = None,
+        mode: int = GL.GL_TRIANGLES,
+    ):
+        """
+        submit(program, vertex_array, textures, first, count, model_matrix, position,
+               blended, uniforms, mode)
+        Queue a draw of count indices (or vertices) from first, textures go to the units
+        in order, position is used for the depth
+        (the translation of the model matrix if missing)
+        """
+        if model_matrix is not None:
+            if isinstance(model_matrix, glm_matrix_types):
+                model_matrix = np.asarray(model_matrix).T
+            model_matrix = np.asarray(model_matrix, dtype=np.float32).reshape(1, 16)
+            if position is None:
+                position = model_matrix[:, 12:15]
+        self.submit_many(
+            program,
+            vertex_array,
+            model_matrix,
+            textures,
+            first,
+            count,
+            np.zeros((1, 3)) if position is None else position,
+            blended,
+            uniforms,
+            mode,
+        )
+
+    def submit_many(
+        self,
+        program: ShaderProgram,
+        vertex_array: VertexArray,
+        model_matrices: np.ndarray,
+        textures=(),
+        first: int = 0,
+        count: int = None,
+        positions: np.ndarray = None,
+        blended: bool = False,
+        uniforms: dict = None,
+        mode: int = GL.GL_TRIANGLES,
+    ):
+        """
+        submit_many(program, vertex_array, model_matrices, textures, first, count,
+                    positions, blended, uniforms, mode)
+        Queue a draw of the same mesh per (n, 16) model matrix
+        (column by column, like glm),
+        with the translations of the matrices as positions if they are not given
+        """
+        if model_matrices is not None:
+            model_matrices = np.asarray(model_matrices, dtype=np.float32).reshape(
+                -1, 16
+            )
+            if positions is None:
+                positions = model_matrices[:, 12:15]
+        n = len(positions) if model_matrices is None else len(model_matrices)
+        if self.count + n > self.capacity:
+            self._allocate(max(self.count + n, self.capacity * 2))
+        count = vertex_array.count - first if count is None else count
+        texture_ids = tuple(getattr(texture, "id", texture) for texture in textures)
+        program_id = self.programs.id(id(program), weakref.ref(program), (program,))
+        # a material goes away with any of its Texture objects, plain ids are kept
+        material_id = self.materials.id(
+            texture_ids,
+            texture_ids,
+            [texture for texture in textures if hasattr(texture, "__weakref__")],
+        )
+        mesh_id = self.meshes.id(
+            (id(vertex_array), mode), (weakref.ref(vertex_array), mode), (vertex_array,)
+        )
+        self.resources[id(program)] = program
+        self.resources[id(vertex_array)] = vertex_array
+        for texture in textures:
+            if hasattr(texture, "__weakref__"):
+                self.resources[id(texture)] = texture
+        items = slice(self.count, self.count + n)
+        self.program_ids[items] = program_id
+        self.material_ids[items] = material_id
+        self.mesh_ids[items] = mesh_id
+        self.firsts[items] = first
+        self.counts[items] = count
+        if model_matrices is None:
+            self.has_matrix[items] = False
+        else:
+            self.matrices[items] = model_matrices
+            self.has_matrix[items] = True
+        np.bitwise_or(
+            key_depths(self.depths(positions), blended),
+            np.uint64(sort_key(blended, program_id, material_id, mesh_id)),
+            out=self.keys[items],
+        )
+        if uniforms is not None or self.uniforms:
+            # per draw uniforms are rare, the list only exists once some item has them
+            self.uniforms.extend([None] * (self.count - len(self.uniforms)))
+            self.uniforms.extend([uniforms] * n)
+        self.count += n
+
+    def sorted(self) -> np.ndarray:
+        """
+        sorted()
+        The order the queued items are executed in
+        """
+        return np.argsort(self.keys[: self.count], kind="stable")
+
+    def flush(self) -> dict:
+        """
+        flush()
+        Execute the queued draws sorted by their keys and empty the queue.
+        Returns the number of draws and of program, material and mesh changes
+        """
+        order = self.sorted()
+        programs = self.programs.objects
+        materials = self.materials.objects
+        meshes = self.meshes.objects
+        program_ids = self.program_ids[order].tolist()
+        material_ids = self.material_ids[order].tolist()
+        mesh_ids = self.mesh_ids[order].tolist()
+        firsts = self.firsts[order].tolist()
+        counts = self.counts[order].tolist()
+        has_matrix = self.has_matrix[order].tolist()
+        matrices = self.matrices[order]
+        uniforms = self.uniforms
+        stats = {"draws": len(order), "programs": 0, "materials": 0, "meshes": 0}
+        program = material = mesh = None
+        set_matrix = None
+        for i, item in enumerate(order.tolist()):
+            if program_ids[i] != program:
+                program = program_ids[i]
+                shader = programs[program]()
+                shader.use()
+                set_matrix = shader.uniform_setters.get(self.matrix_uniform)
+                set_matrix = None if set_matrix is None else set_matrix.set
+                stats["programs"] += 1
+            if material_ids[i] != material:
+                material = material_ids[i]
+                for unit, texture in enumerate(materials[material]):
+                    gl_state.bind_texture(GL.GL_TEXTURE_2D, texture, unit)
+                stats["materials"] += 1
+            if mesh_ids[i] != mesh:
+                mesh = mesh_ids[i]
+                vertex_array, mode = meshes[mesh]
+                vertex_array = vertex_array()
+                gl_state.bind_vertex_array(vertex_array.vao)
+                index_size = None
+                if vertex_array.ebo is not None:
+                    index_size = numpy_types[vertex_array.index_type].itemsize
+                stats["meshes"] += 1
+            if has_matrix[i] and set_matrix is not None:
+                set_matrix(matrices[i])
+            if uniforms and uniforms[item]:
+                for name, value in uniforms[item].items():
+                    shader.set_uniform(name, value)
+            if index_size is None:
+                GL.glDrawArrays(mode, firsts[i], counts[i])
+            else:
+                GL.glDrawElements(
+                    mode,
+                    counts[i],
+                    vertex_array.index_type,
+                    ctypes.c_void_p(firsts[i] * index_size),
+                )
+        self.clear()
+        self.last_stats = stats
+        return stats
+
+    def release(self, resource):
+        """
+        release(resource)
+        Free the ids of a program, vertex array or texture that is deleted,
+        without waiting for it to be garbage collected.
+        If it has draws in the queue its ids are freed when the queue is cleared
+        """
+        if id(resource) in self.resources:
+            self.released.append(resource)
+            return
+        for registry in (self.programs, self.materials, self.meshes):
+            registry.release(id(resource))
+
+    def clear(self):
+        """
+        clear()
+        Drop the queued items and the references to their resources,
+        the ids of the programs, materials and meshes still alive are kept
+        """
+        self.count = 0
+        self.uniforms = []
+        self.resources.clear()
+        released, self.released = self.released, []
+        for resource in released:
+            self.release(resource)
@@ -0,0 +1,151 @@
+import ctypes
+
+import numpy as np
+from OpenGL import GL
+
+"""
+Retained geometry for the OpenGL 2.1 demos (BasicOpenGLApp):
+the vertex, face and color lists are turned once into a vertex buffer
+(or a display list where buffers are not available) and every frame
+is a single glDrawArrays instead of a glColor/glVertex call per vertex.
+set() takes new geometry, call it only when the geometry changes,
+it is uploaded by the next draw(), so it can be set before the context exists.
+"""
+
+# faces with 3 vertices are triangles and with 4 quads
+face_modes = {3: GL.GL_TRIANGLES, 4: GL.GL_QUADS}
+
+# position and color interleaved, 3 floats each
+vertex_dtype = np.dtype([("position", np.float32, 3), ("color", np.float32, 3)])
+
+
+def expand_faces(vertices, faces, colors=None, face_colors: bool = False) -> np.ndarray:
+    """
+    expand_faces(vertices, faces, colors, face_colors)
+    The vertices of every face one after the other, with their colors:
+    colors are indexed like the vertices, or one per face with face_colors
+    (the faces share vertices but not colors, so nothing is indexed).
+    Returns an array of vertex_dtype
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64)
+    expanded = np.zeros(faces.size, dtype=vertex_dtype)
+    expanded["position"] = vertices[faces.reshape(-1)]
+    if colors is None:
+        expanded["color"] = 1.0
+        return expanded
+    colors = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+    if face_colors:
+        expanded["color"] = np.repeat(colors[: len(faces)], faces.shape[1], axis=0)
+    else:
+        expanded["color"] = colors[faces.reshape(-1)]
+    return expanded
+
+
+class RetainedGeometry:
+    """
+    RetainedGeometry class:
+    Geometry kept in the GPU and drawn with the fixed function pipeline,
+    in a vertex buffer, or in a display list when use_buffers is False
+    or the context has no vertex buffers (decided on the first upload)
+    """
+
+    def __init__(
+        self,
+        vertices=None,
+        faces=None,
+        colors=None,
+        face_colors: bool = False,
+        use_buffers: bool = None,
+    ):
+        self.use_buffers = use_buffers
+        self.vbo = None
+        self.display_list = None
+        self.mode = GL.GL_TRIANGLES
+        self.count = 0
+        # number of uploads, a rebuild every frame means the geometry is not retained
+        self.builds = 0
+        self._pending = None
+        if faces is not None:
+            self.set(vertices, faces, colors, face_colors)
+
+    def set(self, vertices, faces, colors=None, face_colors: bool = False):
+        """
+        set(vertices, faces, colors, face_colors)
+        New geometry, faces are lists of 3 (triangles) or 4 (quads) vertex indices,
+        colors are indexed like the vertices or one per face with face_colors
+        """
+        faces = np.asarray(faces, dtype=np.int64)
+        if faces.ndim != 2 or faces.shape[1] not in face_modes:
+            raise Exception(f"Faces must have 3 or 4 vertices, got shape {faces.shape}")
+        self._pending = expand_faces(vertices, faces, colors, face_colors)
+        self.mode = face_modes[faces.shape[1]]
+        self.count = len(self._pending)
+
+    def _upload(self):
+        data = self._pending
+        self._pending = None
+        self.builds += 1
+        if self.use_buffers is None:
+            self.use_buffers = bool(GL.glGenBuffers)
+        if self.use_buffers:
+            if self.vbo is None:
+                self.vbo = GL.glGenBuffers(1)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+            GL.glBufferData(GL.GL_ARRAY_BUFFER, data.nbytes, data, GL.GL_STATIC_DRAW)
+            GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+        else:
+            if self.display_list is None:
+                self.display_list = GL.glGenLists(1)
+            # the arrays are copied into the list when it is compiled
+            GL.glNewList(self.display_list, GL.GL_COMPILE)
+            self._draw_arrays(data.ctypes.data)
+            GL.glEndList()
+
+    def _draw_arrays(self, base: int):
+        # base is the address of the interleaved vertices, 0 for the bound buffer
+        stride = vertex_dtype.itemsize
+        GL.glEnableClientState(GL.GL_VERTEX_ARRAY)
+        GL.glEnableClientState(GL.GL_COLOR_ARRAY)
+        GL.glVertexPointer(
+            3,
+            GL.GL_FLOAT,
+            stride,
+            ctypes.c_void_p(base + vertex_dtype.fields["position"][1]),
+        )
+        GL.glColorPointer(
+            3,
+            GL.GL_FLOAT,
+            stride,
+            ctypes.c_void_p(base + vertex_dtype.fields["color"][1]),
+        )
+        GL.glDrawArrays(self.mode, 0, self.count)
+        GL.glDisableClientState(GL.GL_COLOR_ARRAY)
+        GL.glDisableClientState(GL.GL_VERTEX_ARRAY)
+
+    def draw(self):
+        """
+        draw()
+        Draw the geometry with the current matrices
+        """
+        if self._pending is not None:
+            self._upload()
+        if not self.count:
+            return
+        if not self.use_buffers:
+            GL.glCallList(self.display_list)
+            return
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        # with a buffer bound the pointers are offsets into it
+        self._draw_arrays(0)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        if self.vbo is not None:
+            GL.glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+        if self.display_list is not None:
+            GL.glDeleteLists(self.display_list, 1)
+            self.display_list = None
+        self.count = 0
+        self._pending = None
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import glm
+import numpy as np
+
+"""
+Scene graph: nodes with a local translation, rotation and scale, a parent and children.
+The local and world matrices are cached, changing a node marks it dirty
+and marks its ancestors as having a dirty subtree, so update() only walks
+down the branches where something changed and a static subtree costs nothing.
+The world matrices of the nodes with a mesh live in a single numpy array,
+the flat list handed to the renderer.
+"""
+
+
+class SceneNode:
+    """
+    SceneNode class:
+    A node of the scene graph, optionally drawn with a mesh (a Model or a VertexArray),
+    a material (the textures) and a program.
+    The rotation is Euler angles in degrees, applied like Model.get_model_matrix.
+    Change the transform with the set_* methods (or translate/rotate)
+    so the node is marked dirty
+    """
+
+    def __init__(
+        self,
+        name: str = "",
+        position=(0.0, 0.0, 0.0),
+        rotation=(0.0, 0.0, 0.0),
+        scale=(1.0, 1.0, 1.0),
+        mesh=None,
+        material=(),
+        program=None,
+        blended: bool = False,
+    ):
+        self.name = name
+        self._position = glm.vec3(*position)
+        self._rotation = glm.vec3(*rotation)
+        self._scale = glm.vec3(*scale)
+        self.parent = None
+        self.children = []
+        # a Model is drawn with its vertex array,
+        # its bounding sphere is used for culling
+        self.mesh = getattr(mesh, "vertex_array", mesh)
+        self.bounds = None
+        if getattr(mesh, "radius", 0.0):
+            self.bounds = (tuple(mesh.center), float(mesh.radius))
+        self.material = tuple(material)
+        self.program = program
+        self.blended = blended
+        self.local_matrix = glm.mat4(1.0)
+        self.world_matrix = glm.mat4(1.0)
+        self.graph = None
+        # index of the world matrix in the graph arrays, only for nodes with a mesh
+        self.slot = None
+        # the local matrix changed
+        self._dirty = True
+        # this node or one below it changed
+        self._subtree_dirty = True
+
+    @property
+    def position(self) -> glm.vec3:
+        return glm.vec3(self._position)
+
+    @property
+    def rotation(self) -> glm.vec3:
+        return glm.vec3(self._rotation)
+
+    @property
+    def scale(self) -> glm.vec3:
+        return glm.vec3(self._scale)
+
+    def set_position(self, position):
+        self._position = glm.vec3(*position)
+        self.mark_dirty()
+
+    def set_rotation(self, rotation):
+        self._rotation = glm.vec3(*rotation)
+        self.mark_dirty()
+
+    def set_scale(self, scale):
+        self._scale = glm.vec3(*scale)
+        self.mark_dirty()
+
+    def translate(self, offset):
+        self.set_position(self._position + glm.vec3(*offset))
+
+    def rotate(self, angles):
+        self.set_rotation(self._rotation + glm.vec3(*angles))
+
+    def mark_dirty(self):
+        """
+        mark_dirty()
+        Recompute the local matrix on the next update, the marks go up
+        until an ancestor that is already marked
+        """
+        self._dirty = True
+        node = self
+        while node is not None and not node._subtree_dirty:
+            node._subtree_dirty = True
+            node = node.parent
+
+    def _mark_ancestors(self):
+        # a subtree attached out of the graph may be marked
+        # while its new parents are not
+        self._subtree_dirty = True
+        node = self.parent
+        while node is not None and not node._subtree_dirty:
+            node._subtree_dirty = True
+            node = node.parent
+
+    def get_local_matrix(self) -> glm.mat4:
+        model = glm.translate(glm.mat4(1.0), self._position)
+        model = glm.rotate(
+            model, glm.radians(self._rotation.x), glm.vec3(1.0, 0.0, 0.0)
+        )
+        model = glm.rotate(
+            model, glm.radians(self._rotation.y), glm.vec3(0.0, 1.0, 0.0)
+        )
+        model = glm.rotate(
+            model, glm.radians(self._rotation.z), glm.vec3(0.0, 0.0, 1.0)
+        )
+        return glm.scale(model, self._scale)
+
+    def add_child(self, child: SceneNode) -> SceneNode:
+        """
+        add_child(child)
+        Attach a node (and its subtree) under this one, returns the child
+        """
+        if child.parent is not None:
+            child.parent.remove_child(child)
+        child.parent = self
+        self.children.append(child)
+        if self.graph is not None:
+            self.graph._attach(child)
+        # the whole subtree takes the new parent transform
+        child._dirty = True
+        child._mark_ancestors()
+        return child
+
+    def remove_child(self, child: SceneNode):
+        """
+        remove_child(child)
+        Detach a child node and its subtree
+        """
+        self.children.remove(child)
+        child.parent = None
+        if self.graph is not None:
+            self.graph._detach(child)
+
+    def walk(self):
+        """
+        walk()
+        This node and all the nodes below it, parents first
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+
+class SceneGraph:
+    """
+    SceneGraph class:
+    The root node and the flat arrays of the drawable nodes:
+    their world matrices (column by column, like glm) and their meshes and materials
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.root = SceneNode("root")
+        self.root.graph = self
+        self.matrices = np.zeros((capacity, 16), dtype=np.float32)
+        # drawable node of every slot
+        self.nodes = []
+        # world matrices recomputed by the last update
+        self.updated = 0
+        # slots of the nodes drawn together, rebuilt when nodes come and go
+        self._batches = None
+
+    @property
+    def count(self) -> int:
+        return len(self.nodes)
+
+    def add(self, node: SceneNode, parent: SceneNode = None) -> SceneNode:
+        """
+        add(node, parent)
+        Add a node under parent (the root if None), returns the node
+        """
+        return (self.root if parent is None else parent).add_child(node)
+
+    def remove(self, node: SceneNode):
+        """
+        remove(node)
+        Remove a node and its subtree from the graph
+        """
+        if node.parent is not None:
+            node.parent.remove_child(node)
+
+    def _attach(self, subtree: SceneNode):
+        for node in subtree.walk():
+            node.graph = self
+            if node.mesh is None:
+                continue
+            if len(self.nodes) == len(self.matrices):
+                matrices = np.zeros((len(self.matrices) * 2, 16), dtype=np.float32)
+                matrices[: len(self.nodes)] = self.matrices[: len(self.nodes)]
+                self.matrices = matrices
+            node.slot = len(self.nodes)
+            self.nodes.append(node)
+        self._batches = None
+
+    def _detach(self, subtree: SceneNode):
+        for node in subtree.walk():
+            node.graph = None
+            if node.slot is None:
+                continue
+            # the last drawable node moves into the free slot
+            last = self.nodes.pop()
+            if last is not node:
+                self.nodes[node.slot] = last
+                self.matrices[node.slot] = self.matrices[last.slot]
+                last.slot = node.slot
+            node.slot = None
+        self._batches = None
+
+    def update(self) -> int:
+        """
+        update()
+        Recompute the world matrices of the changed nodes and of the nodes below them,
+        the branches without changes are not visited.
+        Returns the number of world matrices recomputed
+        """
+        updated = 0
+        root = self.root
+        if not root._subtree_dirty:
+            self.updated = 0
+            return 0
+        stack = [(root, glm.mat4(1.0), False)]
+        while stack:
+            node, parent_world, parent_changed = stack.pop()
+            changed = parent_changed or node._dirty
+            if node._dirty:
+                node.local_matrix = node.get_local_matrix()
+                node._dirty = False
+            if changed:
+                node.world_matrix = parent_world * node.local_matrix
+                if node.slot is not None:
+                    # glm matrices expose their columns as the second axis
+                    self.matrices[node.slot] = np.asarray(node.world_matrix).T.reshape(
+                        -1
+                    )
+                updated += 1
+            if changed or node._subtree_dirty:
+                for child in node.children:
+                    if changed or child._subtree_dirty:
+                        stack.append((child, node.world_matrix, changed))
+            node._subtree_dirty = False
+        self.updated = updated
+        return updated
+
+    def draw_list(self) -> tuple:
+        """
+        draw_list()
+        The flat list of the drawable nodes: their (n, 16) world matrices,
+        meshes, materials and programs
+        """
+        count = len(self.nodes)
+        return (
+            self.matrices[:count],
+            [node.mesh for node in self.nodes],
+            [node.material for node in self.nodes],
+            [node.program for node in self.nodes],
+        )
+
+    def batches(self) -> list:
+        """
+        batches()
+        The drawable nodes grouped by program, mesh, material and blending,
+        as (program, mesh, material, blended, bounds, slots)
+        """
+        if self._batches is None:
+            groups = {}
+            for node in self.nodes:
+                key = (
+                    node.program,
+                    node.mesh,
+                    node.material,
+                    node.blended,
+                    node.bounds,
+                )
+                groups.setdefault(key, []).append(node.slot)
+            self._batches = [
+                (*key, np.array(slots, dtype=np.int64)) for key, slots in groups.items()
+            ]
+        return self._batches
+
+    def submit(self, queue, culler=None):
+        """
+        submit(queue, culler)
+        Submit the drawable nodes to a RenderQueue, one batch per group,
+        with a FrustumCuller the nodes outside the frustum are left out
+        (only the nodes made from a Model have a bounding sphere)
+        """
+        for program, mesh, material, blended, bounds, slots in self.batches():
+            matrices = self.matrices[slots]
+            if culler is not None and bounds is not None:
+                matrices = culler.cull_instances(matrices, *bounds)
+            if len(matrices):
+                queue.submit_many(program, mesh, matrices, material, blended=blended)
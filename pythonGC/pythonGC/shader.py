@@ -4,10 +4,11 @@ import rich
 import os
 import sys
 from abc import ABC, abstractmethod
+import numpy as np
 from OpenGL import GL
 import glm
+from gl_state import gl_state
 
-from texture import Texture
 
 shaderExtensions = {
     "vert": GL.GL_VERTEX_SHADER,
@@ -20,6 +21,54 @@ shaderExtensions = {
 
 pipelines_folder_name = "pipelines"
 
+# uniform blocks attached to a fixed binding point when a program links,
+# the buffers bound to these points are shared by every program
+uniform_block_bindings = {
+    b"FrameUniforms": 0,
+}
+
+# uniform type -> (numpy type, components, glUniform*v function, matrix)
+uniform_types = {
+    GL.GL_FLOAT: (np.float32, 1, GL.glUniform1fv, False),
+    GL.GL_FLOAT_VEC2: (np.float32, 2, GL.glUniform2fv, False),
+    GL.GL_FLOAT_VEC3: (np.float32, 3, GL.glUniform3fv, False),
+    GL.GL_FLOAT_VEC4: (np.float32, 4, GL.glUniform4fv, False),
+    GL.GL_INT: (np.int32, 1, GL.glUniform1iv, False),
+    GL.GL_INT_VEC2: (np.int32, 2, GL.glUniform2iv, False),
+    GL.GL_INT_VEC3: (np.int32, 3, GL.glUniform3iv, False),
+    GL.GL_INT_VEC4: (np.int32, 4, GL.glUniform4iv, False),
+    GL.GL_UNSIGNED_INT: (np.uint32, 1, GL.glUniform1uiv, False),
+    GL.GL_UNSIGNED_INT_VEC2: (np.uint32, 2, GL.glUniform2uiv, False),
+    GL.GL_UNSIGNED_INT_VEC3: (np.uint32, 3, GL.glUniform3uiv, False),
+    GL.GL_UNSIGNED_INT_VEC4: (np.uint32, 4, GL.glUniform4uiv, False),
+    GL.GL_BOOL: (np.int32, 1, GL.glUniform1iv, False),
+    GL.GL_BOOL_VEC2: (np.int32, 2, GL.glUniform2iv, False),
+    GL.GL_BOOL_VEC3: (np.int32, 3, GL.glUniform3iv, False),
+    GL.GL_BOOL_VEC4: (np.int32, 4, GL.glUniform4iv, False),
+    GL.GL_FLOAT_MAT2: (np.float32, 4, GL.glUniformMatrix2fv, True),
+    GL.GL_FLOAT_MAT3: (np.float32, 9, GL.glUniformMatrix3fv, True),
+    GL.GL_FLOAT_MAT4: (np.float32, 16, GL.glUniformMatrix4fv, True),
+    GL.GL_FLOAT_MAT2x3: (np.float32, 6, GL.glUniformMatrix2x3fv, True),
+    GL.GL_FLOAT_MAT2x4: (np.float32, 8, GL.glUniformMatrix2x4fv, True),
+    GL.GL_FLOAT_MAT3x2: (np.float32, 6, GL.glUniformMatrix3x2fv, True),
+    GL.GL_FLOAT_MAT3x4: (np.float32, 12, GL.glUniformMatrix3x4fv, True),
+    GL.GL_FLOAT_MAT4x2: (np.float32, 8, GL.glUniformMatrix4x2fv, True),
+    GL.GL_FLOAT_MAT4x3: (np.float32, 12, GL.glUniformMatrix4x3fv, True),
+}
+
+# single values are set without building an array
+scalar_functions = {
+    np.float32: GL.glUniform1f,
+    np.int32: GL.glUniform1i,
+    np.uint32: GL.glUniform1ui,
+}
+
+# glm matrices expose their columns as the second axis, their memory is the transpose
+glm_matrix_types = (
+    glm.mat2, glm.mat3, glm.mat4, glm.mat2x3, glm.mat2x4,
+    glm.mat3x2, glm.mat3x4, glm.mat4x2, glm.mat4x3,
+)
+
 def list_pipeline_shaders():
     """
     List all available pipeline in the pipeline folder
@@ -50,6 +99,68 @@ def get_pipeline_path(pipeline_name:str)->str:
     pipelinePath = os.path.join(root_path, "pipelines")
     return pipelinePath
 
+class Uniform:
+    """
+    Uniform class:
+    An active uniform of a linked program with its location, type and array size,
+    found at link time. set() converts the value once and keeps a copy of the
+    last value sent, so setting the same value again does not call OpenGL
+    """
+
+    def __init__(self, name: bytes, location: int, type: int, size: int):
+        self.name = name
+        self.location = location
+        self.type = type
+        self.size = size
+        # the other types are samplers and images, set with the texture unit
+        self.dtype, self.components, self.function, self.matrix = uniform_types.get(
+            type, uniform_types[GL.GL_INT]
+        )
+        self.scalar = scalar_functions[self.dtype] if self.components == 1 else None
+        self.value = None
+
+    def set(self, value):
+        """
+        set(value)
+        Set the uniform of the program in use, value is a number, a glm type,
+        a list or a numpy array with one or more elements of an array uniform,
+        a numpy array of the right type is not copied
+        """
+        if self.scalar is not None and isinstance(value, (int, float)):
+            if value == self.value:
+                return
+            self.value = value
+            self.scalar(self.location, value)
+            return
+        if isinstance(value, glm_matrix_types):
+            data = np.asarray(value).T
+        else:
+            data = np.asarray(value, dtype=self.dtype)
+        if data.dtype != self.dtype or not data.flags.c_contiguous:
+            data = np.ascontiguousarray(data, dtype=self.dtype)
+        count = data.size // self.components
+        if count == 0 or count > self.size or count * self.components != data.size:
+            raise Exception(
+                f"Uniform {self.name} takes up to {self.size} values "
+                f"of {self.components} components, got {data.size}"
+            )
+        shadow = data.tobytes()
+        if shadow == self.value:
+            return
+        self.value = shadow
+        if self.matrix:
+            self.function(self.location, count, GL.GL_FALSE, data)
+        else:
+            self.function(self.location, count, data)
+
+    def reset(self):
+        """
+        reset()
+        Forget the last value, the next set() always calls OpenGL
+        """
+        self.value = None
+
+
 class ShaderProgram:
     """
     Shader Program class:
@@ -69,6 +180,8 @@ class ShaderProgram:
         self.program = None
         self.shaders = []
         self.uniforms = {}
+        self.uniform_setters = {}
+        self.uniform_blocks = {}
         self.attributes = {}
         self.linked = False
 
@@ -129,11 +242,27 @@ class ShaderProgram:
         numUniforms = GL.glGetProgramiv(self.program, GL.GL_ACTIVE_UNIFORMS)
         # get the number of active attributes
         numAttributes = GL.glGetProgramiv(self.program, GL.GL_ACTIVE_ATTRIBUTES)
-        # get the uniform names and locations
+        # get the uniform names, locations and types
+        self.uniforms = {}
+        self.uniform_setters = {}
         for i in range(numUniforms):
             name, size, type = GL.glGetActiveUniform(self.program, i)
             location = GL.glGetUniformLocation(self.program, name)
+            if location < 0:
+                # uniforms of a block have no location
+                continue
+            # an array is listed by its first element, lights[0], it is set as lights
+            if name.endswith(b"[0]"):
+                name = name[:-3]
             self.uniforms[name] = location
+            self.uniform_setters[name] = Uniform(name, location, type, size)
+        # attach the shared uniform blocks the program declares to their binding points
+        self.uniform_blocks = {}
+        for name, binding in uniform_block_bindings.items():
+            index = GL.glGetUniformBlockIndex(self.program, name)
+            if index != GL.GL_INVALID_INDEX:
+                GL.glUniformBlockBinding(self.program, index, binding)
+                self.uniform_blocks[name] = binding
         # get the attribute names and locations
         for i in range(numAttributes):
             name, size, type = GL.glGetActiveAttrib(self.program, i)
@@ -149,35 +278,41 @@ class ShaderProgram:
         if not self.linked:
             self.compile_shader()
             self.link()
-        GL.glUseProgram(self.program)
+        gl_state.use_program(self.program)
+
+    def uniform(self, name) -> Uniform:
+        """
+        uniform(name)
+        The uniform of the linked program, name as bytes or str
+        """
+        uniform = self.uniform_setters.get(name)
+        if uniform is None:
+            if not self.linked:
+                self.compile_shader()
+                self.link()
+            if isinstance(name, str):
+                name = name.encode("utf-8")
+            uniform = self.uniform_setters.get(name)
+            if uniform is None:
+                raise Exception(f"Uniform {name} not found")
+        return uniform
+
+    def setter(self, name):
+        """
+        setter(name)
+        The set function of a uniform, for loops that set it many times
+        """
+        return self.uniform(name).set
 
     def set_uniform(self, name: str, value):
         """
         set_uniform(self, name: str, value):
-        Set a uniform value
+        Set a uniform value, skipped if it did not change
         """
-        if not self.linked:
-            self.compile_shader()
-            self.link()
-        if not name in self.uniforms:
-            raise Exception(f"Uniform {name} not found")
-        if isinstance(value, int):
-            GL.glUniform1i(self.uniforms[name], value)
-        elif isinstance(value, float):
-            GL.glUniform1f(self.uniforms[name], value)
-        elif isinstance(value, list):
-            if len(value) == 2:
-                GL.glUniform2f(self.uniforms[name], *value)
-            elif len(value) == 3:
-                GL.glUniform3f(self.uniforms[name], *value)
-            elif len(value) == 4:
-                GL.glUniform4f(self.uniforms[name], *value)
-        elif isinstance(value, glm.mat4):
-            GL.glUniformMatrix4fv(self.uniforms[name], 1, GL.GL_FALSE, glm.value_ptr(value))
-        elif isinstance(value, Texture):
-            GL.glUniform1i(self.uniforms[name], value.get_unit())
-        else:
-            raise Exception(f"Uniform {name} type not supported")
+        uniform = self.uniform_setters.get(name)
+        if uniform is None:
+            uniform = self.uniform(name)
+        uniform.set(value)
 
     def __del__(self):
         """
@@ -185,7 +320,7 @@ class ShaderProgram:
         Delete the shader program and shaders
         """
         if self.program:
-            GL.glDeleteProgram(self.program)
+            gl_state.delete_program(self.program)
         for shader in self.shaders:
             GL.glDeleteShader(shader)
             
@@ -202,10 +337,9 @@ class ShaderProgram:
     def __exit__(self, exc_type, exc_value, traceback):
         """
         __exit__(self, exc_type, exc_value, traceback):
-        Unuse the shader program
-        Used for the with statement
+        Used for the with statement, the program stays bound:
+        unbinding costs a call and the next use() of it is free
         """
-        GL.glUseProgram(0)
 
 if __name__ == "__main__":
     print("Available pipelines: ", list_pipeline_shaders())
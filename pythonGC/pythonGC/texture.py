@@ -1,8 +1,13 @@
 import glm
 from OpenGL import GL
 from PIL import Image
+from gl_state import gl_state
 
-def loadTexture( file_path:str):
+def decodeTexture(file_path: str) -> tuple:
+    """
+    Decode an image file into (mode, width, height, data) ready for glTexImage2D,
+    it does not use OpenGL so it can run outside of the GL thread
+    """
     im:Image = Image.open(file_path)
     w, h = im.size
     if im.mode == "RGBA":
@@ -11,8 +16,16 @@ def loadTexture( file_path:str):
     else:
         modo = GL.GL_RGB
         data = im.tobytes("raw", "RGB", 0, -1)
+    return modo, w, h, data
+
+
+def uploadTexture(image: tuple):
+    """
+    Upload an image returned by decodeTexture to a new texture
+    """
+    modo, w, h, data = image
     textureId = GL.glGenTextures(1)
-    GL.glBindTexture(GL.GL_TEXTURE_2D, textureId)
+    gl_state.bind_texture(GL.GL_TEXTURE_2D, textureId)
     GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, modo, w, h, 0, modo, GL.GL_UNSIGNED_BYTE, data)
     GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_REPEAT)
     GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_REPEAT)
@@ -21,6 +34,10 @@ def loadTexture( file_path:str):
     return textureId
 
 
+def loadTexture( file_path:str):
+    return uploadTexture(decodeTexture(file_path))
+
+
 class Texture:
     def __init__(self, file_path:str):
         self.texturePath = file_path
@@ -30,17 +47,22 @@ class Texture:
         self.id = loadTexture(self.texturePath)
         print("Texture loaded: ", self.id)
 
+    def upload(self, image: tuple):
+        """
+        Upload an image already decoded with decodeTexture
+        """
+        self.id = uploadTexture(image)
+        print("Texture loaded: ", self.id)
+
     def bind(self, slot:int):
         if self.id is None:
             raise Exception("Texture not loaded")
-        GL.glActiveTexture(GL.GL_TEXTURE0 + slot)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.id)
+        gl_state.bind_texture(GL.GL_TEXTURE_2D, self.id, slot)
 
     def unbind(self, slot:int):
         if self.id is None:
             raise Exception("Texture not loaded")
-        GL.glActiveTexture(GL.GL_TEXTURE0 + slot)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+        gl_state.bind_texture(GL.GL_TEXTURE_2D, 0, slot)
     
     def get_unit(self, slot:int):
         return GL.GL_TEXTURE0 + slot
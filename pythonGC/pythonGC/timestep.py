@@ -0,0 +1,114 @@
+import time
+
+"""
+Fixed timestep scheduling for the main loops of OpenGLApp and BasicOpenGLApp:
+the simulation (update) runs at a fixed tick rate whatever the frame rate,
+the real time between frames is accumulated and spent in ticks of 1 / tick_rate seconds.
+What is left of the accumulator, as a fraction of a tick, is the alpha given to render()
+to interpolate between the last two ticks.
+An optional frame rate cap sleeps until the next frame is due.
+"""
+
+# sleep() may wake up late, the last part of a wait spins on the clock
+sleep_margin = 0.001
+
+
+class FixedTimestep:
+    """
+    FixedTimestep class:
+    advance() once per frame returns how many ticks to run,
+    alpha is then the position between the last tick and the next one (0 to 1).
+    After a long frame at most max_steps ticks run and the rest of the time is dropped,
+    so a slow machine slows the simulation instead of falling further behind.
+    With lockstep every frame runs exactly one tick, whatever the time,
+    for reproducible runs (benchmarks, batch rendering)
+    """
+
+    def __init__(
+        self,
+        tick_rate: float = 60.0,
+        max_steps: int = 5,
+        frame_rate: float = None,
+        lockstep: bool = False,
+    ):
+        self.tick_rate = tick_rate
+        self.dt = 1.0 / tick_rate
+        self.max_steps = max_steps
+        self.frame_rate = frame_rate
+        self.lockstep = lockstep
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        # ticks run since reset()
+        self.ticks = 0
+        # seconds of simulation dropped by the catch-up limit
+        self.dropped = 0.0
+        self.last_time = None
+        self.frame_start = None
+
+    def reset(self):
+        """
+        reset()
+        Start counting from now, the first advance() runs one tick
+        so the state is updated before the first render
+        """
+        self.last_time = time.perf_counter()
+        self.frame_start = self.last_time
+        self.accumulator = self.dt
+        self.alpha = 0.0
+        self.ticks = 0
+        self.dropped = 0.0
+
+    def advance(self) -> int:
+        """
+        advance()
+        Add the time since the last call and return the number of ticks to run now
+        """
+        now = time.perf_counter()
+        if self.last_time is None:
+            self.reset()
+            now = self.last_time
+        self.accumulator += now - self.last_time
+        self.last_time = now
+        self.frame_start = now
+        if self.lockstep:
+            self.accumulator = 0.0
+            self.alpha = 0.0
+            self.ticks += 1
+            return 1
+        steps = int(self.accumulator / self.dt)
+        if steps > self.max_steps:
+            self.dropped += (steps - self.max_steps) * self.dt
+            self.accumulator -= (steps - self.max_steps) * self.dt
+            steps = self.max_steps
+        self.accumulator -= steps * self.dt
+        self.ticks += steps
+        self.alpha = min(max(self.accumulator / self.dt, 0.0), 1.0)
+        return steps
+
+    def wait(self) -> float:
+        """
+        wait()
+        With a frame rate cap, sleep until the next frame is due.
+        Returns the seconds waited
+        """
+        if not self.frame_rate or self.frame_start is None:
+            return 0.0
+        due = self.frame_start + 1.0 / self.frame_rate
+        start = time.perf_counter()
+        remaining = due - start
+        if remaining > sleep_margin:
+            time.sleep(remaining - sleep_margin)
+        while time.perf_counter() < due:
+            pass
+        return time.perf_counter() - start
+
+
+def lerp(previous, current, alpha: float):
+    """
+    lerp(previous, current, alpha)
+    Interpolate between the state of the last two ticks, numbers, glm vectors
+    or lists of numbers
+    """
+    if isinstance(previous, (list, tuple)):
+        return [p + (c - p) * alpha for p, c in zip(previous, current)]
+    return previous + (current - previous) * alpha
@@ -0,0 +1,254 @@
+import numpy as np
+
+"""
+Transforms of many entities as structure of arrays:
+positions, rotations and scales live in contiguous numpy arrays
+and all the model matrices are composed at once, straight into
+a float32 buffer laid out like glm (column by column) that can be
+uploaded as an instance buffer or sent to glUniformMatrix4fv.
+"""
+
+# the matrix of an entity is translate * rotate * scale, with Euler angles
+# the rotation is Rx * Ry * Rz in degrees, like Model.get_model_matrix
+rotation_modes = ("euler", "quaternion")
+
+
+def _planar(values: np.ndarray) -> np.ndarray:
+    # (n, k) values as k contiguous rows, free for the transposed views of the store
+    return np.ascontiguousarray(np.asarray(values, dtype=np.float32).T)
+
+
+def _store_columns(
+    columns: np.ndarray, positions: np.ndarray, out: np.ndarray
+) -> np.ndarray:
+    # the rows of columns are the 16 matrix elements, the translation goes to 12 to 14
+    columns[[3, 7, 11]] = 0.0
+    columns[12:15] = _planar(positions)
+    columns[15] = 1.0
+    if out is None:
+        out = np.empty((columns.shape[1], 16), dtype=np.float32)
+    # a single transposing copy to the layout of the GPU
+    np.copyto(out, columns.T)
+    return out
+
+
+def euler_matrices(
+    positions: np.ndarray,
+    rotations: np.ndarray,
+    scales: np.ndarray,
+    out: np.ndarray = None,
+) -> np.ndarray:
+    """
+    euler_matrices(positions, rotations, scales, out)
+    Compose translate * Rx * Ry * Rz * scale for (n, 3) arrays,
+    rotations are Euler angles in degrees.
+    Returns (n, 16) float32 matrices stored column by column
+    """
+    radians = np.radians(_planar(rotations))
+    cx, cy, cz = np.cos(radians)
+    sx, sy, sz = np.sin(radians)
+    scale_x, scale_y, scale_z = _planar(scales)
+    sxsy = sx * sy
+    cxsy = cx * sy
+    # every element is computed on contiguous rows,
+    # element (row r, column c) is c * 4 + r
+    # of the Rx * Ry * Rz product expanded, the scale multiplies the columns
+    columns = np.empty((16, len(cx)), dtype=np.float32)
+    np.multiply(cy * cz, scale_x, out=columns[0])
+    np.multiply(sxsy * cz + cx * sz, scale_x, out=columns[1])
+    np.multiply(sx * sz - cxsy * cz, scale_x, out=columns[2])
+    np.multiply(-cy * sz, scale_y, out=columns[4])
+    np.multiply(cx * cz - sxsy * sz, scale_y, out=columns[5])
+    np.multiply(cxsy * sz + sx * cz, scale_y, out=columns[6])
+    np.multiply(sy, scale_z, out=columns[8])
+    np.multiply(-sx * cy, scale_z, out=columns[9])
+    np.multiply(cx * cy, scale_z, out=columns[10])
+    return _store_columns(columns, positions, out)
+
+
+def quaternion_matrices(
+    positions: np.ndarray,
+    rotations: np.ndarray,
+    scales: np.ndarray,
+    out: np.ndarray = None,
+) -> np.ndarray:
+    """
+    quaternion_matrices(positions, rotations, scales, out)
+    Compose translate * rotate * scale for (n, 3) positions and scales
+    and (n, 4) unit quaternions stored (w, x, y, z) like glm.quat.
+    Returns (n, 16) float32 matrices stored column by column
+    """
+    w, x, y, z = _planar(rotations)
+    scale_x, scale_y, scale_z = _planar(scales)
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    columns = np.empty((16, len(w)), dtype=np.float32)
+    np.multiply(1 - 2 * (yy + zz), scale_x, out=columns[0])
+    np.multiply(2 * (xy + wz), scale_x, out=columns[1])
+    np.multiply(2 * (xz - wy), scale_x, out=columns[2])
+    np.multiply(2 * (xy - wz), scale_y, out=columns[4])
+    np.multiply(1 - 2 * (xx + zz), scale_y, out=columns[5])
+    np.multiply(2 * (yz + wx), scale_y, out=columns[6])
+    np.multiply(2 * (xz + wy), scale_z, out=columns[8])
+    np.multiply(2 * (yz - wx), scale_z, out=columns[9])
+    np.multiply(1 - 2 * (xx + yy), scale_z, out=columns[10])
+    return _store_columns(columns, positions, out)
+
+
+class TransformStore:
+    """
+    TransformStore class:
+    Position, rotation and scale of many entities in contiguous arrays,
+    an entity is an index into them. update() composes every model matrix at once
+    """
+
+    def __init__(self, capacity: int = 1024, rotation: str = "euler"):
+        if rotation not in rotation_modes:
+            raise Exception(
+                f"Rotation mode not supported: {rotation}, use {rotation_modes}"
+            )
+        self.rotation_mode = rotation
+        self.count = 0
+        # the components are stored as rows (structure of arrays),
+        # the positions, rotations and scales properties are (count, k) views of them
+        self._positions = np.zeros((3, capacity), dtype=np.float32)
+        self._rotations = np.zeros(
+            (3 if rotation == "euler" else 4, capacity), dtype=np.float32
+        )
+        if rotation == "quaternion":
+            self._rotations[0] = 1.0
+        self._scales = np.ones((3, capacity), dtype=np.float32)
+        self._matrices = np.zeros((capacity, 16), dtype=np.float32)
+
+    @property
+    def capacity(self) -> int:
+        return self._positions.shape[1]
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._positions[:, : self.count].T
+
+    @property
+    def rotations(self) -> np.ndarray:
+        return self._rotations[:, : self.count].T
+
+    @property
+    def scales(self) -> np.ndarray:
+        return self._scales[:, : self.count].T
+
+    @property
+    def matrices(self) -> np.ndarray:
+        """
+        The model matrices computed by the last update(), (count, 16) float32
+        """
+        return self._matrices[: self.count]
+
+    def reserve(self, capacity: int):
+        """
+        reserve(capacity)
+        Grow the arrays to hold at least capacity entities
+        """
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in ("_positions", "_rotations", "_scales"):
+            old = getattr(self, name)
+            new = np.zeros((len(old), capacity), dtype=old.dtype)
+            new[:, : self.count] = old[:, : self.count]
+            setattr(self, name, new)
+        self._scales[:, self.count :] = 1.0
+        if self.rotation_mode == "quaternion":
+            self._rotations[0, self.count :] = 1.0
+        matrices = np.zeros((capacity, 16), dtype=np.float32)
+        matrices[: self.count] = self._matrices[: self.count]
+        self._matrices = matrices
+
+    def add(
+        self, position=(0.0, 0.0, 0.0), rotation=None, scale=(1.0, 1.0, 1.0)
+    ) -> int:
+        """
+        add(position, rotation, scale)
+        Add an entity, returns its index
+        """
+        return self.add_many(
+            np.reshape(position, (1, 3)),
+            None if rotation is None else np.reshape(rotation, (1, -1)),
+            np.reshape(scale, (1, 3)),
+        ).start
+
+    def add_many(
+        self,
+        positions: np.ndarray,
+        rotations: np.ndarray = None,
+        scales: np.ndarray = None,
+    ) -> slice:
+        """
+        add_many(positions, rotations, scales)
+        Add an entity per position, returns the slice of their indices
+        """
+        count = len(positions)
+        start = self.count
+        self.reserve(start + count)
+        self.count += count
+        self.positions[start:] = positions
+        # the slots may hold an entity removed before, missing values are the identity
+        if rotations is not None:
+            self.rotations[start:] = rotations
+        elif self.rotation_mode == "quaternion":
+            self.rotations[start:] = (1.0, 0.0, 0.0, 0.0)
+        else:
+            self.rotations[start:] = 0.0
+        self.scales[start:] = 1.0 if scales is None else scales
+        return slice(start, self.count)
+
+    def remove(self, index: int) -> int:
+        """
+        remove(index)
+        Remove an entity moving the last one into its place,
+        returns the old index of the moved entity (or None if nothing moved)
+        """
+        last = self.count - 1
+        if index < 0 or index > last:
+            raise Exception(f"Entity {index} not found")
+        self.count = last
+        if index == last:
+            return None
+        for array in (self._positions, self._rotations, self._scales):
+            array[:, index] = array[:, last]
+        self._matrices[index] = self._matrices[last]
+        return last
+
+    def update(self) -> np.ndarray:
+        """
+        update()
+        Compose the model matrices of every entity into the matrices buffer
+        and return it
+        """
+        compose = (
+            euler_matrices if self.rotation_mode == "euler" else quaternion_matrices
+        )
+        return compose(self.positions, self.rotations, self.scales, self.matrices)
+
+    def matrix(self, index: int) -> np.ndarray:
+        """
+        matrix(index)
+        The model matrix of an entity as a 4x4 array (rows are the glm columns),
+        as computed by the last update()
+        """
+        return self._matrices[index].reshape(4, 4)
+
+
+if __name__ == "__main__":
+    import time
+
+    # time the composition of the model matrices
+    for count in (1000, 100000):
+        store = TransformStore(count)
+        store.add_many(np.random.rand(count, 3) * 100, np.random.rand(count, 3) * 360)
+        store.update()
+        start = time.perf_counter()
+        for _ in range(20):
+            store.update()
+        elapsed = (time.perf_counter() - start) / 20
+        print(f"{count} entities: {elapsed * 1000:.2f} ms per update")
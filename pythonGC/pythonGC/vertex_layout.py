@@ -0,0 +1,313 @@
+from __future__ import annotations
+import ctypes
+
+import numpy as np
+from OpenGL import GL
+
+from gl_state import gl_state
+from mesh_format import MeshAttribute, gl_types, interleave, numpy_types
+from shader import ShaderProgram
+
+# prefix of the vertex inputs in the pipelines, position is read by attr_position
+attribute_prefix = "attr_"
+
+
+class VertexLayout:
+    """
+    VertexLayout class:
+    Describes an interleaved vertex, a list of attributes
+    with their name, component count, OpenGL type and normalized flag.
+    The offsets and the stride are computed from the attributes in the given order
+    """
+
+    def __init__(self, attributes: list, stride: int = None):
+        table = []
+        offset = 0
+        for attribute in attributes:
+            if not isinstance(attribute, MeshAttribute):
+                name, components, *rest = attribute
+                type = rest[0] if len(rest) > 0 else GL.GL_FLOAT
+                normalized = rest[1] if len(rest) > 1 else False
+                attribute = MeshAttribute(name, components, type, normalized, offset)
+            table.append(attribute)
+            offset = max(
+                offset,
+                attribute.offset
+                + attribute.components * numpy_types[attribute.type].itemsize,
+            )
+        self.attributes = table
+        self.stride = offset if stride is None else stride
+        self.dtype = np.dtype(
+            {
+                "names": [a.name for a in table],
+                "formats": [(numpy_types[a.type], (a.components,)) for a in table],
+                "offsets": [a.offset for a in table],
+                "itemsize": self.stride,
+            }
+        )
+
+    @staticmethod
+    def from_arrays(arrays: dict, normalized=()) -> tuple:
+        """
+        Static method to build the layout of attribute arrays,
+        arrays maps a name to a (n, components) array.
+        Returns the layout and the interleaved vertices
+        """
+        vertices, attributes = interleave(arrays, normalized)
+        return VertexLayout(attributes, vertices.dtype.itemsize), vertices
+
+    def interleave(self, arrays: dict) -> np.ndarray:
+        """
+        interleave(arrays)
+        Interleave the attribute arrays into a structured array of this layout,
+        each attribute is copied with a single assignment,
+        the arrays can be flat or (n, components)
+        """
+        arrays = {a.name: np.asarray(arrays[a.name]) for a in self.attributes}
+        first = self.attributes[0]
+        count = arrays[first.name].size // first.components
+        vertices = np.zeros(count, dtype=self.dtype)
+        for attribute in self.attributes:
+            value = arrays[attribute.name]
+            if value.size != count * attribute.components:
+                raise Exception(
+                    f"Attribute {attribute.name} has {value.size} values, "
+                    f"expected {count * attribute.components}"
+                )
+            vertices[attribute.name] = value.reshape(count, attribute.components)
+        return vertices
+
+    def location(self, program: ShaderProgram, name: str) -> int:
+        """
+        location(program, name)
+        Location of the vertex input of an attribute, looked up by its name
+        or by its name with the attribute prefix, -1 if the program does not use it
+        """
+        attributes = program.attributes
+        for candidate in (name, attribute_prefix + name):
+            for key in (candidate, candidate.encode("utf-8")):
+                if key in attributes:
+                    return attributes[key]
+        return -1
+
+    def slots(self) -> int:
+        """
+        slots()
+        Number of locations used by the layout, attributes with more
+        than 4 components (matrices) take one location per column
+        """
+        return sum((a.components + 3) // 4 for a in self.attributes)
+
+    def bind(
+        self, program: ShaderProgram = None, divisor: int = 0, first_location: int = 0
+    ) -> list:
+        """
+        bind(program, divisor, first_location)
+        Point the vertex inputs at the buffer bound to GL_ARRAY_BUFFER,
+        with a linked program the locations are looked up by name,
+        without one the attributes use the locations of the list order
+        from first_location.
+        With a divisor the attributes advance once every divisor instances.
+        Returns the enabled locations
+        """
+        locations = []
+        next_location = first_location
+        itemsize = {a.name: numpy_types[a.type].itemsize for a in self.attributes}
+        for attribute in self.attributes:
+            slots = (attribute.components + 3) // 4
+            if program is None:
+                location = next_location
+            else:
+                location = self.location(program, attribute.name)
+            next_location += slots
+            if location < 0:
+                # unused inputs are removed by the linker
+                continue
+            # a mat4 is read as 4 consecutive vec4 columns
+            for slot in range(slots):
+                GL.glVertexAttribPointer(
+                    location + slot,
+                    min(4, attribute.components - 4 * slot),
+                    attribute.type,
+                    GL.GL_TRUE if attribute.normalized else GL.GL_FALSE,
+                    self.stride,
+                    ctypes.c_void_p(
+                        attribute.offset + 4 * slot * itemsize[attribute.name]
+                    ),
+                )
+                GL.glEnableVertexAttribArray(location + slot)
+                if divisor:
+                    GL.glVertexAttribDivisor(location + slot, divisor)
+                locations.append(location + slot)
+        return locations
+
+
+def _buffer_data(target: int, data, usage: int):
+    # an array is uploaded, a size only allocates the storage
+    if isinstance(data, np.ndarray):
+        data = np.ascontiguousarray(data)
+        GL.glBufferData(target, data.nbytes, ctypes.c_void_p(data.ctypes.data), usage)
+    else:
+        GL.glBufferData(target, int(data), None, usage)
+
+
+class VertexArray:
+    """
+    VertexArray class:
+    A vertex array object with a single interleaved vertex buffer
+    and an optional element buffer
+    """
+
+    def __init__(
+        self,
+        layout: VertexLayout,
+        vertices,
+        indices=None,
+        index_type: int = GL.GL_UNSIGNED_INT,
+        program: ShaderProgram = None,
+        usage: int = GL.GL_STATIC_DRAW,
+    ):
+        """
+        vertices and indices are arrays to upload or sizes in bytes to allocate
+        """
+        self.layout = layout
+        if isinstance(indices, np.ndarray):
+            indices = indices.reshape(-1)
+            index_type = gl_types[indices.dtype]
+        self.index_type = index_type
+        if indices is None:
+            self.count = len(vertices) if isinstance(vertices, np.ndarray) else 0
+        else:
+            self.count = len(indices) if isinstance(indices, np.ndarray) else 0
+
+        self.vao = GL.glGenVertexArrays(1)
+        gl_state.bind_vertex_array(self.vao)
+        self.vbo = GL.glGenBuffers(1)
+        gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        _buffer_data(GL.GL_ARRAY_BUFFER, vertices, usage)
+        self.ebo = None
+        if indices is not None:
+            self.ebo = GL.glGenBuffers(1)
+            gl_state.bind_buffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+            _buffer_data(GL.GL_ELEMENT_ARRAY_BUFFER, indices, usage)
+        self.locations = layout.bind(program)
+        gl_state.bind_vertex_array(0)
+
+    @staticmethod
+    def from_arrays(
+        arrays: dict,
+        indices: np.ndarray = None,
+        program: ShaderProgram = None,
+        normalized=(),
+    ) -> VertexArray:
+        """
+        Static method to create a vertex array from attribute arrays,
+        they are interleaved in the dict order
+        """
+        layout, vertices = VertexLayout.from_arrays(arrays, normalized)
+        return VertexArray(layout, vertices, indices, program=program)
+
+    def bind(self, program: ShaderProgram):
+        """
+        bind(program)
+        Point the attributes at the vertex inputs of a program,
+        used when the buffers were created before the program was linked
+        """
+        gl_state.bind_vertex_array(self.vao)
+        for location in self.locations:
+            GL.glDisableVertexAttribArray(location)
+        gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        self.locations = self.layout.bind(program)
+        gl_state.bind_vertex_array(0)
+
+    def draw(
+        self, mode: int = GL.GL_TRIANGLES, count: int = None, instances: int = None
+    ):
+        """
+        draw(mode, count, instances)
+        Draw the first count indices, or vertices without an element buffer,
+        with instances the mesh is drawn that many times in a single call
+        """
+        count = self.count if count is None else count
+        gl_state.bind_vertex_array(self.vao)
+        if instances is None:
+            if self.ebo is None:
+                GL.glDrawArrays(mode, 0, count)
+            else:
+                GL.glDrawElements(mode, count, self.index_type, None)
+        elif self.ebo is None:
+            GL.glDrawArraysInstanced(mode, 0, count, instances)
+        else:
+            GL.glDrawElementsInstanced(mode, count, self.index_type, None, instances)
+
+    def delete(self):
+        gl_state.delete_buffer(self.vbo)
+        if self.ebo is not None:
+            gl_state.delete_buffer(self.ebo)
+        gl_state.delete_vertex_array(self.vao)
+
+
+class InstanceBuffer:
+    """
+    InstanceBuffer class:
+    A buffer of per instance attributes (like a model matrix)
+    attached to a vertex array,
+    the attributes advance once per instance, so the whole set is drawn
+    with a single instanced draw call
+    """
+
+    def __init__(
+        self,
+        vertex_array: VertexArray,
+        layout: VertexLayout,
+        capacity: int = 1024,
+        program: ShaderProgram = None,
+        usage: int = GL.GL_STREAM_DRAW,
+    ):
+        self.vertex_array = vertex_array
+        self.layout = layout
+        self.capacity = capacity
+        self.usage = usage
+        self.count = 0
+        self.vbo = GL.glGenBuffers(1)
+        gl_state.bind_vertex_array(vertex_array.vao)
+        gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        GL.glBufferData(GL.GL_ARRAY_BUFFER, capacity * layout.stride, None, usage)
+        # without a program the instance attributes go after the vertex attributes
+        self.locations = layout.bind(program, 1, vertex_array.layout.slots())
+        gl_state.bind_vertex_array(0)
+        gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, 0)
+
+    def update(self, instances: np.ndarray):
+        """
+        update(instances)
+        Replace the instance data, a structured array of the layout
+        or a (n, floats per instance) array with the same bytes.
+        The old storage is orphaned so the driver does not wait for the last frame
+        """
+        instances = np.ascontiguousarray(instances)
+        count = instances.nbytes // self.layout.stride
+        if count > self.capacity:
+            self.capacity = max(count, self.capacity * 2)
+        gl_state.bind_buffer(GL.GL_ARRAY_BUFFER, self.vbo)
+        GL.glBufferData(
+            GL.GL_ARRAY_BUFFER, self.capacity * self.layout.stride, None, self.usage
+        )
+        GL.glBufferSubData(
+            GL.GL_ARRAY_BUFFER,
+            0,
+            instances.nbytes,
+            ctypes.c_void_p(instances.ctypes.data),
+        )
+        self.count = count
+
+    def draw(self, mode: int = GL.GL_TRIANGLES):
+        """
+        draw(mode)
+        Draw the mesh once per instance with a single call
+        """
+        if self.count:
+            self.vertex_array.draw(mode, instances=self.count)
+
+    def delete(self):
+        gl_state.delete_buffer(self.vbo)